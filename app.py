@@ -1,5 +1,10 @@
 import streamlit as st
 
+from db import ensure_db_ready
+
+# schema e migrazioni prima di qualsiasi lettura o scrittura
+ensure_db_ready()
+
 st.set_page_config(page_title="Agency Planner", layout="wide")
 st.title("Agency Planner")
 st.markdown("Usa il menu a sinistra per navigare. Inizia da Login.")
@@ -0,0 +1,394 @@
+# audit.py
+"""
+Scrittura asincrona dell'audit log.
+
+record_audit (utils.py) non apre più una sessione con commit dedicato: le righe
+AuditLog vengono accodate a un thread di scrittura che le inserisce a blocchi
+(max AGENCY_AUDIT_BATCH_SIZE righe o AGENCY_AUDIT_FLUSH_INTERVAL secondi) in
+un'unica transazione, quindi con un solo fsync per blocco.
+
+Per test, script e chiusura dell'app:
+    flush_audit()              # attende che tutto ciò che è in coda sia scritto
+    AGENCY_AUDIT_SYNC=1        # scrittura sincrona, nessun thread
+
+Retention: archive_audit_logs() sposta le righe più vecchie della policy
+(AUDIT_RETENTION_POLICIES, per entity/action) in segmenti compressi mensili
+(AuditArchiveSegment), così audit_logs resta piccola. read_archived_audit()
+le rilegge; get_audit_logs(include_archived=True) le unisce a quelle correnti.
+AuditArchiveEntry indicizza gli entity_id di ogni segmento: lo storico di una
+singola entità decomprime solo i segmenti che la contengono.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import heapq
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import and_, func, or_, select
+
+from models import AuditLog, AuditArchiveSegment, AuditArchiveEntry
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = int(os.environ.get("AGENCY_AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AGENCY_AUDIT_FLUSH_INTERVAL", "0.5"))
+AUDIT_SYNC = os.environ.get("AGENCY_AUDIT_SYNC", "").lower() in ("1", "true", "yes")
+AUDIT_WRITE_RETRIES = 3
+
+_STOP = object()
+
+
+class AuditWriter:
+    """
+    Thread di scrittura a blocchi per AuditLog.
+    submit() accoda una riga (dict con le colonne di audit_logs), flush() attende
+    la scrittura di tutte le righe accodate fino a quel momento.
+    """
+
+    def __init__(self, engine, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL, sync: bool = AUDIT_SYNC):
+        self.engine = engine
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.sync = sync
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    # --- API pubblica
+    def submit(self, row: Dict[str, Any]) -> None:
+        if self.sync:
+            self._write_batch([row])
+            return
+        self._ensure_started()
+        self._queue.put(row)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocca finché le righe accodate prima della chiamata non sono su disco.
+        Restituisce False se il timeout scade.
+        """
+        if self.sync or not self._is_running():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+        }
+
+    # --- interni
+    def _is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _ensure_started(self) -> None:
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write_batch(batch)
+                return
+            if isinstance(item, threading.Event):
+                self._write_batch(batch)
+                batch = []
+                item.set()
+                continue
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write_batch(batch)
+                batch = []
+
+    def _write_batch(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        for attempt in range(1, AUDIT_WRITE_RETRIES + 1):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(AuditLog.__table__.insert(), rows)
+                self.written += len(rows)
+                self.batches += 1
+                return
+            except Exception:
+                if attempt == AUDIT_WRITE_RETRIES:
+                    self.dropped += len(rows)
+                    logger.exception("Audit: impossibile scrivere %d righe, scartate", len(rows))
+                    return
+                time.sleep(0.1 * attempt)
+
+
+_writer: Optional[AuditWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> AuditWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                from db import engine
+                _writer = AuditWriter(engine)
+                atexit.register(_writer.stop)
+    return _writer
+
+
+def enqueue_audit(row: Dict[str, Any]) -> None:
+    get_audit_writer().submit(row)
+
+
+def flush_audit(timeout: Optional[float] = None) -> bool:
+    if _writer is None:
+        return True
+    return _writer.flush(timeout)
+
+
+# -------------------------
+# RETENTION / ARCHIVIO
+# -------------------------
+AUDIT_RETENTION_DAYS = int(os.environ.get("AGENCY_AUDIT_RETENTION_DAYS", "365"))
+AUDIT_ARCHIVE_CHUNK_SIZE = 5000
+
+
+class AuditRetentionPolicy(NamedTuple):
+    entity: str             # "*" = qualsiasi
+    action: str             # "*" = qualsiasi
+    keep_days: Optional[int]  # None = mai archiviare
+    archive: bool = True    # False = le righe scadute vengono eliminate senza archivio
+
+
+# la policy più specifica vince: entity+action, entity+"*", "*"+action, "*"+"*"
+AUDIT_RETENTION_POLICIES = [
+    AuditRetentionPolicy("integration", "*", 30, archive=False),   # stub calendar/email/slack
+    AuditRetentionPolicy("task", "toggle_done", 90),
+    AuditRetentionPolicy("*", "*", AUDIT_RETENTION_DAYS),
+]
+
+_AUDIT_COLUMNS = ("id", "entity", "entity_id", "action", "payload", "user", "ts")
+
+
+def policy_for(entity: str, action: str,
+               policies: Sequence[AuditRetentionPolicy] = None) -> Optional[AuditRetentionPolicy]:
+    best, best_score = None, -1
+    for policy in policies or AUDIT_RETENTION_POLICIES:
+        if policy.entity not in ("*", entity) or policy.action not in ("*", action):
+            continue
+        score = (policy.entity != "*") * 2 + (policy.action != "*")
+        if score > best_score:
+            best, best_score = policy, score
+    return best
+
+
+def _encode_rows(rows: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(json.dumps(rows, default=str, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def _decode_rows(data: bytes) -> List[Dict[str, Any]]:
+    rows = json.loads(zlib.decompress(data).decode("utf-8"))
+    for row in rows:
+        row["ts"] = datetime.fromisoformat(row["ts"]) if row.get("ts") else None
+    return rows
+
+
+def _segment_entries(segment_id: int, entity: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {"segment_id": segment_id, "entity": entity, "entity_id": entity_id}
+        for entity_id in sorted({row["entity_id"] for row in rows}, key=lambda x: (x is not None, x))
+    ]
+
+
+def _insert_segments(conn, segments: List[Dict[str, Any]], rows_by_segment: List[List[Dict[str, Any]]]) -> None:
+    entries = []
+    for segment, seg_rows in zip(segments, rows_by_segment):
+        segment_id = conn.execute(AuditArchiveSegment.__table__.insert(), segment).inserted_primary_key[0]
+        entries.extend(_segment_entries(segment_id, segment["entity"], seg_rows))
+    if entries:
+        conn.execute(AuditArchiveEntry.__table__.insert(), entries)
+
+
+def index_audit_archive(engine=None) -> int:
+    """
+    Crea le righe AuditArchiveEntry dei segmenti che non ne hanno (archivi
+    scritti prima dell'indice). Restituisce il numero di segmenti indicizzati.
+    """
+    if engine is None:
+        from db import engine
+    seg = AuditArchiveSegment.__table__
+    entry = AuditArchiveEntry.__table__
+    q = select(seg.c.id, seg.c.entity, seg.c.data).where(~select(entry.c.id).where(entry.c.segment_id == seg.c.id).exists())
+    indexed = 0
+    with engine.begin() as conn:
+        for segment_id, entity, data in conn.execute(q).all():
+            entries = _segment_entries(segment_id, entity, _decode_rows(data))
+            if entries:
+                conn.execute(entry.insert(), entries)
+                indexed += 1
+    return indexed
+
+
+def archive_audit_logs(now: Optional[datetime] = None,
+                       policies: Sequence[AuditRetentionPolicy] = None,
+                       dry_run: bool = False, engine=None) -> Dict[str, Any]:
+    """
+    Applica le policy di retention: le righe più vecchie di keep_days vengono
+    spostate in AuditArchiveSegment (un segmento per mese/entity) o eliminate se
+    archive=False. Ogni blocco di AUDIT_ARCHIVE_CHUNK_SIZE righe è una transazione
+    (insert dei segmenti + delete delle righe). Restituisce un riepilogo.
+    """
+    if engine is None:
+        from db import engine
+    policies = list(policies or AUDIT_RETENTION_POLICIES)
+    now = now or datetime.utcnow()
+    flush_audit()
+
+    finite = [p.keep_days for p in policies if p.keep_days is not None]
+    summary = {"archived": 0, "deleted": 0, "segments": 0, "dry_run": dry_run}
+    if not finite:
+        return summary
+    # solo le righe più vecchie della policy più breve possono scadere
+    scan_before = now - timedelta(days=min(finite))
+    table = AuditLog.__table__
+    cols = [table.c[name] for name in _AUDIT_COLUMNS]
+    last = None
+    while True:
+        # keyset su (ts, id): usa ix_audit_logs_ts e salta le righe non scadute già viste
+        q = select(*cols).where(table.c.ts < scan_before)
+        if last is not None:
+            q = q.where(or_(table.c.ts > last[0], and_(table.c.ts == last[0], table.c.id > last[1])))
+        q = q.order_by(table.c.ts, table.c.id).limit(AUDIT_ARCHIVE_CHUNK_SIZE)
+        with engine.begin() as conn:
+            rows = conn.execute(q).all()
+            if not rows:
+                break
+            last = (rows[-1].ts, rows[-1].id)
+
+            to_archive = defaultdict(list)
+            expired_ids = []
+            for row in rows:
+                policy = policy_for(row.entity, row.action, policies)
+                if policy is None or policy.keep_days is None or row.ts >= now - timedelta(days=policy.keep_days):
+                    continue
+                expired_ids.append(row.id)
+                if policy.archive:
+                    to_archive[(row.ts.strftime("%Y-%m"), row.entity)].append(dict(row._mapping))
+                else:
+                    summary["deleted"] += 1
+            summary["archived"] += sum(len(v) for v in to_archive.values())
+            summary["segments"] += len(to_archive)
+            if dry_run or not expired_ids:
+                continue
+
+            grouped = sorted(to_archive.items())
+            segments = [
+                {
+                    "month": month, "entity": entity, "row_count": len(seg_rows),
+                    "first_ts": min(r["ts"] for r in seg_rows), "last_ts": max(r["ts"] for r in seg_rows),
+                    "data": _encode_rows(seg_rows), "created_at": now,
+                }
+                for (month, entity), seg_rows in grouped
+            ]
+            if segments:
+                _insert_segments(conn, segments, [seg_rows for _, seg_rows in grouped])
+            for start in range(0, len(expired_ids), 500):
+                conn.execute(table.delete().where(table.c.id.in_(expired_ids[start:start + 500])))
+    return summary
+
+
+def read_archived_audit(entity: Optional[str] = None, entity_id: Optional[int] = None,
+                        before: Optional[datetime] = None, limit: Optional[int] = None,
+                        engine=None) -> List[Dict[str, Any]]:
+    """
+    Righe archiviate (dict con le colonne di audit_logs) dalla più recente.
+    I segmenti vengono decompressi dal più recente e la lettura si ferma appena
+    ci sono limit righe più recenti del segmento successivo. Con entity_id si
+    leggono solo i segmenti che lo contengono (AuditArchiveEntry).
+    """
+    if engine is None:
+        from db import engine
+    seg = AuditArchiveSegment.__table__
+    entry = AuditArchiveEntry.__table__
+    q = select(seg.c.data, seg.c.first_ts, seg.c.last_ts).order_by(seg.c.last_ts.desc())
+    if entity:
+        q = q.where(seg.c.entity == entity)
+    if entity_id:
+        has_id = select(entry.c.id).where(entry.c.segment_id == seg.c.id, entry.c.entity_id == entity_id)
+        if entity:
+            has_id = has_id.where(entry.c.entity == entity)
+        q = q.where(has_id.exists())
+    if before is not None:
+        q = q.where(seg.c.first_ts < before)
+    found: List[Dict[str, Any]] = []
+    # (ts, id) delle limit righe più recenti trovate: newest[0] è la limit-esima
+    newest: List[tuple] = []
+    with engine.connect() as conn:
+        for data, first_ts, last_ts in conn.execute(q):
+            if limit and len(newest) >= limit and last_ts is not None and last_ts < newest[0][0]:
+                break
+            for row in _decode_rows(data):
+                if entity_id and row["entity_id"] != entity_id:
+                    continue
+                if before is not None and row["ts"] >= before:
+                    continue
+                found.append(row)
+                if limit:
+                    key = (row["ts"], row["id"])
+                    if len(newest) < limit:
+                        heapq.heappush(newest, key)
+                    elif key > newest[0]:
+                        heapq.heapreplace(newest, key)
+    found.sort(key=lambda r: (r["ts"], r["id"]), reverse=True)
+    return found[:limit] if limit else found
+
+
+def audit_archive_stats(engine=None) -> Dict[str, Any]:
+    if engine is None:
+        from db import engine
+    seg = AuditArchiveSegment.__table__
+    with engine.connect() as conn:
+        hot = conn.execute(select(func.count()).select_from(AuditLog.__table__)).scalar()
+        segments, rows, size = conn.execute(
+            select(func.count(), func.coalesce(func.sum(seg.c.row_count), 0),
+                   func.coalesce(func.sum(func.length(seg.c.data)), 0))
+        ).one()
+    return {"hot_rows": hot, "segments": segments, "archived_rows": rows, "archive_bytes": size}
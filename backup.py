@@ -0,0 +1,488 @@
+# backup.py
+"""
+Export/import del database in JSON.
+
+Ogni tabella viene letta a blocchi (keyset su id, BACKUP_CHUNK_SIZE righe) e
+ogni record viene scritto subito sul file, quindi la memoria usata non dipende
+dalla dimensione del database. Le associazioni evento-artista/service sono lette
+con una query per blocco di eventi (nessun N+1).
+
+Il formato è lo stesso di utils.export_data_json:
+    {"artists": [...], "services": [...], ..., "events": [...], "tasks": [...], "audit_logs": [...]}
+Con path che termina in ".gz" (o compress=True) il file è scritto in gzip.
+
+import_backup ripristina tutte le sezioni (associazioni comprese) preservando gli
+id, con INSERT multi-riga a blocchi invece di un flush ORM per oggetto. I
+riferimenti (format/promoter/tour manager degli eventi, artisti e service
+collegati, evento dei task) vengono verificati prima di scrivere: un backup
+incoerente solleva ValueError senza toccare il database. Anche un service o un
+artista impegnato due volte nella stessa data (nel backup o con un evento già
+presente) solleva ValueError, con l'elenco dei doppi impegni.
+"""
+import gzip
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.types import Boolean, Date, DateTime
+from sqlalchemy.orm import Session
+
+from audit import flush_audit
+from db import session_scope
+from models import (
+    Artist, Service, Format, Promoter, TourManager, Event, Task, AuditLog,
+    ServiceAssignment, ArtistBooking, event_artist, event_service, event_performer,
+    PERFORMER_FIELDS, parse_performer_ids
+)
+
+BACKUP_CHUNK_SIZE = int(os.environ.get("AGENCY_BACKUP_CHUNK_SIZE", "1000"))
+
+# sezione del file -> (tabella, colonne esportate); l'ordine è quello di scrittura
+EXPORT_SECTIONS = [
+    ("artists", Artist.__table__, ("id", "name", "role", "phone", "email", "notes")),
+    ("services", Service.__table__, ("id", "name", "contact", "phone", "notes")),
+    ("formats", Format.__table__, ("id", "name", "description", "notes")),
+    ("promoters", Promoter.__table__, ("id", "name", "contact", "phone", "email", "notes")),
+    ("tour_managers", TourManager.__table__, ("id", "name", "contact", "phone", "email", "notes")),
+    ("events", Event.__table__, (
+        "id", "date", "title", "location", "type", "format_id", "promoter_id", "tour_manager_id",
+        "status", "notes", "van", "travel", "hotel", "allestimenti", "facchini",
+        "payments_acconto", "payments_saldo", "dj_id", "vocalist_id", "ballerine_ids", "mascotte_ids",
+    )),
+    ("tasks", Task.__table__, ("id", "event_id", "title", "description", "assignee", "due_date", "done")),
+    ("audit_logs", AuditLog.__table__, ("id", "entity", "entity_id", "action", "payload", "user", "ts")),
+]
+
+# tabelle i cui id non sono referenziati da altre righe: in upsert un id già
+# usato da una riga diversa (task di un altro evento, audit di un'altra entità)
+# non va sovrascritto, la riga del backup riceve un id nuovo.
+# tabella -> (colonne che identificano la stessa riga, aggiornarla se già presente)
+UPSERT_REMAPPED_TABLES = {
+    "tasks": (("event_id",), True),
+    "audit_logs": (("entity", "entity_id", "action", "ts"), False),   # log immutabile: si salta
+}
+
+# associazioni aggiunte a ogni evento: chiave -> (tabella, colonna id collegato)
+EVENT_ASSOCIATIONS = {
+    "artist_ids": (event_artist, "artist_id"),
+    "service_ids": (event_service, "service_id"),
+}
+
+
+def is_compressed_path(path: str) -> bool:
+    return path.lower().endswith(".gz")
+
+
+def open_backup(path: str, mode: str = "r", compress: Optional[bool] = None):
+    """
+    Apre un file di backup in modalità testo ("r" o "w"), in gzip se richiesto
+    o se il nome termina in ".gz".
+    """
+    if compress is None:
+        compress = is_compressed_path(path)
+    if compress:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def iter_table_chunks(db: Session, table, columns: Sequence[str],
+                      chunk_size: int = BACKUP_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Righe della tabella come dict, a blocchi ordinati per id (keyset: id > ultimo id letto).
+    """
+    cols = [table.c[name] for name in columns]
+    last_id = None
+    while True:
+        stmt = select(*cols).order_by(table.c.id).limit(chunk_size)
+        if last_id is not None:
+            stmt = stmt.where(table.c.id > last_id)
+        rows = db.execute(stmt).all()
+        if not rows:
+            return
+        yield [{name: _json_value(value) for name, value in zip(columns, row)} for row in rows]
+        last_id = rows[-1][0]
+
+
+def _attach_event_associations(db: Session, events: List[Dict[str, Any]]) -> None:
+    event_ids = [ev["id"] for ev in events]
+    for key, (table, target) in EVENT_ASSOCIATIONS.items():
+        linked: Dict[int, List[int]] = {}
+        rows = db.execute(
+            select(table.c.event_id, table.c[target])
+            .where(table.c.event_id.in_(event_ids))
+            .order_by(table.c.event_id, table.c[target])
+        )
+        for event_id, target_id in rows:
+            linked.setdefault(event_id, []).append(target_id)
+        for ev in events:
+            ev[key] = linked.get(ev["id"], [])
+    # performer per ruolo: {"dj": [..], "ballerina": [..], ...}
+    performers: Dict[int, Dict[str, List[int]]] = {}
+    rows = db.execute(
+        select(event_performer.c.event_id, event_performer.c.role, event_performer.c.artist_id)
+        .where(event_performer.c.event_id.in_(event_ids))
+        .order_by(event_performer.c.event_id, event_performer.c.role, event_performer.c.artist_id)
+    )
+    for event_id, role, artist_id in rows:
+        performers.setdefault(event_id, {}).setdefault(role, []).append(artist_id)
+    for ev in events:
+        ev["performers"] = performers.get(ev["id"], {})
+
+
+def _iter_section(db: Session, key: str, table, columns, chunk_size: int) -> Iterator[Dict[str, Any]]:
+    for chunk in iter_table_chunks(db, table, columns, chunk_size):
+        if key == "events":
+            _attach_event_associations(db, chunk)
+        elif key == "tasks":
+            for tk in chunk:
+                tk["done"] = bool(tk["done"])
+        yield from chunk
+
+
+def write_backup(fh, db: Session, chunk_size: int = BACKUP_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Scrive l'intero database su fh (file aperto in modalità testo), un record per riga.
+    Restituisce il numero di record per sezione.
+    """
+    counts = {}
+    fh.write("{")
+    for section_no, (key, table, columns) in enumerate(EXPORT_SECTIONS):
+        fh.write("%s\n%s: [" % ("," if section_no else "", json.dumps(key)))
+        n = 0
+        for record in _iter_section(db, key, table, columns, chunk_size):
+            fh.write("%s\n  %s" % ("," if n else "", json.dumps(record, ensure_ascii=False)))
+            n += 1
+        fh.write("\n]")
+        counts[key] = n
+    fh.write("\n}\n")
+    return counts
+
+
+def export_backup(path: str, compress: Optional[bool] = None, chunk_size: int = BACKUP_CHUNK_SIZE,
+                  db: Optional[Session] = None) -> Dict[str, int]:
+    """
+    Esporta il database in path (gzip se compress=True o path "*.gz").
+    Le letture avvengono in un'unica transazione, quindi lo snapshot è coerente.
+    """
+    # includi nel backup anche le righe di audit ancora in coda
+    flush_audit()
+    if db is None:
+        with session_scope() as db:
+            return export_backup(path, compress=compress, chunk_size=chunk_size, db=db)
+    with open_backup(path, "w", compress) as fh:
+        return write_backup(fh, db, chunk_size)
+
+
+# -------------------------
+# IMPORT
+# -------------------------
+IMPORT_MODES = ("insert", "upsert")
+
+# (sezione, campo, sezione referenziata) verificati prima dell'import
+BACKUP_REFERENCES = [
+    ("events", "format_id", "formats"),
+    ("events", "promoter_id", "promoters"),
+    ("events", "tour_manager_id", "tour_managers"),
+    ("events", "artist_ids", "artists"),
+    ("events", "service_ids", "services"),
+    ("events", "performers", "artists"),
+    ("tasks", "event_id", "events"),
+]
+
+
+def load_backup(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    with open_backup(path, "r") as fh:
+        return json.load(fh)
+
+
+def _chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _python_value(column, value: Any) -> Any:
+    if value is None or value == "":
+        return None if isinstance(column.type, (Date, DateTime)) else value
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value[:10]) if isinstance(value, str) else value
+    if isinstance(column.type, Boolean):
+        return bool(value)
+    return value
+
+
+def _table_rows(key: str, table, columns: Sequence[str], records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Record del backup -> righe per INSERT; i campi assenti prendono il default della colonna.
+    """
+    rows = []
+    for rec in records:
+        if rec.get("id") is None:
+            raise ValueError(f"Backup non valido: record senza id in '{key}'")
+        row = {}
+        for name in columns:
+            column = table.c[name]
+            if name in rec:
+                row[name] = _python_value(column, rec[name])
+            elif column.default is not None and column.default.is_scalar:
+                row[name] = column.default.arg
+            else:
+                row[name] = None
+        rows.append(row)
+    return rows
+
+
+def _existing_ids(db: Session, table, ids) -> set:
+    found = set()
+    ids = list(ids)
+    for chunk in _chunks(ids, 500):
+        found.update(db.execute(select(table.c.id).where(table.c.id.in_(chunk))).scalars())
+    return found
+
+
+def check_backup_references(data: Dict[str, List[Dict[str, Any]]], db: Optional[Session] = None,
+                            clear_existing: bool = False) -> List[str]:
+    """
+    Riferimenti del backup che non puntano né a un record del backup né (se il
+    database non viene svuotato) a una riga già presente. Restituisce i problemi trovati.
+    """
+    tables = {key: table for key, table, _ in EXPORT_SECTIONS}
+    ids = {key: {rec.get("id") for rec in data.get(key) or []} for key in tables}
+    problems = []
+    for section, field, target in BACKUP_REFERENCES:
+        wanted = set()
+        for rec in data.get(section) or []:
+            value = rec.get(field)
+            if isinstance(value, dict):
+                values = [v for ids in value.values() for v in ids]
+            else:
+                values = value if isinstance(value, list) else [value]
+            wanted.update(v for v in values if v not in (None, 0, ""))
+        missing = wanted - ids[target]
+        if missing and db is not None and not clear_existing:
+            missing -= _existing_ids(db, tables[target], missing)
+        if missing:
+            sample = ", ".join(str(v) for v in sorted(missing)[:10])
+            problems.append(f"{section}.{field}: {len(missing)} id inesistenti in {target} ({sample})")
+    return problems
+
+
+def clear_database(db: Session) -> None:
+    """
+    Svuota le tabelle del backup, figli prima dei padri (funziona anche con
+    AGENCY_DB_FOREIGN_KEYS=1).
+    """
+    for table in (AuditLog.__table__, Task.__table__, ServiceAssignment.__table__, ArtistBooking.__table__,
+                  event_artist, event_service, event_performer, Event.__table__, Artist.__table__,
+                  Service.__table__, Format.__table__, Promoter.__table__, TourManager.__table__):
+        db.execute(table.delete())
+
+
+def _upsert(db: Session, table, rows: Sequence[Dict[str, Any]]) -> None:
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={name: stmt.excluded[name] for name in rows[0] if name != "id"},
+    )
+    db.execute(stmt, list(rows))
+
+
+def _upsert_remapped(db: Session, table, rows: Sequence[Dict[str, Any]]) -> None:
+    """
+    Upsert per UPSERT_REMAPPED_TABLES: id libero -> insert; id della stessa riga
+    -> update (o nulla); id di una riga diversa -> insert con un id nuovo, se
+    un import precedente non ha già creato una riga identica.
+    """
+    identity, update_same = UPSERT_REMAPPED_TABLES[table.name]
+    existing = {
+        row[0]: tuple(row[1:])
+        for row in db.execute(
+            select(table.c.id, *[table.c[name] for name in identity])
+            .where(table.c.id.in_([row["id"] for row in rows]))
+        )
+    }
+    same, free, remapped = [], [], []
+    for row in rows:
+        if row["id"] not in existing:
+            free.append(row)
+        elif existing[row["id"]] == tuple(row[name] for name in identity):
+            same.append(row)
+        else:
+            remapped.append({name: value for name, value in row.items() if name != "id"})
+    if free:
+        db.execute(table.insert(), free)
+    if same and update_same:
+        _upsert(db, table, same)
+    if remapped:
+        columns = list(remapped[0])
+        keys = {tuple(row[name] for name in identity) for row in remapped}
+        present = {
+            tuple(row) for row in db.execute(
+                select(*[table.c[name] for name in columns])
+                .where(tuple_(*[table.c[name] for name in identity]).in_(list(keys)))
+            )
+        }
+        remapped = [row for row in remapped if tuple(row[name] for name in columns) not in present]
+        if remapped:
+            db.execute(table.insert(), remapped)
+
+
+def _insert_rows(db: Session, table, rows: List[Dict[str, Any]], mode: str, chunk_size: int) -> None:
+    for chunk in _chunks(rows, chunk_size):
+        if mode == "upsert" and table.name in UPSERT_REMAPPED_TABLES:
+            _upsert_remapped(db, table, chunk)
+        elif mode == "upsert":
+            _upsert(db, table, chunk)
+        else:
+            db.execute(table.insert(), list(chunk))
+
+
+def _insert_bookings(db: Session, table, target: str, rows: List[Dict[str, Any]], chunk_size: int) -> List[tuple]:
+    """
+    Inserisce service_assignments / artist_bookings saltando le righe che violano
+    il vincolo (target, date). Restituisce le righe saltate come (target, data, event_id).
+    """
+    stmt = sqlite_insert(table).on_conflict_do_nothing()
+    skipped = []
+    for chunk in _chunks(rows, chunk_size):
+        db.execute(stmt, list(chunk))
+        inserted = set(db.execute(
+            select(table.c.event_id, table.c[target])
+            .where(table.c.event_id.in_({row["event_id"] for row in chunk}))
+        ).all())
+        skipped.extend(
+            (row[target], row["date"], row["event_id"]) for row in chunk
+            if (row["event_id"], row[target]) not in inserted
+        )
+    return skipped
+
+
+def _import_event_links(db: Session, events: List[Dict[str, Any]], mode: str, chunk_size: int) -> Dict[str, int]:
+    """
+    Associazioni evento-artista/service/performer, service_assignments e artist_bookings
+    (derivate dalla data dell'evento).
+    In upsert i collegamenti degli eventi importati vengono sostituiti.
+    """
+    event_ids = [ev["id"] for ev in events]
+    if mode == "upsert":
+        for chunk in _chunks(event_ids, 500):
+            for table in (event_artist, event_service, event_performer,
+                          ServiceAssignment.__table__, ArtistBooking.__table__):
+                db.execute(table.delete().where(table.c.event_id.in_(chunk)))
+
+    counts = {}
+    for key, (table, target) in EVENT_ASSOCIATIONS.items():
+        rows = [
+            {"event_id": ev["id"], target: target_id}
+            for ev in events
+            for target_id in dict.fromkeys(ev.get(key) or [])
+        ]
+        for chunk in _chunks(rows, chunk_size):
+            db.execute(table.insert(), list(chunk))
+        counts[table.name] = len(rows)
+
+    performers = []
+    legacy = []
+    for ev in events:
+        if "performers" in ev:
+            performers.extend(
+                {"event_id": ev["id"], "artist_id": aid, "role": role}
+                for role, ids in (ev["performers"] or {}).items()
+                for aid in dict.fromkeys(ids)
+            )
+        else:
+            # backup precedente a event_performer: ruoli dalle colonne legacy
+            legacy.extend(
+                {"event_id": ev["id"], "artist_id": aid, "role": role}
+                for field, role in PERFORMER_FIELDS.items()
+                for aid in parse_performer_ids(ev.get(field))
+            )
+    if legacy:
+        # le colonne legacy non avevano vincoli: si tengono solo gli artisti esistenti
+        known = _existing_ids(db, Artist.__table__, {row["artist_id"] for row in legacy})
+        performers.extend(row for row in legacy if row["artist_id"] in known)
+    for chunk in _chunks(performers, chunk_size):
+        db.execute(event_performer.insert(), list(chunk))
+    counts["event_performer"] = len(performers)
+
+    assignments = [
+        {"event_id": ev["id"], "service_id": sid, "date": _python_value(Event.__table__.c.date, ev.get("date"))}
+        for ev in events
+        for sid in dict.fromkeys(ev.get("service_ids") or [])
+    ]
+    # uq_service_date: un doppio impegno (nel backup o con un evento già presente)
+    # lascerebbe l'evento senza assegnazione, invisibile ai controlli dei conflitti
+    skipped_services = _insert_bookings(db, ServiceAssignment.__table__, "service_id", assignments, chunk_size)
+    counts["service_assignments"] = len(assignments) - len(skipped_services)
+
+    performer_ids: Dict[int, List[int]] = {}
+    for row in performers:
+        performer_ids.setdefault(row["event_id"], []).append(row["artist_id"])
+    bookings = [
+        {"event_id": ev["id"], "artist_id": aid, "date": _python_value(Event.__table__.c.date, ev.get("date"))}
+        for ev in events
+        for aid in dict.fromkeys(list(ev.get("artist_ids") or []) + performer_ids.get(ev["id"], []))
+    ]
+    # uq_artist_date: come per i service
+    skipped_artists = _insert_bookings(db, ArtistBooking.__table__, "artist_id", bookings, chunk_size)
+    counts["artist_bookings"] = len(bookings) - len(skipped_artists)
+    if skipped_services or skipped_artists:
+        def describe(kind, skipped):
+            sample = ", ".join(f"{kind} {tid} il {d} (evento {eid})" for tid, d, eid in skipped[:10])
+            return f"{len(skipped)} doppi impegni: {sample}"
+        parts = [describe(kind, skipped) for kind, skipped in
+                 (("service", skipped_services), ("artista", skipped_artists)) if skipped]
+        raise ValueError("Backup in conflitto con gli impegni esistenti: " + "; ".join(parts))
+    return counts
+
+
+def import_backup(path_or_data, clear_existing: bool = False, mode: str = "insert",
+                  chunk_size: int = BACKUP_CHUNK_SIZE, db: Optional[Session] = None) -> Dict[str, int]:
+    """
+    Ripristina un backup (path o dict già letto) preservando gli id.
+
+    mode="insert": le righe vengono inserite così come sono (id duplicati -> IntegrityError).
+    mode="upsert": le righe con id già presente vengono aggiornate, le altre inserite;
+                   per gli eventi importati artisti/service collegati vengono sostituiti.
+                   Task e audit con l'id di una riga diversa ricevono un id nuovo
+                   (UPSERT_REMAPPED_TABLES).
+    clear_existing=True svuota prima tutte le tabelle del backup.
+    Tutto avviene in un'unica transazione: in caso di errore il database resta invariato.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"mode non valido: {mode} (ammessi: {', '.join(IMPORT_MODES)})")
+    if db is None:
+        with session_scope() as db:
+            return import_backup(path_or_data, clear_existing, mode, chunk_size, db)
+
+    data = load_backup(path_or_data) if isinstance(path_or_data, str) else path_or_data
+    problems = check_backup_references(data, db, clear_existing)
+    if problems:
+        raise ValueError("Backup non coerente: " + "; ".join(problems))
+
+    db.flush()
+    if clear_existing:
+        # righe di audit ancora in coda finirebbero dopo lo svuotamento
+        flush_audit()
+        clear_database(db)
+    counts = {}
+    for key, table, columns in EXPORT_SECTIONS:
+        records = data.get(key) or []
+        _insert_rows(db, table, _table_rows(key, table, columns, records), mode, chunk_size)
+        counts[key] = len(records)
+        if key == "events":
+            # gli eventi vanno collegati prima dei task, che li referenziano
+            counts.update(_import_event_links(db, records, mode, chunk_size))
+    # gli oggetti ORM già caricati nella sessione vanno riletti
+    db.expire_all()
+    return counts
@@ -2,7 +2,6 @@
 import streamlit as st
 import calendar
 from datetime import date, datetime
-from utils import list_events_by_date
 
 STATE_COLORS = {
     "bozza": "#f0ad4e",
@@ -2,8 +2,8 @@
 import streamlit as st
 import calendar
 from datetime import date, datetime
-from collections import defaultdict
-from utils import list_events_by_date, list_events_range, save_event
+from page_cache import list_events_by_date, count_events_by_day
+from utils import save_event
 from components.event_card import render_event_card
 
 STATE_COLORS = {
@@ -12,13 +12,6 @@ STATE_COLORS = {
     "cancellato": "#d9534f"
 }
 
-def _group_events_by_date(events):
-    grouped = defaultdict(list)
-    for e in events:
-        if e.date:
-            grouped[e.date].append(e)
-    return grouped
-
 def render_month(year: int, month: int, filters: dict = None):
     """
     Disegna il calendario mensile. Cliccando su un giorno si apre il pannello con gli eventi.
@@ -33,12 +26,13 @@ def render_month(year: int, month: int, filters: dict = None):
     cols = st.columns(7)
     for i, h in enumerate(header):
         cols[i].markdown(f"**{h}**")
-    # prefetch events for month range
+    # conteggi per giorno del mese (filtri applicati in SQL, eventi caricati solo all'apertura del giorno)
     _, last_day = calendar.monthrange(year, month)
     start = date(year, month, 1)
     end = date(year, month, last_day)
-    events = list_events_range(start, end)
-    events_by_date = _group_events_by_date(events)
+    type_filter = filters.get("type") if filters.get("type") != "tutti" else None
+    status_filter = filters.get("status") if filters.get("status") != "tutti" else None
+    counts_by_date = count_events_by_day(start, end, type_=type_filter, status=status_filter)
     for week in weeks:
         cols = st.columns(7)
         for i, day in enumerate(week):
@@ -46,16 +40,11 @@ def render_month(year: int, month: int, filters: dict = None):
                 cols[i].write("")
             else:
                 d = date(year, month, day)
-                evs = events_by_date.get(d, [])
-                # applica filtri
-                if filters.get("type") and filters["type"] != "tutti":
-                    evs = [e for e in evs if e.type == filters["type"]]
-                if filters.get("status") and filters["status"] != "tutti":
-                    evs = [e for e in evs if e.status == filters["status"]]
-                if evs:
-                    first = evs[0]
-                    color = STATE_COLORS.get(first.status, "#777")
-                    label = f"{day}  • {len(evs)}"
+                counts = counts_by_date.get(d)
+                if counts:
+                    # colore dello stato del primo evento del giorno
+                    color = STATE_COLORS.get(counts["first_status"], "#777")
+                    label = f"{day}  • {counts['total']}"
                     if cols[i].button(label, key=f"cal_{year}_{month}_{day}"):
                         st.session_state["_cal_selected_day"] = d.isoformat()
                         st.session_state["_cal_open_day"] = True
@@ -93,9 +82,10 @@ def show_day_panel(selected_date: date):
             }
             try:
                 ev = save_event(payload)
+            except ValueError as e:
+                st.error(f"Errore creazione evento: {e}")
+            else:
                 st.success("Evento creato")
                 # apri la scheda evento completa
                 st.session_state["open_event_id"] = ev.id
                 st.experimental_rerun()
-            except Exception as e:
-                st.error(f"Errore creazione evento: {e}")
@@ -1,9 +1,43 @@
 # components/event_card.py
 import streamlit as st
-from datetime import date
-from utils import get_event, duplicate_event, create_tasks_from_template, save_event
+from datetime import date, timedelta
+from utils import (
+    duplicate_event, find_duplicate_conflicts, create_tasks_from_template, save_event,
+    list_artists, list_services,
+)
 from components.styles import status_badge
 
+def render_duplicate_controls(event_id: int, event_date: date, key: str, user=""):
+    """
+    Data della copia e anteprima dei conflitti: artisti e service già impegnati
+    quel giorno restano fuori dalla copia solo dopo conferma esplicita.
+    """
+    new_date = st.date_input("Data della copia", value=event_date + timedelta(days=1), key=f"{key}_date")
+    conflicts = find_duplicate_conflicts(event_id, new_date)
+    dropped = []
+    if conflicts["artist_ids"] or conflicts["service_ids"]:
+        artist_names = {a.id: a.name for a in list_artists()}
+        service_names = {s.id: s.name for s in list_services()}
+        dropped = [artist_names.get(i, f"#{i}") for i in conflicts["artist_ids"]] + \
+                  [service_names.get(i, f"#{i}") for i in conflicts["service_ids"]]
+        st.warning(f"Già impegnati il {new_date}, non verranno copiati: {', '.join(dropped)}")
+    confirmed = not dropped or st.checkbox("Duplica senza questi collegamenti", key=f"{key}_confirm")
+    c1, c2 = st.columns(2)
+    with c1:
+        if st.button("Crea copia", key=f"{key}_create", disabled=not confirmed):
+            try:
+                duplicate_event(event_id, user=user, new_date=new_date, drop_conflicts=bool(dropped))
+                st.session_state.pop(f"{key}_open", None)
+                st.success("Evento duplicato")
+                st.experimental_rerun()
+            except ValueError as ex:
+                # conflitto nato dopo l'anteprima
+                st.error(f"Errore duplicazione: {ex}")
+    with c2:
+        if st.button("Annulla", key=f"{key}_cancel"):
+            st.session_state.pop(f"{key}_open", None)
+            st.experimental_rerun()
+
 def render_event_card(ev, compact: bool = True):
     """
     Render a compact event card with quick actions.
@@ -38,10 +72,9 @@ def render_event_card(ev, compact: bool = True):
             st.session_state["open_event_id"] = ev.id
             st.experimental_rerun()
         if st.button("Duplica", key=f"dup_{ev.id}"):
-            new_ev = duplicate_event(ev.id)
-            if new_ev:
-                st.success("Evento duplicato")
-                st.experimental_rerun()
+            st.session_state[f"dup_{ev.id}_open"] = True
+    if st.session_state.get(f"dup_{ev.id}_open"):
+        render_duplicate_controls(ev.id, ev.date, key=f"dup_{ev.id}", user=st.session_state.get("user", ""))
     # footer quick actions
     with st.expander("Azioni rapide", expanded=False):
         c1, c2, c3 = st.columns([1,1,1])
@@ -1,11 +1,21 @@
 # components/kanban_board.py
 import streamlit as st
 from datetime import date, timedelta
-from utils import list_events_range, save_event
+from page_cache import query_events
+from utils import save_event, bulk_set_status
 from components.event_card import render_event_card
 
 DEFAULT_STATES = ["bozza", "confermato", "cancellato"]
 
+def _set_status(event_id: int, status: str):
+    # un conflitto (artista o service già impegnato) resta sulla pagina, senza rerun
+    try:
+        save_event({"id": event_id, "status": status})
+    except ValueError as e:
+        st.error(str(e))
+    else:
+        st.experimental_rerun()
+
 def render_kanban(start_date: date = None, days: int = 7, states: list = None):
     if start_date is None:
         start_date = date.today()
@@ -13,7 +23,24 @@ def render_kanban(start_date: date = None, days: int = 7, states: list = None):
         states = DEFAULT_STATES
     end_date = start_date + timedelta(days=days-1)
     st.markdown(f"### Kanban per stato — {start_date.isoformat()} → {end_date.isoformat()}")
-    events = list_events_range(start_date, end_date)
+    # solo gli stati mostrati, filtrati in SQL; il raggruppamento per colonna resta in memoria
+    events = query_events(start_date, end_date, status=list(states))
+    # cambio stato di più card insieme: un solo UPDATE e un solo rerun
+    if events:
+        labels = {e.id: f"{e.date} — {e.title} ({e.status})" for e in events}
+        bulk_cols = st.columns([3,1,1])
+        with bulk_cols[0]:
+            selected = st.multiselect("Seleziona eventi", options=list(labels.keys()), format_func=lambda x: labels[x], key="kanban_bulk_ids")
+        with bulk_cols[1]:
+            target = st.selectbox("Nuovo stato", options=states, key="kanban_bulk_state")
+        with bulk_cols[2]:
+            if st.button("Applica", key="kanban_bulk_apply", disabled=not selected):
+                try:
+                    bulk_set_status(selected, target, user=st.session_state.get("user",""))
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.experimental_rerun()
     columns = st.columns(len(states))
     for idx, state in enumerate(states):
         with columns[idx]:
@@ -29,23 +56,14 @@ def render_kanban(start_date: date = None, days: int = 7, states: list = None):
                     with target_cols[0]:
                         if st.button("◀ Prev State", key=f"prev_state_{ev.id}_{state}"):
                             # move to previous state in list if exists
-                            try:
-                                i = states.index(state)
-                                if i > 0:
-                                    save_event({"id": ev.id, "status": states[i-1]})
-                                    st.experimental_rerun()
-                            except Exception:
-                                pass
+                            i = states.index(state)
+                            if i > 0:
+                                _set_status(ev.id, states[i-1])
                     with target_cols[1]:
                         if st.button("Set Confirmed", key=f"confirm_state_{ev.id}"):
-                            save_event({"id": ev.id, "status": "confermato"})
-                            st.experimental_rerun()
+                            _set_status(ev.id, "confermato")
                     with target_cols[2]:
                         if st.button("Next State ▶", key=f"next_state_{ev.id}_{state}"):
-                            try:
-                                i = states.index(state)
-                                if i < len(states)-1:
-                                    save_event({"id": ev.id, "status": states[i+1]})
-                                    st.experimental_rerun()
-                            except Exception:
-                                pass
+                            i = states.index(state)
+                            if i < len(states)-1:
+                                _set_status(ev.id, states[i+1])
@@ -0,0 +1,40 @@
+# components/name_picker.py
+import streamlit as st
+from page_cache import lookup_names
+from utils import list_artists, list_services, list_formats, list_promoters, list_tour_managers
+
+# tipo -> lista dei riferimenti (cache di processo), solo per i nomi già selezionati
+REFERENCE_LISTS = {
+    "artist": list_artists,
+    "service": list_services,
+    "format": list_formats,
+    "promoter": list_promoters,
+    "tour_manager": list_tour_managers,
+}
+
+def name_multiselect(label, kind, key, default=(), limit: int = 20):
+    """
+    Multiselect con ricerca per nome: le opzioni sono i nomi trovati da
+    lookup_names per il testo digitato (anche parziale o con errori) più quelli
+    già selezionati, non l'intera anagrafica.
+    Va usato fuori da st.form: la ricerca deve aggiornare le opzioni a ogni tasto.
+    """
+    query = st.text_input(f"Cerca {label.lower()}", key=f"{key}_query", placeholder="nome, anche parziale")
+    selected = st.session_state.get(key, list(default))
+    names = {m.entity_id: m.name for m in lookup_names(query, kind, limit)}
+    missing = [i for i in selected if i not in names]
+    if missing:
+        refs = {r.id: r.name for r in REFERENCE_LISTS[kind]()}
+        for i in missing:
+            names[i] = refs.get(i, f"#{i}")
+    # con key già in session_state il default non va ripassato
+    extra = {} if key in st.session_state else {"default": list(default)}
+    return st.multiselect(label, options=list(names), format_func=lambda x: names.get(x, f"#{x}"), key=key, **extra)
+
+def clear_name_multiselect(key):
+    """
+    Svuota selezione e ricerca di un name_multiselect (fuori da st.form non c'è
+    clear_on_submit): da chiamare prima del rerun dopo un salvataggio riuscito.
+    """
+    st.session_state.pop(key, None)
+    st.session_state.pop(f"{key}_query", None)
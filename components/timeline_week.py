@@ -1,7 +1,8 @@
 # components/timeline_week.py
 import streamlit as st
 from datetime import date, timedelta
-from utils import list_events_range, move_event_date, save_event
+from page_cache import list_events_range
+from utils import move_event_date, save_event
 from components.event_card import render_event_card
 
 def _week_range(center_date: date):
@@ -9,6 +10,15 @@ def _week_range(center_date: date):
     start = center_date - timedelta(days=(center_date.weekday()))
     return [start + timedelta(days=i) for i in range(7)]
 
+def _move(event_id: int, new_date: date):
+    # un conflitto (artista o service già impegnato) resta sulla pagina, senza rerun
+    try:
+        move_event_date(event_id, new_date)
+    except ValueError as e:
+        st.error(str(e))
+    else:
+        st.experimental_rerun()
+
 def render_week(center_date: date = None):
     if center_date is None:
         center_date = date.today()
@@ -31,18 +41,13 @@ def render_week(center_date: date = None):
                     move_cols = st.columns([1,1,1])
                     with move_cols[0]:
                         if st.button("◀", key=f"move_prev_{ev.id}"):
-                            new_date = ev.date - timedelta(days=1)
-                            move_event_date(ev.id, new_date)
-                            st.experimental_rerun()
+                            _move(ev.id, ev.date - timedelta(days=1))
                     with move_cols[1]:
                         if st.button("↺", key=f"move_today_{ev.id}"):
-                            move_event_date(ev.id, date.today())
-                            st.experimental_rerun()
+                            _move(ev.id, date.today())
                     with move_cols[2]:
                         if st.button("▶", key=f"move_next_{ev.id}"):
-                            new_date = ev.date + timedelta(days=1)
-                            move_event_date(ev.id, new_date)
-                            st.experimental_rerun()
+                            _move(ev.id, ev.date + timedelta(days=1))
 
 def render_week_with_controls():
     st.sidebar.markdown("### Controlli Timeline")
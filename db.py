@@ -1,8 +1,13 @@
 # db.py
 import os
 import sys
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+import threading
+from contextlib import contextmanager
+import time
+from typing import Callable, Optional
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import sessionmaker, scoped_session, Session
 from sqlalchemy.exc import SQLAlchemyError
 
 # Assicura che la root del progetto sia nel path (per importare models)
@@ -11,7 +16,7 @@ if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
 try:
-    from models import Base
+    from models import AppMeta, Base
 except Exception as e:
     raise ImportError("Impossibile importare models.Base: " + str(e))
 
@@ -19,13 +24,71 @@ except Exception as e:
 DB_FILE = os.environ.get("AGENCY_DB_FILE", "agency.db")
 DATABASE_URL = f"sqlite:///{DB_FILE}"
 
+# Profilo engine: "production" (WAL, pragmas, pool) oppure "basic" (comportamento storico)
+DB_PROFILE = os.environ.get("AGENCY_DB_PROFILE", "production").lower()
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("AGENCY_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.environ.get("AGENCY_DB_CACHE_SIZE_KB", "20000"))
+DB_MMAP_SIZE = int(os.environ.get("AGENCY_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_POOL_SIZE = int(os.environ.get("AGENCY_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("AGENCY_DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("AGENCY_DB_POOL_TIMEOUT", "30"))
+# foreign_keys=ON solo su richiesta: sui database esistenti righe con riferimenti
+# pendenti, che il codice storico poteva eliminare, fallirebbero con IntegrityError
+DB_FOREIGN_KEYS = os.environ.get("AGENCY_DB_FOREIGN_KEYS", "0").lower() in ("1", "true", "on")
+
+ENGINE_PROFILES = {
+    "basic": {
+        "pragmas": {},
+        "pool": None,
+    },
+    "production": {
+        # eseguiti in quest'ordine su ogni nuova connessione
+        "pragmas": {
+            "busy_timeout": DB_BUSY_TIMEOUT_MS,
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            **({"foreign_keys": "ON"} if DB_FOREIGN_KEYS else {}),
+            "cache_size": -DB_CACHE_SIZE_KB,   # valore negativo = KiB
+            "mmap_size": DB_MMAP_SIZE,
+            "temp_store": "MEMORY",
+        },
+        "pool": {
+            "poolclass": QueuePool,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        },
+    },
+}
+if DB_PROFILE not in ENGINE_PROFILES:
+    raise RuntimeError(f"AGENCY_DB_PROFILE non valido: {DB_PROFILE} (valori: {', '.join(ENGINE_PROFILES)})")
+
+def _build_engine(url: str, profile_name: str):
+    profile = ENGINE_PROFILES[profile_name]
+    connect_args = {"check_same_thread": False}
+    if profile["pragmas"].get("busy_timeout"):
+        # timeout del driver sqlite3 (secondi), coerente con PRAGMA busy_timeout
+        connect_args["timeout"] = profile["pragmas"]["busy_timeout"] / 1000.0
+    new_engine = create_engine(url, connect_args=connect_args, echo=False, **(profile["pool"] or {}))
+
+    pragmas = profile["pragmas"]
+    if pragmas:
+        @event.listens_for(new_engine, "connect")
+        def _apply_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cur.execute(f"PRAGMA {name}={value}")
+            finally:
+                cur.close()
+    return new_engine
+
 # Engine e session factory
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    echo=False
-)
-SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+engine = _build_engine(DATABASE_URL, DB_PROFILE)
+# expire_on_commit=False: gli oggetti restituiti da una unità di lavoro restano
+# leggibili dopo il commit e la chiusura della sessione
+SessionFactory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+SessionLocal = scoped_session(SessionFactory)
 
 def init_db():
     """
@@ -34,9 +97,27 @@ def init_db():
     """
     try:
         Base.metadata.create_all(bind=engine)
+        # indici e altre migrazioni per database creati con versioni precedenti
+        from migrations import apply_migrations
+        apply_migrations(engine)
     except SQLAlchemyError as e:
         raise RuntimeError("Errore durante init_db: " + str(e))
 
+_db_ready_lock = threading.Lock()
+_db_ready = False
+
+def ensure_db_ready():
+    """
+    init_db una sola volta per processo (idempotente). Chiamata da app.py e da
+    page_cache all'import, così ogni pagina aperta anche direttamente trova lo
+    schema aggiornato (app_meta, change_log, indici di ricerca).
+    """
+    global _db_ready
+    with _db_ready_lock:
+        if not _db_ready:
+            init_db()
+            _db_ready = True
+
 def get_session():
     """
     Restituisce una sessione SQLAlchemy attiva.
@@ -50,6 +131,193 @@ def get_session():
     """
     return SessionLocal()
 
+# -------------------------
+# UNITÀ DI LAVORO
+# -------------------------
+_scope_state = threading.local()
+
+@contextmanager
+def session_scope():
+    """
+    Unità di lavoro: una sessione, una transazione, un commit.
+    Esempio:
+        with session_scope() as db:
+            ev = save_event({...}, db=db)
+            add_task(ev.id, "Hotel", db=db)
+    Gli scope annidati nello stesso thread riusano la sessione dello scope più
+    esterno, che è l'unico a fare commit (o rollback in caso di eccezione).
+    """
+    current = getattr(_scope_state, "session", None)
+    if current is not None:
+        yield current
+        return
+    db = SessionFactory()
+    _scope_state.session = db
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        _scope_state.session = None
+        db.close()
+
+def current_scope() -> Optional[Session]:
+    """
+    Sessione dello session_scope attivo nel thread corrente, se presente.
+    """
+    return getattr(_scope_state, "session", None)
+
+def run_after_commit(db: Session, callback: Callable[[], None]) -> None:
+    """
+    Esegue callback dopo il commit della transazione di db (scartato in caso di rollback).
+    Il callback non deve usare db.
+    """
+    db.info.setdefault("_after_commit", []).append(callback)
+
+@event.listens_for(SessionFactory, "after_commit")
+def _run_after_commit_callbacks(db):
+    callbacks = db.info.pop("_after_commit", [])
+    if not callbacks:
+        return
+    # la transazione è chiusa: i callback non devono vederla come scope attivo,
+    # altrimenti record_audit & co. si accodano a una lista già consumata
+    scoped = getattr(_scope_state, "session", None)
+    if scoped is db:
+        _scope_state.session = None
+    try:
+        for cb in callbacks:
+            cb()
+    finally:
+        if scoped is db:
+            _scope_state.session = scoped
+
+@event.listens_for(SessionFactory, "after_rollback")
+def _discard_after_commit_callbacks(db):
+    db.info.pop("_after_commit", None)
+
+# -------------------------
+# VERSIONE DATI
+# -------------------------
+# app_meta.data_version viene incrementato nella stessa transazione di ogni commit
+# di sessione che ha scritto qualcosa (flush con oggetti nuovi/modificati/eliminati
+# o insert/update/delete eseguiti con db.execute). Le cache delle pagine lo usano
+# come chiave: finché nessuno scrive, in questo processo o in un altro worker
+# sullo stesso file, i risultati restano validi. Le scritture fatte direttamente
+# sull'engine (writer dell'audit, migrazioni) non lo incrementano.
+# Su un database non ancora migrato (app_meta o la sua riga mancanti) il commit
+# non incrementa nulla e get_data_version restituisce None: niente cache.
+DATA_VERSION_KEY = "data_version"
+# per quanti secondi riusare il valore letto prima di rileggerlo dal database
+DATA_VERSION_TTL = float(os.environ.get("AGENCY_DATA_VERSION_TTL", "1.0"))
+
+_data_version_lock = threading.Lock()
+_data_version_memo = {"value": None, "read_at": 0.0, "generation": 0}
+# diventa True alla prima verifica riuscita (la tabella non viene mai eliminata)
+_app_meta_ready = False
+
+def _app_meta_exists(conn) -> bool:
+    global _app_meta_ready
+    if not _app_meta_ready:
+        _app_meta_ready = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (AppMeta.__tablename__,)
+        ).first() is not None
+    return _app_meta_ready
+
+@event.listens_for(SessionFactory, "before_flush")
+def _mark_flush_changes(db, flush_context, instances):
+    if db.new or db.dirty or db.deleted:
+        db.info["_data_changed"] = True
+
+@event.listens_for(SessionFactory, "do_orm_execute")
+def _mark_execute_changes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["_data_changed"] = True
+
+@event.listens_for(SessionFactory, "before_commit")
+def _bump_data_version(db):
+    # flush esplicito: le modifiche ancora pendenti vanno contate prima del controllo
+    db.flush()
+    if db.info.pop("_data_changed", False):
+        # via connection(): non ripassa da do_orm_execute
+        conn = db.connection()
+        if not _app_meta_exists(conn):
+            return
+        conn.execute(
+            update(AppMeta.__table__)
+            .where(AppMeta.__table__.c.key == DATA_VERSION_KEY)
+            .values(value=AppMeta.__table__.c.value + 1)
+        )
+        db.info["_data_version_bumped"] = True
+
+@event.listens_for(SessionFactory, "after_commit")
+def _expire_data_version(db):
+    if db.info.pop("_data_version_bumped", False):
+        with _data_version_lock:
+            _data_version_memo["value"] = None
+            _data_version_memo["generation"] += 1
+
+@event.listens_for(SessionFactory, "after_rollback")
+def _discard_data_changes(db):
+    db.info.pop("_data_changed", None)
+    db.info.pop("_data_version_bumped", None)
+
+def get_data_version() -> Optional[int]:
+    """
+    Versione corrente dei dati (una lettura per chiave primaria al massimo ogni
+    DATA_VERSION_TTL secondi; i commit fatti da questo processo sono visibili subito).
+    None se il database non è ancora migrato: i chiamanti non devono usare cache.
+    """
+    now = time.monotonic()
+    with _data_version_lock:
+        if _data_version_memo["value"] is not None and now - _data_version_memo["read_at"] < DATA_VERSION_TTL:
+            return _data_version_memo["value"]
+        generation = _data_version_memo["generation"]
+    with engine.connect() as conn:
+        if not _app_meta_exists(conn):
+            return None
+        value = conn.execute(
+            select(AppMeta.__table__.c.value).where(AppMeta.__table__.c.key == DATA_VERSION_KEY)
+        ).scalar()
+    if value is None:
+        return None
+    with _data_version_lock:
+        # un commit locale arrivato durante la lettura rende il valore già vecchio
+        if _data_version_memo["generation"] == generation:
+            _data_version_memo["value"] = value
+            _data_version_memo["read_at"] = now
+    return value
+
+# -------------------------
+# CONTATORE STATEMENT (diagnostica)
+# -------------------------
+_counter_state = threading.local()
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_counter_state, "stack", ()):
+        counter["statements"] += 1
+
+@contextmanager
+def count_statements():
+    """
+    Conta gli statement SQL eseguiti dal thread corrente dentro il blocco
+    (un executemany conta come uno statement).
+        with count_statements() as c:
+            ...
+        c["statements"]
+    """
+    counter = {"statements": 0}
+    stack = getattr(_counter_state, "stack", None)
+    if stack is None:
+        stack = _counter_state.stack = []
+    stack.append(counter)
+    try:
+        yield counter
+    finally:
+        stack.remove(counter)
+
 # Utility generator (opzionale) per pattern with-like
 def get_db():
     """
@@ -61,3 +329,34 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_db_file_path() -> str:
+    """
+    Percorso assoluto del file SQLite in uso.
+    """
+    return os.path.abspath(DB_FILE)
+
+REPORTED_PRAGMAS = ("journal_mode", "synchronous", "foreign_keys", "busy_timeout", "cache_size", "mmap_size", "temp_store")
+
+def engine_report() -> dict:
+    """
+    Riepilogo della configurazione effettiva: profilo, pragmas letti da una
+    connessione del pool e stato del pool.
+    """
+    pragmas = {}
+    with engine.connect() as conn:
+        for name in REPORTED_PRAGMAS:
+            pragmas[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    pool = engine.pool
+    return {
+        "profile": DB_PROFILE,
+        "db_file": get_db_file_path(),
+        "pragmas": pragmas,
+        "pool": {
+            "class": type(pool).__name__,
+            "status": pool.status(),
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+        },
+    }
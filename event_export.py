@@ -0,0 +1,202 @@
+# event_export.py
+"""
+Export degli eventi per analisi: CSV, Parquet o Feather (Arrow IPC).
+
+Gli eventi vengono letti a blocchi (keyset su date, id, EVENT_EXPORT_CHUNK_SIZE
+righe) con format, promoter e tour manager risolti da LEFT JOIN e i nomi di
+artisti e service letti con una query per blocco: nessun caricamento lazy per
+riga. Ogni blocco viene scritto subito (righe CSV, row group Parquet, record
+batch Arrow), quindi la memoria usata non dipende dall'intervallo esportato.
+
+Parquet e Feather richiedono pyarrow (dipendenza opzionale, importata solo
+quando serve); le colonne hanno tipi espliciti (EVENT_EXPORT_COLUMNS).
+
+La stessa export_events serve il pulsante di download (target = io.BytesIO) e
+lo script scripts/export_events.py (target = percorso del file).
+"""
+import csv
+import io
+import os
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import literal, select, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.types import Date
+
+from db import session_scope
+from models import Artist, Event, Format, Promoter, Service, TourManager, event_artist, event_service
+from utils import build_events_query
+
+EVENT_EXPORT_CHUNK_SIZE = int(os.environ.get("AGENCY_EXPORT_CHUNK_SIZE", "5000"))
+EVENT_EXPORT_FORMATS = ("csv", "parquet", "feather")
+# estensione -> formato (export_events senza fmt)
+EVENT_EXPORT_EXTENSIONS = {".csv": "csv", ".parquet": "parquet", ".feather": "feather", ".arrow": "feather"}
+EVENT_EXPORT_MIME = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+}
+# separatore dei nomi di artisti e service nella stessa cella
+NAME_SEPARATOR = "; "
+
+# colonna -> tipo Arrow ("int64", "date32", "string", "float64")
+EVENT_EXPORT_COLUMNS = {
+    "id": "int64",
+    "date": "date32",
+    "title": "string",
+    "location": "string",
+    "type": "string",
+    "status": "string",
+    "format": "string",
+    "promoter": "string",
+    "tour_manager": "string",
+    "artists": "string",
+    "services": "string",
+    "payments_acconto": "float64",
+    "payments_saldo": "float64",
+}
+
+
+def format_for_path(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EVENT_EXPORT_EXTENSIONS:
+        raise ValueError(f"Estensione non supportata: {ext or path} (valori: {', '.join(EVENT_EXPORT_EXTENSIONS)})")
+    return EVENT_EXPORT_EXTENSIONS[ext]
+
+
+# -------------------------
+# LETTURA A BLOCCHI
+# -------------------------
+def _linked_names(db: Session, table, target_column: str, model, event_ids: List[int]) -> Dict[int, str]:
+    rows = db.execute(
+        select(table.c.event_id, model.name)
+        .join(model, model.id == table.c[target_column])
+        .where(table.c.event_id.in_(event_ids))
+        .order_by(table.c.event_id, model.name)
+    )
+    names: Dict[int, List[str]] = {}
+    for event_id, name in rows:
+        names.setdefault(event_id, []).append(name)
+    return {event_id: NAME_SEPARATOR.join(values) for event_id, values in names.items()}
+
+
+def iter_event_export_chunks(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                             chunk_size: int = EVENT_EXPORT_CHUNK_SIZE, db: Optional[Session] = None,
+                             **filters) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Blocchi di eventi in ordine (date, id), in forma colonnare
+    {colonna: [valori]} con le colonne di EVENT_EXPORT_COLUMNS.
+    filters: gli stessi di utils.query_events (status, type_, artist_id, ...).
+    """
+    last = None
+    while True:
+        q = (
+            build_events_query(db, start_date, end_date, **filters)
+            .outerjoin(Format, Format.id == Event.format_id)
+            .outerjoin(Promoter, Promoter.id == Event.promoter_id)
+            .outerjoin(TourManager, TourManager.id == Event.tour_manager_id)
+            .with_entities(
+                Event.id, Event.date, Event.title, Event.location, Event.type, Event.status,
+                Format.name, Promoter.name, TourManager.name, Event.payments_acconto, Event.payments_saldo,
+            )
+        )
+        if last is not None:
+            q = q.filter(tuple_(Event.date, Event.id) > tuple_(literal(last[0], Date), literal(last[1])))
+        rows = q.order_by(Event.date, Event.id).limit(chunk_size).all()
+        if not rows:
+            return
+        event_ids = [row[0] for row in rows]
+        artists = _linked_names(db, event_artist, "artist_id", Artist, event_ids)
+        services = _linked_names(db, event_service, "service_id", Service, event_ids)
+        chunk: Dict[str, List[Any]] = {name: [] for name in EVENT_EXPORT_COLUMNS}
+        for (eid, d, title, location, type_, status, format_name, promoter, tour_manager,
+             acconto, saldo) in rows:
+            values = (eid, d, title, location or "", type_, status, format_name or "", promoter or "",
+                      tour_manager or "", artists.get(eid, ""), services.get(eid, ""), acconto, saldo)
+            for name, value in zip(EVENT_EXPORT_COLUMNS, values):
+                chunk[name].append(value)
+        yield chunk
+        last = (rows[-1][1], rows[-1][0])
+
+
+# -------------------------
+# SCRITTURA
+# -------------------------
+def _write_csv(target, chunks) -> int:
+    # target binario (BytesIO, file aperto in "wb") o percorso
+    if isinstance(target, str):
+        fh = open(target, "w", encoding="utf-8", newline="")
+    else:
+        fh = io.TextIOWrapper(target, encoding="utf-8", newline="", write_through=True)
+    n = 0
+    try:
+        writer = csv.writer(fh)
+        writer.writerow(list(EVENT_EXPORT_COLUMNS))
+        for chunk in chunks:
+            rows = zip(*chunk.values())
+            writer.writerows(
+                [value.isoformat() if isinstance(value, date) else value for value in row] for row in rows
+            )
+            n += len(chunk["id"])
+    finally:
+        if isinstance(target, str):
+            fh.close()
+        else:
+            fh.flush()
+            fh.detach()   # il chiamante resta proprietario del file binario
+    return n
+
+
+def _arrow_schema():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("L'export Parquet/Feather richiede pyarrow (pip install pyarrow)")
+    return pa, pa.schema([(name, getattr(pa, type_name)()) for name, type_name in EVENT_EXPORT_COLUMNS.items()])
+
+
+def _write_arrow(target, chunks, fmt: str) -> int:
+    pa, schema = _arrow_schema()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(target, schema)
+    else:
+        # Feather v2 è il formato file Arrow IPC
+        writer = pa.ipc.new_file(target, schema)
+    n = 0
+    try:
+        for chunk in chunks:
+            # un row group / record batch per blocco
+            writer.write_table(pa.Table.from_pydict(chunk, schema=schema))
+            n += len(chunk["id"])
+    finally:
+        writer.close()
+    return n
+
+
+def export_events(target, fmt: Optional[str] = None, start_date: Optional[date] = None,
+                  end_date: Optional[date] = None, chunk_size: int = EVENT_EXPORT_CHUNK_SIZE,
+                  db: Optional[Session] = None, **filters) -> int:
+    """
+    Esporta gli eventi filtrati su target (percorso o file binario aperto in
+    scrittura) nel formato fmt ("csv", "parquet", "feather"; dal suffisso del
+    percorso se omesso). Le letture avvengono in un'unica transazione.
+    Restituisce il numero di eventi esportati.
+    """
+    if fmt is None:
+        if not isinstance(target, str):
+            raise ValueError("Indicare fmt quando target non è un percorso")
+        fmt = format_for_path(target)
+    if fmt not in EVENT_EXPORT_FORMATS:
+        raise ValueError(f"Formato non valido: {fmt} (valori: {', '.join(EVENT_EXPORT_FORMATS)})")
+    if fmt != "csv":
+        # errore subito, prima di aprire la transazione o creare il file
+        _arrow_schema()
+    if db is None:
+        with session_scope() as db:
+            return export_events(target, fmt, start_date, end_date, chunk_size, db=db, **filters)
+    chunks = iter_event_export_chunks(start_date, end_date, chunk_size, db=db, **filters)
+    if fmt == "csv":
+        return _write_csv(target, chunks)
+    return _write_arrow(target, chunks, fmt)
@@ -0,0 +1,276 @@
+# migrations.py
+"""
+Migrazioni online per database agency.db già esistenti.
+
+Base.metadata.create_all crea gli indici solo insieme alle tabelle nuove: gli
+indici aggiunti in models.py su tabelle già presenti vanno creati qui, con
+CREATE INDEX (nessuna ricostruzione delle tabelle). Tutte le operazioni sono
+idempotenti; init_db() chiama apply_migrations() a ogni avvio.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import exists, inspect, or_, select, union
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import (
+    AppMeta, Base, Artist, ArtistBooking, Event, event_artist, event_performer,
+    PERFORMER_FIELDS, parse_performer_ids
+)
+from audit import index_audit_archive
+from search import ensure_name_index, ensure_search_index
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_indexes(engine) -> List[str]:
+    """
+    Crea gli indici dichiarati in models.py che mancano nel database.
+    Restituisce i nomi degli indici creati.
+    """
+    created = []
+    with engine.begin() as conn:
+        insp = inspect(conn)
+        existing_tables = set(insp.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {ix["name"] for ix in insp.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name not in existing:
+                    index.create(conn)
+                    created.append(index.name)
+        if created:
+            # statistiche aggiornate per il planner sugli indici nuovi
+            conn.exec_driver_sql("ANALYZE")
+    return created
+
+
+def migrate_event_performers(engine) -> int:
+    """
+    Copia dj_id/vocalist_id/ballerine_ids/mascotte_ids in event_performer per gli
+    eventi che hanno valori legacy ma nessuna riga performer (id di artisti
+    inesistenti vengono scartati). Restituisce il numero di righe inserite.
+    """
+    ev = Event.__table__
+    legacy = [ev.c[field] for field in PERFORMER_FIELDS]
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(ev.c.id, *legacy)
+            .where(or_(ev.c.dj_id.isnot(None), ev.c.vocalist_id.isnot(None),
+                       ev.c.ballerine_ids != "", ev.c.mascotte_ids != ""))
+            .where(~exists().where(event_performer.c.event_id == ev.c.id))
+        ).all()
+        if not rows:
+            return 0
+        known = set(conn.execute(select(Artist.__table__.c.id)).scalars())
+        links = [
+            {"event_id": row[0], "artist_id": aid, "role": role}
+            for row in rows
+            for value, role in zip(row[1:], PERFORMER_FIELDS.values())
+            for aid in parse_performer_ids(value)
+            if aid in known
+        ]
+        if links:
+            conn.execute(event_performer.insert(), links)
+    return len(links)
+
+
+def _missing_artist_bookings():
+    # collegamenti artista-evento (event_artist + event_performer) senza riga artist_bookings
+    ev = Event.__table__
+    ab = ArtistBooking.__table__
+    links = union(
+        select(event_artist.c.event_id, event_artist.c.artist_id),
+        select(event_performer.c.event_id, event_performer.c.artist_id),
+    ).subquery()
+    return (
+        select(links.c.event_id, links.c.artist_id, ev.c.date)
+        .join(ev, ev.c.id == links.c.event_id)
+        .where(links.c.artist_id.isnot(None))
+        .where(~exists().where(ab.c.event_id == links.c.event_id, ab.c.artist_id == links.c.artist_id))
+        .order_by(ev.c.date, links.c.event_id)
+    )
+
+
+def backfill_artist_bookings(engine) -> int:
+    """
+    Crea le righe artist_bookings mancanti a partire da event_artist ed event_performer.
+    Se i dati esistenti contengono già doppi impegni (stesso artista, stessa data)
+    viene tenuta la prima riga: uq_artist_date scarta le altre, che restano
+    elencate da find_unbooked_artist_links finché non vengono risolte.
+    Restituisce il numero di righe inserite.
+    """
+    ab = ArtistBooking.__table__
+    stmt = sqlite_insert(ab).from_select(["event_id", "artist_id", "date"], _missing_artist_bookings()).on_conflict_do_nothing()
+    with engine.begin() as conn:
+        return conn.execute(stmt).rowcount
+
+
+def find_unbooked_artist_links(engine) -> List[Tuple[int, Any, int]]:
+    """
+    Doppi impegni preesistenti che backfill_artist_bookings non ha potuto
+    registrare: (artist_id, data, event_id) degli eventi che citano un artista
+    già impegnato quel giorno in un altro evento. Finché restano, il salvataggio
+    di quegli eventi fallisce su find_artist_conflicts: togliere l'artista o
+    spostare l'evento.
+    """
+    with engine.connect() as conn:
+        return [(artist_id, d, event_id) for event_id, artist_id, d in conn.execute(_missing_artist_bookings())]
+
+
+def ensure_app_meta(engine) -> None:
+    """
+    Crea le righe di app_meta mancanti (data_version parte da 0).
+    """
+    from db import DATA_VERSION_KEY
+    stmt = sqlite_insert(AppMeta.__table__).values(key=DATA_VERSION_KEY, value=0).on_conflict_do_nothing()
+    with engine.begin() as conn:
+        conn.execute(stmt)
+
+
+# tabella -> (entity in change_log, colonna chiave). Le tabelle di associazione e
+# le assegnazioni registrano una modifica dell'evento a cui appartengono.
+CHANGE_TRACKED_TABLES = {
+    "events": ("event", "id"),
+    "tasks": ("task", "id"),
+    "artists": ("artist", "id"),
+    "services": ("service", "id"),
+    "formats": ("format", "id"),
+    "promoters": ("promoter", "id"),
+    "tour_managers": ("tour_manager", "id"),
+    "event_templates": ("event_template", "id"),
+    "task_templates": ("task_template", "id"),
+    "event_artist": ("event", "event_id"),
+    "event_service": ("event", "event_id"),
+    "event_performer": ("event", "event_id"),
+    "service_assignments": ("event", "event_id"),
+    "artist_bookings": ("event", "event_id"),
+}
+
+# evento SQL -> (azione registrata, riga di riferimento)
+_CHANGE_TRIGGER_OPS = {"INSERT": ("create", "NEW"), "UPDATE": ("update", "NEW"), "DELETE": ("delete", "OLD")}
+
+
+def ensure_change_triggers(engine) -> List[str]:
+    """
+    Crea i trigger AFTER INSERT/UPDATE/DELETE che scrivono change_log (vedi
+    CHANGE_TRACKED_TABLES). Restituisce i nomi dei trigger creati.
+    """
+    created = []
+    with engine.begin() as conn:
+        existing = set(conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalars())
+        for table, (entity, key) in CHANGE_TRACKED_TABLES.items():
+            own_entity = key == "id"
+            for op, (action, ref) in _CHANGE_TRIGGER_OPS.items():
+                name = f"trg_change_{table}_{op.lower()}"
+                if name in existing:
+                    continue
+                # per le associazioni ogni operazione è una modifica dell'evento
+                logged_action = action if own_entity else "update"
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER {name} AFTER {op} ON {table} BEGIN "
+                    f"INSERT INTO change_log (entity, entity_id, action, ts) "
+                    f"VALUES ('{entity}', {ref}.{key}, '{logged_action}', strftime('%Y-%m-%d %H:%M:%f', 'now')); "
+                    f"END"
+                )
+                created.append(name)
+    return created
+
+
+def apply_migrations(engine) -> Dict[str, Any]:
+    """
+    Esegue tutte le migrazioni online e restituisce un riepilogo.
+    """
+    ensure_app_meta(engine)
+    summary = {
+        "indexes_created": ensure_indexes(engine),
+        "performers_migrated": migrate_event_performers(engine),
+        "artist_bookings_created": backfill_artist_bookings(engine),
+        "artist_booking_conflicts": find_unbooked_artist_links(engine),
+        "audit_segments_indexed": index_audit_archive(engine),
+        "change_triggers_created": ensure_change_triggers(engine),
+        "search_index_created": ensure_search_index(engine),
+        "name_index_created": ensure_name_index(engine),
+    }
+    if summary["artist_booking_conflicts"]:
+        logger.warning("Doppi impegni non registrati in artist_bookings (artist_id, data, event_id): %s",
+                       summary["artist_booking_conflicts"])
+    return summary
+
+
+# -------------------------
+# VERIFICA PIANI DI ESECUZIONE
+# -------------------------
+# (indice atteso, query con la stessa forma di quella in utils.py, parametri)
+INDEX_PLAN_CHECKS = [
+    ("ix_events_status_date",
+     "SELECT id FROM events WHERE status = :status AND date >= :start AND date <= :end ORDER BY date",
+     {"status": "confermato", "start": "2000-01-01", "end": "2000-12-31"}),
+    ("ix_events_date_status_type",
+     "SELECT date, status, type, count(id), min(id) FROM events WHERE date >= :start AND date <= :end GROUP BY date, status, type",
+     {"start": "2000-01-01", "end": "2000-01-31"}),
+    ("ix_tasks_due_date",
+     "SELECT id FROM tasks WHERE due_date = :d ORDER BY done, created_at",
+     {"d": "2000-01-01"}),
+    ("ix_tasks_assignee_done_due",
+     "SELECT id FROM tasks WHERE assignee = :a AND done = 0 ORDER BY due_date, created_at",
+     {"a": "ale"}),
+    ("ix_audit_logs_entity_ts",
+     "SELECT id FROM audit_logs WHERE entity = :e AND entity_id = :i ORDER BY ts DESC LIMIT 100",
+     {"e": "event", "i": 1}),
+    ("ix_audit_logs_entity_ts",
+     "SELECT id FROM audit_logs WHERE entity = :e AND entity_id = :i AND ts <= :ts AND (ts < :ts OR id < :id) "
+     "ORDER BY ts DESC, id DESC LIMIT 26",
+     {"e": "event", "i": 1, "ts": "2000-01-01", "id": 1}),
+    ("ix_audit_logs_ts",
+     "SELECT id FROM audit_logs WHERE ts < :before ORDER BY ts, id LIMIT 5000",
+     {"before": "2000-01-01"}),
+    ("ix_audit_archive_entries_entity",
+     "SELECT segment_id FROM audit_archive_entries WHERE entity = :e AND entity_id = :i",
+     {"e": "event", "i": 1}),
+    ("ix_artists_role_name",
+     "SELECT id, name FROM artists WHERE role = :r AND name > :after ORDER BY name LIMIT 26",
+     {"r": "dj", "after": ""}),
+    ("ix_event_artist_event",
+     "SELECT artist_id FROM event_artist WHERE event_id = :e",
+     {"e": 1}),
+    ("ix_event_artist_artist",
+     "SELECT event_id FROM event_artist WHERE artist_id = :a",
+     {"a": 1}),
+    ("ix_event_performer_artist",
+     "SELECT event_id FROM event_performer WHERE artist_id = :a AND role = :r",
+     {"a": 1, "r": "dj"}),
+    ("ix_event_performer_event",
+     "SELECT role, artist_id FROM event_performer WHERE event_id = :e",
+     {"e": 1}),
+    ("ix_event_service_event",
+     "SELECT service_id FROM event_service WHERE event_id = :e",
+     {"e": 1}),
+    ("ix_event_service_service",
+     "SELECT event_id FROM event_service WHERE service_id = :s",
+     {"s": 1}),
+]
+
+
+def explain(engine, sql: str, params: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Righe "detail" di EXPLAIN QUERY PLAN per la query data.
+    """
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params or {}).all()
+    return [row[-1] for row in rows]
+
+
+def check_index_usage(engine, checks=None) -> List[Dict[str, Any]]:
+    """
+    Per ogni controllo verifica con EXPLAIN QUERY PLAN che l'indice atteso sia usato.
+    Restituisce [{"index", "used", "plan"}].
+    """
+    results = []
+    for index_name, sql, params in checks or INDEX_PLAN_CHECKS:
+        plan = explain(engine, sql, params)
+        used = any(f"INDEX {index_name}" in line for line in plan)
+        results.append({"index": index_name, "used": used, "plan": plan})
+    return results
@@ -1,7 +1,7 @@
 # models.py
 from sqlalchemy import (
     Column, Integer, String, Date, Table, ForeignKey, Text, Float,
-    DateTime, Boolean, UniqueConstraint
+    DateTime, Boolean, UniqueConstraint, Index, LargeBinary
 )
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
@@ -13,14 +13,56 @@ event_artist = Table(
     "event_artist",
     Base.metadata,
     Column("event_id", Integer, ForeignKey("events.id")),
-    Column("artist_id", Integer, ForeignKey("artists.id"))
+    Column("artist_id", Integer, ForeignKey("artists.id")),
+    Index("ix_event_artist_event", "event_id", "artist_id"),
+    Index("ix_event_artist_artist", "artist_id", "event_id")
 )
 
 event_service = Table(
     "event_service",
     Base.metadata,
     Column("event_id", Integer, ForeignKey("events.id")),
-    Column("service_id", Integer, ForeignKey("services.id"))
+    Column("service_id", Integer, ForeignKey("services.id")),
+    Index("ix_event_service_event", "event_id", "service_id"),
+    Index("ix_event_service_service", "service_id", "event_id")
+)
+
+# stati ammessi per Event.status (stesse opzioni delle pagine)
+EVENT_STATUSES = ("bozza", "confermato", "cancellato")
+
+# ruoli format-specific (dj, vocalist, ballerine, mascotte) per evento
+PERFORMER_ROLES = ("dj", "vocalist", "ballerina", "mascotte")
+# colonna legacy di Event -> ruolo in event_performer
+PERFORMER_FIELDS = {"dj_id": "dj", "vocalist_id": "vocalist", "ballerine_ids": "ballerina", "mascotte_ids": "mascotte"}
+
+def parse_performer_ids(value) -> list:
+    """
+    Id da un valore legacy: intero, lista o stringa "1,2,3" (valori non numerici ignorati).
+    """
+    if value in (None, "", 0):
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    elif not isinstance(value, (list, tuple, set)):
+        value = [value]
+    ids = []
+    for v in value:
+        try:
+            v = int(str(v).strip())
+        except ValueError:
+            continue
+        if v and v not in ids:
+            ids.append(v)
+    return ids
+
+event_performer = Table(
+    "event_performer",
+    Base.metadata,
+    Column("event_id", Integer, ForeignKey("events.id"), nullable=False),
+    Column("artist_id", Integer, ForeignKey("artists.id"), nullable=False),
+    Column("role", String, nullable=False),          # uno di PERFORMER_ROLES
+    Index("ix_event_performer_event", "event_id", "role", "artist_id", unique=True),
+    Index("ix_event_performer_artist", "artist_id", "role", "event_id")
 )
 
 # -------------------------
@@ -47,6 +89,7 @@ class Event(Base):
     payments_acconto = Column(Float, nullable=True)
     payments_saldo = Column(Float, nullable=True)
 
+    # copia legacy di event_performer (tenuta allineata da save_event): usare event_performer per le ricerche
     dj_id = Column(Integer, nullable=True)
     vocalist_id = Column(Integer, nullable=True)
     ballerine_ids = Column(String, default="")   # comma separated ids
@@ -59,6 +102,11 @@ class Event(Base):
     promoter = relationship("Promoter", back_populates="events")
     tour_manager = relationship("TourManager", back_populates="events")
 
+    __table_args__ = (
+        Index("ix_events_status_date", "status", "date"),            # filtri stato + intervallo date
+        Index("ix_events_date_status_type", "date", "status", "type"),  # conteggi calendario (covering)
+    )
+
 class Artist(Base):
     __tablename__ = "artists"
     id = Column(Integer, primary_key=True, index=True)
@@ -69,6 +117,10 @@ class Artist(Base):
     notes = Column(Text, default="")
     events = relationship("Event", secondary=event_artist, back_populates="artists")
 
+    __table_args__ = (
+        Index("ix_artists_role_name", "role", "name"),   # pagine per ruolo (list_artists_page)
+    )
+
 class Service(Base):
     __tablename__ = "services"
     id = Column(Integer, primary_key=True, index=True)
@@ -123,6 +175,11 @@ class Task(Base):
 
     event = relationship("Event", backref="tasks")
 
+    __table_args__ = (
+        Index("ix_tasks_due_date", "due_date", "done", "created_at"),        # list_tasks_by_date
+        Index("ix_tasks_assignee_done_due", "assignee", "done", "due_date", "created_at"),  # get_user_tasks
+    )
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     id = Column(Integer, primary_key=True, index=True)
@@ -133,6 +190,46 @@ class AuditLog(Base):
     user = Column(String, default="")
     ts = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_audit_logs_entity_ts", "entity", "entity_id", "ts"),  # get_audit_logs
+        Index("ix_audit_logs_ts", "ts"),                                 # archive_audit_logs
+    )
+
+class AuditArchiveSegment(Base):
+    """
+    Righe di audit archiviate (vedi audit.archive_audit_logs): un segmento per
+    mese ed entity per ogni esecuzione, righe in JSON compresso con zlib.
+    """
+    __tablename__ = "audit_archive_segments"
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(String, nullable=False)          # "YYYY-MM"
+    entity = Column(String, nullable=False)
+    row_count = Column(Integer, default=0)
+    first_ts = Column(DateTime, nullable=True)
+    last_ts = Column(DateTime, nullable=True)
+    data = Column(LargeBinary, nullable=False)      # zlib(json list di righe audit_logs)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_audit_archive_entity_last_ts", "entity", "last_ts"),
+    )
+
+class AuditArchiveEntry(Base):
+    """
+    Indice dei segmenti di archivio: una riga per ogni entity_id presente in un
+    segmento, così read_archived_audit(entity, entity_id) decomprime solo i
+    segmenti che contengono l'id.
+    """
+    __tablename__ = "audit_archive_entries"
+    id = Column(Integer, primary_key=True)
+    segment_id = Column(Integer, ForeignKey("audit_archive_segments.id"), nullable=False)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=True)      # NULL: righe senza entity_id
+
+    __table_args__ = (
+        Index("ix_audit_archive_entries_entity", "entity", "entity_id", "segment_id"),
+    )
+
 class ServiceAssignment(Base):
     __tablename__ = "service_assignments"
     id = Column(Integer, primary_key=True, index=True)
@@ -144,6 +241,43 @@ class ServiceAssignment(Base):
     event = relationship("Event", backref="service_assignments")
     service = relationship("Service", back_populates="assignments")
 
+class ArtistBooking(Base):
+    """
+    Impegno di un artista in una data (artisti dell'evento + performer), come
+    ServiceAssignment per i service: uq_artist_date impedisce il doppio impegno.
+    Tenuta allineata da utils (save_event, move_event_date, duplicate_event).
+    """
+    __tablename__ = "artist_bookings"
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
+    artist_id = Column(Integer, ForeignKey("artists.id"), nullable=False, index=True)
+    date = Column(Date, nullable=False, index=True)
+    __table_args__ = (UniqueConstraint('artist_id', 'date', name='uq_artist_date'),)
+
+class AppMeta(Base):
+    """
+    Valori globali chiave -> intero (es. data_version, incrementato da db.py a ogni
+    commit che modifica dati).
+    """
+    __tablename__ = "app_meta"
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class ChangeLog(Base):
+    """
+    Sequenza globale delle modifiche: una riga per ogni riga inserita, modificata o
+    eliminata nelle tabelle tracciate, scritta dai trigger SQLite creati da
+    migrations.ensure_change_triggers nella stessa transazione della modifica.
+    seq è AUTOINCREMENT: non viene mai riusato, anche dopo utils.prune_change_log.
+    """
+    __tablename__ = "change_log"
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)         # stessi nomi dell'audit: "event","task","artist",...
+    entity_id = Column(Integer, nullable=True)
+    action = Column(String, nullable=False)         # "create","update","delete"
+    ts = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = {"sqlite_autoincrement": True}
+
 # -------------------------
 # EXTERNAL INTEGRATIONS
 # -------------------------
@@ -0,0 +1,86 @@
+# page_cache.py
+"""
+Letture di utils.py (e search.py) con cache per le pagine Streamlit.
+
+Ogni risultato è memorizzato con st.cache_data sotto la chiave
+(funzione, db.get_data_version(), argomenti): finché nessuno scrive sul database
+i rerun delle pagine non eseguono query; il primo commit che modifica dati,
+anche da un altro worker sullo stesso agency.db, cambia la versione e le letture
+successive tornano al database.
+
+st.cache_data restituisce a ogni chiamata una copia (pickle) del risultato: gli
+oggetti sono distaccati dalla sessione e hanno solo le relazioni già caricate
+dalla funzione originale. Le funzioni si chiamano senza db= (la sessione non fa
+parte della chiave). Senza data_version (database non migrato) le letture vanno
+sempre al database.
+"""
+import functools
+import os
+
+import streamlit as st
+
+import search
+import utils
+from db import ensure_db_ready, get_data_version
+
+# risultati tenuti in memoria (tutte le funzioni insieme); le versioni vecchie
+# non vengono più richieste ed escono per prime
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("AGENCY_PAGE_CACHE_MAX_ENTRIES", "512"))
+
+
+# "modulo.funzione" -> funzione originale
+_CACHED_FUNCTIONS = {}
+
+
+@st.cache_data(show_spinner=False, max_entries=PAGE_CACHE_MAX_ENTRIES)
+def _cached_call(name: str, data_version: int, args: tuple, kwargs: dict):
+    return _CACHED_FUNCTIONS[name](*args, **kwargs)
+
+
+def _cached(fn):
+    name = f"{fn.__module__}.{fn.__name__}"
+    _CACHED_FUNCTIONS[name] = fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        data_version = get_data_version()
+        if data_version is None:
+            return fn(*args, **kwargs)
+        return _cached_call(name, data_version, args, kwargs)
+    return wrapper
+
+
+def clear_page_cache() -> None:
+    """
+    Svuota la cache (non serve dopo le scritture: basta la data_version).
+    """
+    _cached_call.clear()
+
+
+# schema aggiornato prima della prima lettura, anche aprendo una pagina direttamente
+ensure_db_ready()
+
+
+# -------------------------
+# LETTURE IN CACHE
+# -------------------------
+query_events = _cached(utils.query_events)
+list_events_page = _cached(utils.list_events_page)
+list_event_ids = _cached(utils.list_event_ids)
+list_events_range = _cached(utils.list_events_range)
+list_events_by_date = _cached(utils.list_events_by_date)
+upcoming_events = _cached(utils.upcoming_events)
+count_events_by_day = _cached(utils.count_events_by_day)
+get_event = _cached(utils.get_event)
+events_without_dj = _cached(utils.events_without_dj)
+events_without_promoter = _cached(utils.events_without_promoter)
+load_day_bundle = _cached(utils.load_day_bundle)
+list_tasks_for_event = _cached(utils.list_tasks_for_event)
+get_user_tasks = _cached(utils.get_user_tasks)
+search_text = _cached(search.search_text)
+lookup_names = _cached(search.lookup_names)
+list_artists_page = _cached(utils.list_artists_page)
+list_formats_page = _cached(utils.list_formats_page)
+list_services_page = _cached(utils.list_services_page)
+list_promoters_page = _cached(utils.list_promoters_page)
+list_tour_managers_page = _cached(utils.list_tour_managers_page)
@@ -3,7 +3,7 @@ import streamlit as st
 from datetime import date
 from components.calendar_advanced import render_month, show_day_panel
 from components.event_card import render_event_card
-from utils import list_events_range, upcoming_events
+from page_cache import upcoming_events
 import calendar
 
 st.set_page_config(page_title="Calendario", layout="wide")
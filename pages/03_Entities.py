@@ -1,16 +1,54 @@
 # pages/03_Entities.py
+import math
 import streamlit as st
+from page_cache import (
+    list_artists_page, list_formats_page, list_services_page,
+    list_promoters_page, list_tour_managers_page
+)
 from utils import (
-    list_artists, add_artist, update_artist, delete_artist,
-    list_formats, add_format, update_format, delete_format,
-    list_services, add_service, update_service, delete_service,
-    list_promoters, add_promoter, update_promoter, delete_promoter,
-    list_tour_managers, add_tour_manager, update_tour_manager, delete_tour_manager
+    add_artist, update_artist, delete_artist,
+    add_format, update_format, delete_format,
+    add_service, update_service, delete_service,
+    add_promoter, update_promoter, delete_promoter,
+    add_tour_manager, update_tour_manager, delete_tour_manager,
+    ENTITY_PAGE_SIZE
 )
 
 st.set_page_config(page_title="Entità - Agency Planner", layout="wide")
 st.header("Gestione entità")
 
+ARTIST_ROLES = ["artist", "mascotte", "vocalist", "ballerina", "dancer", "other"]
+
+def paged_list(kind, loader, **filters):
+    """
+    Elementi della pagina corrente (una query keyset, vedi utils._references_page).
+    In session_state resta la pila degli after_name delle pagine visitate; se i
+    filtri cambiano si riparte dalla prima pagina.
+    """
+    starts_key = f"{kind}_page_starts"
+    if st.session_state.get(f"{kind}_page_filters") != filters:
+        st.session_state[f"{kind}_page_filters"] = filters
+        st.session_state[starts_key] = [None]
+    starts = st.session_state.setdefault(starts_key, [None])
+    page = loader(after_name=starts[-1], **filters)
+    if not page.items and len(starts) > 1:
+        # ultima pagina svuotata da eliminazioni: si torna alla precedente
+        starts.pop()
+        page = loader(after_name=starts[-1], **filters)
+    nav = st.columns([1, 1, 4])
+    with nav[0]:
+        if st.button("◀ Precedenti", key=f"{kind}_page_prev", disabled=len(starts) == 1):
+            starts.pop()
+            st.experimental_rerun()
+    with nav[1]:
+        if st.button("Successivi ▶", key=f"{kind}_page_next", disabled=page.next_after is None):
+            starts.append(page.next_after)
+            st.experimental_rerun()
+    with nav[2]:
+        pages = max(1, math.ceil(page.total / ENTITY_PAGE_SIZE))
+        st.caption(f"Pagina {len(starts)} di {pages}  •  {page.total} in totale")
+    return page.items
+
 tabs = st.tabs(["Artisti", "Format", "Service", "Promoter", "Tour Manager"])
 
 #### ARTISTI
@@ -19,10 +57,7 @@ with tabs[0]:
     with st.expander("Aggiungi nuovo artista / performer"):
         with st.form("add_artist_form"):
             name = st.text_input("Nome")
-            role = st.selectbox(
-                "Ruolo",
-                ["artist", "mascotte", "vocalist", "ballerina", "dancer", "other"]
-            )
+            role = st.selectbox("Ruolo", ARTIST_ROLES)
             phone = st.text_input("Telefono")
             email = st.text_input("Email")
             notes = st.text_area("Note")
@@ -36,7 +71,8 @@ with tabs[0]:
 
     st.markdown("---")
     st.subheader("Lista artisti")
-    artists = list_artists()
+    role_filter = st.selectbox("Filtra per ruolo", ["tutti"] + ARTIST_ROLES, key="artists_role_filter")
+    artists = paged_list("artist", list_artists_page, role=None if role_filter == "tutti" else role_filter)
     for a in artists:
         cols = st.columns([3, 1, 1, 1])
         with cols[0]:
@@ -66,7 +102,7 @@ with tabs[0]:
             st.subheader(f"Modifica artista: {artist.name}")
             with st.form("edit_artist_form"):
                 name = st.text_input("Nome", value=artist.name)
-                role_options = ["artist", "mascotte", "vocalist", "ballerina", "dancer", "other"]
+                role_options = ARTIST_ROLES
                 default_index = role_options.index(artist.role) if artist.role in role_options else len(role_options) - 1
                 role = st.selectbox("Ruolo", role_options, index=default_index)
                 phone = st.text_input("Telefono", value=artist.phone)
@@ -97,7 +133,7 @@ with tabs[1]:
 
     st.markdown("---")
     st.subheader("Lista format")
-    formats = list_formats()
+    formats = paged_list("format", list_formats_page)
     for f in formats:
         cols = st.columns([3, 1, 1])
         with cols[0]:
@@ -150,7 +186,7 @@ with tabs[2]:
 
     st.markdown("---")
     st.subheader("Lista service")
-    services = list_services()
+    services = paged_list("service", list_services_page)
     for s in services:
         cols = st.columns([3, 1, 1])
         with cols[0]:
@@ -205,7 +241,7 @@ with tabs[3]:
 
     st.markdown("---")
     st.subheader("Lista promoter")
-    promoters = list_promoters()
+    promoters = paged_list("promoter", list_promoters_page)
     for p in promoters:
         cols = st.columns([3, 1, 1])
         with cols[0]:
@@ -261,7 +297,7 @@ with tabs[4]:
 
     st.markdown("---")
     st.subheader("Lista tour manager")
-    tms = list_tour_managers()
+    tms = paged_list("tour_manager", list_tour_managers_page)
     for t in tms:
         cols = st.columns([3, 1, 1])
         with cols[0]:
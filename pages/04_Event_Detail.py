@@ -1,10 +1,12 @@
 # pages/04_Event_Detail.py
 import streamlit as st
 from datetime import date
+from page_cache import get_event
+from components.name_picker import name_multiselect, clear_name_multiselect
 from utils import (
-    get_event, save_event, delete_event, list_artists_by_role,
-    list_formats, list_services, list_promoters, list_tour_managers,
-    get_audit_logs, record_audit
+    save_event, delete_event, list_artists_by_role,
+    list_formats, list_promoters, list_tour_managers,
+    get_audit_page, record_audit
 )
 
 st.set_page_config(page_title="Scheda Evento", layout="wide")
@@ -17,6 +19,9 @@ if not ev:
     st.info("Nessun evento selezionato. Apri un evento dal calendario o dalla lista.")
 else:
     st.markdown(f"## Evento: {ev.title}  •  {ev.date}")
+    # fuori dal form: la ricerca per nome aggiorna le opzioni mentre si digita
+    default_services = [s.id for s in ev.services] if ev.services else []
+    selected_services = name_multiselect("Service", "service", key=f"event_services_{ev.id}", default=default_services)
     # form principale
     with st.form("event_form", clear_on_submit=False):
         left, right = st.columns([2,1])
@@ -25,10 +30,6 @@ else:
             ev_date = st.date_input("Data", value=ev.date or date.today())
             location = st.text_input("Luogo", value=ev.location or "")
             notes = st.text_area("Note", value=ev.notes or "", height=140)
-            services = list_services()
-            service_map = {s.id: s.name for s in services}
-            default_services = [s.id for s in ev.services] if ev.services else []
-            selected_services = st.multiselect("Service", options=list(service_map.keys()), format_func=lambda x: service_map[x], default=default_services)
         with right:
             st.markdown("### Logistica")
             van = st.text_input("Van", value=ev.van or "")
@@ -77,6 +78,9 @@ else:
                 new_ev = save_event(payload, user=st.session_state.get("user",""))
                 if new_ev:
                     st.success("Evento salvato")
+                    st.session_state.pop(f"audit_panel_{ev.id}", None)
+                    # alla prossima apertura i service ripartono da quelli salvati
+                    clear_name_multiselect(f"event_services_{ev.id}")
                     st.session_state.pop("open_event_id", None)
                     st.experimental_rerun()
                 else:
@@ -103,29 +107,51 @@ else:
     # sezione Audit e Activity
     st.markdown("---")
     st.markdown("## Activity Audit")
-    logs = get_audit_logs(entity="event", entity_id=ev.id, limit=200)
+    # prima pagina riletta a ogni rerun (query per indice, LIMIT): task, spostamenti,
+    # operazioni multiple e modifiche di altri utenti compaiono subito. In
+    # session_state restano solo le pagine precedenti caricate su richiesta, legate
+    # al cursore della prima pagina da cui sono partite ("anchor"): se nel
+    # frattempo la prima pagina è cambiata vengono scartate (niente buchi o doppioni).
+    audit_key = f"audit_panel_{ev.id}"
+    first = get_audit_page("event", ev.id)
+    older = st.session_state.get(audit_key)
+    if older is not None and older["anchor"] != first.next_cursor:
+        older = None
+        st.session_state.pop(audit_key, None)
+    if older is None:
+        older = {"anchor": first.next_cursor, "entries": [], "cursor": first.next_cursor}
+    logs = list(first.entries) + older["entries"]
     if not logs:
         st.info("Nessuna attività registrata per questo evento")
     else:
         for log in logs:
             with st.expander(f"{log.ts.isoformat()}  •  {log.action}  •  user: {log.user or '—'}", expanded=False):
-                try:
-                    payload = json.loads(log.payload)
-                except Exception:
-                    payload = log.payload
-                st.write(payload)
-                # offri revert se payload contiene snapshot 'after'
-                if isinstance(payload, dict) and payload.get("after"):
+                # payload mostrato grezzo: il JSON viene decodificato solo per il ripristino
+                st.code(log.payload or "", language="json")
+                # offri revert per le azioni che salvano uno snapshot 'after'
+                if log.action in ("create", "update", "move_date"):
                     if st.button("Ripristina snapshot", key=f"revert_{log.id}"):
-                        try:
-                            # payload['after'] dovrebbe contenere i campi da ripristinare
-                            after = payload.get("after")
-                            # assicurati di passare solo campi validi per save_event
-                            save_event(after, user=st.session_state.get("user",""))
-                            st.success("Snapshot ripristinato")
-                            st.experimental_rerun()
-                        except Exception as e:
-                            st.error(f"Errore ripristino: {e}")
+                        payload = log.payload_data()
+                        after = payload.get("after") if isinstance(payload, dict) else None
+                        if not after:
+                            st.warning("Nessuno snapshot da ripristinare in questa voce")
+                        else:
+                            try:
+                                # assicurati di passare solo campi validi per save_event
+                                save_event(after, user=st.session_state.get("user",""))
+                                st.session_state.pop(audit_key, None)
+                                st.success("Snapshot ripristinato")
+                                st.experimental_rerun()
+                            except Exception as e:
+                                st.error(f"Errore ripristino: {e}")
+        if older["cursor"]:
+            if st.button("Carica attività precedenti", key=f"audit_more_{ev.id}"):
+                before_ts, before_id = older["cursor"]
+                page = get_audit_page("event", ev.id, before_ts=before_ts, before_id=before_id)
+                older["entries"].extend(page.entries)
+                older["cursor"] = page.next_cursor
+                st.session_state[audit_key] = older
+                st.experimental_rerun()
 
     # link rapido per aprire TaskList per questo evento
     st.markdown("---")
@@ -1,11 +1,11 @@
 # pages/05_Tasklist.py
 import streamlit as st
 from datetime import date
+from page_cache import load_day_bundle
 from utils import (
-    list_events_by_date, list_tasks_by_date, list_tasks_for_event,
     add_task, update_task, delete_task, toggle_task_done,
-    get_event, save_event,
-    list_artists_by_role, list_promoters, list_tour_managers, list_services, create_tasks_from_template, get_user_tasks
+    save_event,
+    list_tour_managers, list_services, create_tasks_from_template
 )
 import json
 from pathlib import Path
@@ -27,7 +27,13 @@ if users_file.exists():
 if not team_members:
     team_members = ["ale", "marta", "luca"]
 
-events = list_events_by_date(selected_date)
+# eventi, task e opzioni DJ/promoter del giorno con un numero fisso di query
+bundle = load_day_bundle(selected_date)
+events = bundle.events
+dj_map = {d.id: d.name for d in bundle.djs}
+promoter_map = {p.id: p.name for p in bundle.promoters}
+dj_options = [None] + list(dj_map.keys())
+promoter_options = [None] + list(promoter_map.keys())
 
 st.markdown(f"### Eventi del {selected_date} — {len(events)} trovati")
 
@@ -39,14 +45,10 @@ for ev in events:
             title = st.text_input("Titolo", value=ev.title or "", key=f"title_ev_{ev.id}")
             location = st.text_input("Luogo", value=ev.location or "", key=f"loc_ev_{ev.id}")
 
-            djs = list_artists_by_role("dj")
-            dj_map = {d.id: d.name for d in djs}
             current_dj = getattr(ev, "dj_id", None)
-            dj_choice = st.selectbox("DJ", options=[None] + list(dj_map.keys()), format_func=lambda x: dj_map.get(x, "-"), index=0 if not current_dj else list(dj_map.keys()).index(current_dj)+1, key=f"dj_ev_{ev.id}")
+            dj_choice = st.selectbox("DJ", options=dj_options, format_func=lambda x: dj_map.get(x, "-"), index=dj_options.index(current_dj) if current_dj in dj_map else 0, key=f"dj_ev_{ev.id}")
 
-            promoters = list_promoters()
-            promoter_map = {p.id: p.name for p in promoters}
-            promoter_choice = st.selectbox("Promoter", options=[None] + list(promoter_map.keys()), format_func=lambda x: promoter_map.get(x, "-"), index=0 if not ev.promoter_id else list(promoter_map.keys()).index(ev.promoter_id)+1, key=f"prom_ev_{ev.id}")
+            promoter_choice = st.selectbox("Promoter", options=promoter_options, format_func=lambda x: promoter_map.get(x, "-"), index=promoter_options.index(ev.promoter_id) if ev.promoter_id in promoter_map else 0, key=f"prom_ev_{ev.id}")
 
             hotel_notes = st.text_area("Note hotel / logistica", value=ev.allestimenti or "", key=f"hotel_ev_{ev.id}")
 
@@ -61,14 +63,15 @@ for ev in events:
                 }
                 try:
                     save_event(payload)
+                except ValueError as e:
+                    st.error(f"Errore salvataggio: {e}")
+                else:
                     st.success("Evento aggiornato")
                     st.experimental_rerun()
-                except Exception as e:
-                    st.error(f"Errore salvataggio: {e}")
 
         with cols[1]:
             st.markdown("**Task per questo evento**")
-            tasks = list_tasks_for_event(ev.id)
+            tasks = bundle.tasks_by_event.get(ev.id, [])
             for t in tasks:
                 tcols = st.columns([4,1,1])
                 with tcols[0]:
@@ -1,12 +1,20 @@
 # pages/06_Event_list.py
 import streamlit as st
 from datetime import date
-import csv
 import io
+import math
+import pandas as pd
 
+from page_cache import (
+    list_events_page, list_event_ids, events_without_dj, events_without_promoter, search_text
+)
+from components.name_picker import name_multiselect, clear_name_multiselect
+from components.event_card import render_duplicate_controls
+from event_export import export_events, EVENT_EXPORT_FORMATS, EVENT_EXPORT_MIME
 from utils import (
-    list_events_range, export_data_json, list_artists, list_services,
-    events_without_dj, events_without_promoter, save_event, duplicate_event
+    export_data_json,
+    save_event,
+    bulk_set_status, bulk_shift_dates, bulk_delete
 )
 
 st.set_page_config(page_title="Event List", layout="wide")
@@ -23,6 +31,13 @@ with col_filters:
     status = st.selectbox("Stato", options=["tutti","bozza","confermato","cancellato"], index=0, key="events_list_status")
     q_artist = st.selectbox("Mostra eventi senza DJ / senza promoter", options=["tutti","senza_dj","senza_promoter"], index=0, key="events_list_qartist")
 
+# filtri applicati in SQL da query_events
+list_filters = {
+    "status": status if status != "tutti" else None,
+    "missing_dj": q_artist == "senza_dj",
+    "missing_promoter": q_artist == "senza_promoter",
+}
+
 with col_actions:
     if st.button("Esporta JSON", key="export_json_btn"):
         path = "data/export_events.json"
@@ -32,21 +47,43 @@ with col_actions:
         except Exception as e:
             st.error(f"Errore export: {e}")
 
-    if st.button("Esporta CSV (eventi)", key="export_csv_btn"):
-        evs = list_events_range(start, end)
-        if status != "tutti":
-            evs = [e for e in evs if e.status == status]
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["id","date","title","location","type","status","promoter_id","tour_manager_id"])
-        for e in evs:
-            writer.writerow([e.id, e.date.isoformat() if e.date else "", e.title, e.location, e.type, e.status, e.promoter_id, e.tour_manager_id])
-        st.download_button("Download CSV", data=output.getvalue(), file_name="events.csv", mime="text/csv", key="download_csv_events")
+    export_format = st.selectbox("Formato export eventi", options=list(EVENT_EXPORT_FORMATS), key="export_events_format")
+    if st.button("Esporta eventi", key="export_csv_btn"):
+        output = io.BytesIO()
+        try:
+            n = export_events(output, export_format, start, end, **list_filters)
+            st.download_button(f"Download {export_format.upper()} ({n} eventi)", data=output.getvalue(),
+                               file_name=f"events.{export_format}", mime=EVENT_EXPORT_MIME[export_format],
+                               key="download_csv_events")
+        except RuntimeError as e:
+            st.error(str(e))
+
+# --- Ricerca full-text (eventi, task, anagrafiche)
+search_query = st.text_input("Cerca (titolo, luogo, note, hotel, travel, nomi, task)", key="events_list_search")
+if search_query:
+    hits = search_text(search_query)
+    if not hits:
+        st.info("Nessun risultato")
+    for h in hits:
+        hc1, hc2 = st.columns([5,1])
+        with hc1:
+            day = f" — {h.day}" if h.day else ""
+            st.markdown(f"`{h.kind}` **{h.title}**{day}  \n{h.snippet}")
+        with hc2:
+            if h.kind == "event" and st.button("Apri", key=f"open_search_{h.entity_id}"):
+                st.session_state["open_event_id"] = h.entity_id
+                st.experimental_rerun()
 
 st.markdown("---")
 
 # --- Sezione: aggiungi nuovo evento (form)
 st.markdown("## Aggiungi nuovo evento")
+# artisti e service fuori dal form: la ricerca per nome aggiorna le opzioni mentre si digita
+pc1, pc2 = st.columns(2)
+with pc1:
+    new_artist_ids = name_multiselect("Artisti", "artist", key="new_event_artists")
+with pc2:
+    new_service_ids = name_multiselect("Services", "service", key="new_event_services")
 with st.form("add_event_form", clear_on_submit=True):
     c1, c2, c3 = st.columns([2,2,1])
     with c1:
@@ -55,12 +92,6 @@ with st.form("add_event_form", clear_on_submit=True):
         new_location = st.text_input("Luogo", key="new_event_location")
     with c2:
         new_type = st.selectbox("Tipo", options=["artist","format"], index=0, key="new_event_type")
-        artists = list_artists()
-        artist_map = {a.id: a.name for a in artists}
-        new_artist_ids = st.multiselect("Artisti", options=list(artist_map.keys()), format_func=lambda x: artist_map[x], key="new_event_artists")
-        services = list_services()
-        service_map = {s.id: s.name for s in services}
-        new_service_ids = st.multiselect("Services", options=list(service_map.keys()), format_func=lambda x: service_map[x], key="new_event_services")
     with c3:
         promoter_opts = ["Nessuno"]
         try:
@@ -105,6 +136,9 @@ with st.form("add_event_form", clear_on_submit=True):
                 ev = save_event(payload, user=st.session_state.get("user",""))
                 if ev:
                     st.success(f"Evento creato: {ev.title} ({ev.date})")
+                    # i picker sono fuori dal form: il prossimo evento parte vuoto
+                    clear_name_multiselect("new_event_artists")
+                    clear_name_multiselect("new_event_services")
                     st.session_state["open_event_id"] = ev.id
                     st.experimental_rerun()
                 else:
@@ -114,38 +148,131 @@ with st.form("add_event_form", clear_on_submit=True):
 
 st.markdown("---")
 
-# --- Mostra lista eventi filtrata
-events = list_events_range(start, end)
-if status != "tutti":
-    events = [e for e in events if e.status == status]
-if q_artist == "senza_dj":
-    events = [e for e in events if not e.dj_id]
-if q_artist == "senza_promoter":
-    events = [e for e in events if not e.promoter_id]
-
-st.markdown(f"### Eventi trovati: {len(events)}")
-for e in events:
-    cols = st.columns([4,1,1,1])
-    with cols[0]:
-        st.markdown(f"**{e.title}** — {e.date} — {e.location}")
-        st.write(f"Tipo: {e.type}  •  Stato: {e.status}")
-    with cols[1]:
-        if st.button("Apri", key=f"open_list_{e.id}"):
-            st.session_state["open_event_id"] = e.id
+# --- Lista eventi filtrata: una pagina alla volta (keyset), totale contato in SQL
+sc1, sc2, sc3 = st.columns([2,1,1])
+with sc1:
+    sort_labels = {"date": "Data", "title": "Titolo", "location": "Luogo", "status": "Stato", "type": "Tipo", "id": "Id"}
+    sort_key = st.selectbox("Ordina per", options=list(sort_labels.keys()), format_func=lambda x: sort_labels[x], key="events_list_sort")
+with sc2:
+    sort_desc = st.checkbox("Decrescente", key="events_list_sort_desc")
+with sc3:
+    page_size = st.selectbox("Righe per pagina", options=[25, 50, 100, 200], index=1, key="events_list_page_size")
+order_by = ("-" if sort_desc else "") + sort_key
+
+# pila dei cursori delle pagine visitate; filtri o ordinamento diversi ripartono dalla prima
+page_filters = (start, end, order_by, page_size, tuple(sorted(list_filters.items())))
+if st.session_state.get("events_list_page_filters") != page_filters:
+    st.session_state["events_list_page_filters"] = page_filters
+    st.session_state["events_list_page_cursors"] = [None]
+    st.session_state["events_grid_gen"] = st.session_state.get("events_grid_gen", 0) + 1
+
+def _reset_grid_selection():
+    # la selezione del data editor è per posizione di riga: dopo un cambio di
+    # pagina, filtri o dati va azzerata con una key nuova
+    st.session_state["events_grid_gen"] = st.session_state.get("events_grid_gen", 0) + 1
+cursors = st.session_state.setdefault("events_list_page_cursors", [None])
+page = list_events_page(start, end, order_by=order_by, after=cursors[-1], page_size=page_size, **list_filters)
+if not page.rows and len(cursors) > 1:
+    cursors.pop()
+    page = list_events_page(start, end, order_by=order_by, after=cursors[-1], page_size=page_size, **list_filters)
+
+st.markdown(f"### Eventi trovati: {page.total}")
+nav1, nav2, nav3 = st.columns([1,1,4])
+with nav1:
+    if st.button("◀ Precedenti", key="events_page_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        _reset_grid_selection()
+        st.experimental_rerun()
+with nav2:
+    if st.button("Successivi ▶", key="events_page_next", disabled=page.next_cursor is None):
+        cursors.append(page.next_cursor)
+        _reset_grid_selection()
+        st.experimental_rerun()
+with nav3:
+    st.caption(f"Pagina {len(cursors)} di {max(1, math.ceil(page.total / page_size))}")
+
+# griglia selezionabile: la colonna ✓ è l'unica modificabile e guida sia le azioni
+# sulla riga (una sola riga selezionata) sia le operazioni multiple.
+# st.data_editor dalla 1.23, st.experimental_data_editor nelle versioni precedenti
+data_editor = getattr(st, "data_editor", None) or st.experimental_data_editor
+page_ids = tuple(e.id for e in page.rows)
+if st.session_state.get("events_grid_ids") != page_ids:
+    # righe cambiate (nuovo evento, duplicazione, modifiche di altri): selezione azzerata
+    st.session_state["events_grid_ids"] = page_ids
+    _reset_grid_selection()
+grid = pd.DataFrame(
+    [{"✓": False, "id": e.id, "data": e.date, "titolo": e.title, "luogo": e.location, "tipo": e.type, "stato": e.status}
+     for e in page.rows],
+    columns=["✓", "id", "data", "titolo", "luogo", "tipo", "stato"],
+)
+edited = data_editor(
+    grid,
+    key=f"events_grid_{st.session_state.get('events_grid_gen', 0)}",
+    disabled=[c for c in grid.columns if c != "✓"],
+    use_container_width=True,
+)
+selected_ids = [int(i) for i in edited.loc[edited["✓"].astype(bool), "id"]]
+
+# --- Azioni sulla riga selezionata
+if page.rows:
+    row_id = selected_ids[0] if len(selected_ids) == 1 else None
+    rc1, rc2, rc3, rc4 = st.columns([4,1,1,1])
+    with rc1:
+        if row_id is None:
+            st.caption("Seleziona una sola riga (✓) per Apri / Duplica / Task")
+        else:
+            row = next(e for e in page.rows if e.id == row_id)
+            st.markdown(f"**{row.date} — {row.title}**")
+    with rc2:
+        if st.button("Apri", key="open_list_row", disabled=row_id is None):
+            st.session_state["open_event_id"] = row_id
             st.experimental_rerun()
-    with cols[2]:
-        if st.button("Duplica", key=f"dup_list_{e.id}"):
-            try:
-                duplicate_event(e.id, user=st.session_state.get("user",""))
-                st.success("Evento duplicato")
-                st.experimental_rerun()
-            except Exception as ex:
-                st.error(f"Errore duplicazione: {ex}")
-    with cols[3]:
-        if st.button("Task", key=f"task_list_{e.id}"):
-            st.session_state["open_event_id"] = e.id
+    with rc3:
+        if st.button("Duplica", key="dup_list_row", disabled=row_id is None):
+            st.session_state[f"dup_list_{row_id}_open"] = True
+    with rc4:
+        if st.button("Task", key="task_list_row", disabled=row_id is None):
+            st.session_state["open_event_id"] = row_id
             st.session_state["open_task_for_event"] = True
             st.experimental_rerun()
+    if row_id is not None and st.session_state.get(f"dup_list_{row_id}_open"):
+        row_date = next(e.date for e in page.rows if e.id == row_id)
+        render_duplicate_controls(row_id, row_date, key=f"dup_list_{row_id}", user=st.session_state.get("user", ""))
+
+# --- Operazioni multiple: un'unica operazione (e un solo rerun) per tutti gli eventi selezionati
+if page.rows:
+    with st.expander(f"Operazioni su più eventi ({len(selected_ids)} selezionati)", expanded=False):
+        if st.checkbox(f"Seleziona tutti i {page.total} eventi trovati", key="bulk_select_all"):
+            selected_ids = list_event_ids(start, end, **list_filters)
+        bc1, bc2, bc3 = st.columns(3)
+        with bc1:
+            bulk_status = st.selectbox("Nuovo stato", options=["bozza","confermato","cancellato"], key="bulk_status")
+            if st.button("Applica stato", key="bulk_status_btn", disabled=not selected_ids):
+                try:
+                    n = bulk_set_status(selected_ids, bulk_status, user=st.session_state.get("user",""))
+                except ValueError as ex:
+                    st.error(str(ex))
+                else:
+                    st.success(f"Stato aggiornato per {n} eventi")
+                    _reset_grid_selection()
+                    st.experimental_rerun()
+        with bc2:
+            bulk_days = st.number_input("Sposta di (giorni)", value=1, step=1, key="bulk_days")
+            if st.button("Sposta date", key="bulk_shift_btn", disabled=not selected_ids):
+                try:
+                    res = bulk_shift_dates(selected_ids, int(bulk_days), user=st.session_state.get("user",""))
+                    st.success(f"Spostati {res['events']} eventi")
+                    _reset_grid_selection()
+                    st.experimental_rerun()
+                except ValueError as ex:
+                    st.error(str(ex))
+        with bc3:
+            confirm_delete = st.checkbox("Confermo l'eliminazione", key="bulk_delete_confirm")
+            if st.button("Elimina selezionati", key="bulk_delete_btn", disabled=not (selected_ids and confirm_delete)):
+                res = bulk_delete(selected_ids, user=st.session_state.get("user",""))
+                st.success(f"Eliminati {res.get('events', 0)} eventi")
+                _reset_grid_selection()
+                st.experimental_rerun()
 
 # --- Segnalazioni rapide (controlli senza DJ / senza promoter)
 st.markdown("---")
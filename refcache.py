@@ -0,0 +1,122 @@
+# refcache.py
+"""
+Cache di processo per i dati di riferimento (artisti, service, format, promoter,
+tour manager). Le liste vengono lette una volta e conservate come tuple di record
+immutabili; utils.py invalida il singolo tipo a ogni add_/update_/delete_.
+"""
+import threading
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class ArtistRef(NamedTuple):
+    id: int
+    name: str
+    role: str
+    phone: str
+    email: str
+    notes: str
+
+
+class ServiceRef(NamedTuple):
+    id: int
+    name: str
+    contact: str
+    phone: str
+    notes: str
+
+
+class FormatRef(NamedTuple):
+    id: int
+    name: str
+    description: str
+    notes: str
+
+
+class PromoterRef(NamedTuple):
+    id: int
+    name: str
+    contact: str
+    phone: str
+    email: str
+    notes: str
+
+
+class TourManagerRef(NamedTuple):
+    id: int
+    name: str
+    contact: str
+    phone: str
+    email: str
+    notes: str
+
+
+# tipo (stesso nome usato come entity nell'audit) -> classe record
+REFERENCE_KINDS = {
+    "artist": ArtistRef,
+    "service": ServiceRef,
+    "format": FormatRef,
+    "promoter": PromoterRef,
+    "tour_manager": TourManagerRef,
+}
+
+
+class ReferenceCache:
+    """
+    Snapshot per tipo con contatori hit/miss.
+    Il loader viene chiamato fuori dal lock; una invalidazione arrivata durante il
+    caricamento scarta il risultato (generazione per tipo).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple] = {}
+        self._generation: Dict[str, int] = {k: 0 for k in REFERENCE_KINDS}
+        self.hits: Dict[str, int] = {k: 0 for k in REFERENCE_KINDS}
+        self.misses: Dict[str, int] = {k: 0 for k in REFERENCE_KINDS}
+
+    def get(self, kind: str, loader: Callable[[], Tuple]) -> Tuple:
+        with self._lock:
+            cached = self._data.get(kind)
+            if cached is not None:
+                self.hits[kind] += 1
+                return cached
+            self.misses[kind] += 1
+            generation = self._generation[kind]
+        rows = tuple(loader())
+        with self._lock:
+            if self._generation[kind] == generation:
+                self._data[kind] = rows
+        return rows
+
+    def invalidate(self, *kinds: str) -> None:
+        """
+        Invalida i tipi indicati (tutti se nessuno).
+        """
+        with self._lock:
+            for kind in kinds or tuple(REFERENCE_KINDS):
+                self._data.pop(kind, None)
+                self._generation[kind] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                kind: {
+                    "hits": self.hits[kind],
+                    "misses": self.misses[kind],
+                    "cached": len(self._data[kind]) if kind in self._data else None,
+                }
+                for kind in REFERENCE_KINDS
+            }
+
+
+reference_cache = ReferenceCache()
+
+
+def to_ref(kind: str, obj) -> Optional[NamedTuple]:
+    """
+    Record immutabile a partire da un oggetto ORM (colonne omonime).
+    """
+    if obj is None:
+        return None
+    ref_cls = REFERENCE_KINDS[kind]
+    return ref_cls(*(getattr(obj, field) for field in ref_cls._fields))
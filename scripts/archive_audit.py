@@ -0,0 +1,16 @@
+# scripts/archive_audit.py
+# Applica le policy di retention dell'audit (audit.AUDIT_RETENTION_POLICIES)
+# e pulisce change_log (utils.CHANGE_LOG_KEEP_DAYS).
+# uso: python scripts/archive_audit.py [--dry-run]
+import sys
+from db import init_db
+from audit import archive_audit_logs, audit_archive_stats
+from utils import prune_change_log
+
+if __name__ == "__main__":
+    init_db()
+    print("Prima:", audit_archive_stats())
+    print("Retention:", archive_audit_logs(dry_run="--dry-run" in sys.argv))
+    print("Dopo:", audit_archive_stats())
+    if "--dry-run" not in sys.argv:
+        print("change_log eliminate:", prune_change_log())
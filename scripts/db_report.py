@@ -0,0 +1,6 @@
+# scripts/db_report.py
+import json
+from db import engine_report
+
+if __name__ == "__main__":
+    print(json.dumps(engine_report(), indent=2, default=str))
@@ -0,0 +1,19 @@
+# scripts/export_events.py
+# Export degli eventi in CSV, Parquet o Feather (formato dal suffisso del file).
+# uso: python scripts/export_events.py FILE [--from AAAA-MM-GG] [--to AAAA-MM-GG] [--status STATO]
+import argparse
+from datetime import date
+from db import init_db
+from event_export import export_events, EVENT_EXPORT_FORMATS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export eventi (" + ", ".join(EVENT_EXPORT_FORMATS) + ")")
+    parser.add_argument("path", help="file di destinazione: .csv, .parquet, .feather")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None)
+    parser.add_argument("--status", default=None)
+    parser.add_argument("--format", dest="fmt", choices=EVENT_EXPORT_FORMATS, default=None)
+    args = parser.parse_args()
+    init_db()
+    n = export_events(args.path, args.fmt, args.start, args.end, status=args.status)
+    print(f"Esportati {n} eventi in {args.path}")
@@ -0,0 +1,13 @@
+# scripts/migrate_db.py
+from db import engine, init_db
+from migrations import apply_migrations, check_index_usage
+
+if __name__ == "__main__":
+    init_db()
+    summary = apply_migrations(engine)
+    print("Migrazioni:", summary)
+    for artist_id, day, event_id in summary["artist_booking_conflicts"]:
+        print(f"Doppio impegno da risolvere: artista {artist_id} il {day}, evento {event_id}")
+    for check in check_index_usage(engine):
+        status = "OK " if check["used"] else "NO "
+        print(status, check["index"], "|", " / ".join(check["plan"]))
@@ -1,9 +1,10 @@
 # scripts/seed_demo.py
-from db import get_session
+from db import session_scope
 from utils import add_artist, add_format, add_service
 
-# usa funzioni utils per avere audit automatico
-add_artist("Demo Artist", role="artist", phone="", email="", notes="seed")
-add_format("Demo Format", description="seed")
-add_service("Demo Service", contact="info", phone="123")
+# usa funzioni utils per avere audit automatico, in un'unica transazione
+with session_scope() as db:
+    add_artist("Demo Artist", role="artist", phone="", email="", notes="seed", db=db)
+    add_format("Demo Format", description="seed", db=db)
+    add_service("Demo Service", contact="info", phone="123", db=db)
 print("Seed completato")
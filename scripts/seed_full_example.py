@@ -1,7 +1,8 @@
 # scripts/seed_full_example.py
-from db import get_session, init_db, get_db_file_path
-from models import Artist, Service, Format, Promoter, TourManager, Event, Task
+from db import get_session, init_db, get_db_file_path, engine
+from models import Artist, Service, Format, Promoter, TourManager, Event, Task, ServiceAssignment, ArtistBooking, event_artist, event_service, event_performer
 from datetime import date, timedelta
+from migrations import backfill_artist_bookings
 import json
 import os
 
@@ -13,6 +14,11 @@ try:
     # Pulizia opzionale: evita duplicati per esecuzioni ripetute
     # (commenta se non vuoi cancellare)
     db.query(Task).delete()
+    db.query(ServiceAssignment).delete()
+    db.query(ArtistBooking).delete()
+    db.execute(event_artist.delete())
+    db.execute(event_service.delete())
+    db.execute(event_performer.delete())
     db.query(Event).delete()
     db.query(Artist).delete()
     db.query(Service).delete()
@@ -65,6 +71,14 @@ try:
     ev_format.artists.append(a_dj)
     ev_format.services.append(s1)
     db.add(ev_format)
+    db.flush()
+    db.execute(event_performer.insert(), [
+        {"event_id": ev_format.id, "artist_id": a_dj.id, "role": "dj"},
+        {"event_id": ev_format.id, "artist_id": a_vocal.id, "role": "vocalist"},
+        {"event_id": ev_format.id, "artist_id": a_ball1.id, "role": "ballerina"},
+        {"event_id": ev_format.id, "artist_id": a_ball2.id, "role": "ballerina"},
+        {"event_id": ev_format.id, "artist_id": a_masc.id, "role": "mascotte"},
+    ])
     db.commit()
 
     # Evento artista di esempio
@@ -99,6 +113,9 @@ try:
     db.add(t3)
     db.commit()
 
+    # impegni artisti (artist_bookings) per gli eventi appena creati
+    backfill_artist_bookings(engine)
+
     # Scrivi users.json in data
     data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
     os.makedirs(data_dir, exist_ok=True)
@@ -0,0 +1,318 @@
+# search.py
+"""
+Ricerca full-text (SQLite FTS5) su eventi, task e anagrafiche.
+
+Un'unica tabella virtuale search_index contiene un documento per ogni riga
+sorgente, con rowid = id * SEARCH_KIND_SLOTS + codice del tipo: i trigger
+aggiornano e cancellano il documento per rowid, senza scansioni. I trigger
+(creati da ensure_search_index, chiamata da migrations.apply_migrations) tengono
+l'indice allineato a ogni scrittura, anche set-based, da import o da script.
+
+name_index è un secondo indice FTS5 (tokenizer trigram) sui soli nomi delle
+anagrafiche, per l'autocompletamento tollerante agli errori di lookup_names.
+"""
+import re
+import unicodedata
+from datetime import date
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+SEARCH_TABLE = "search_index"
+NAME_TABLE = "name_index"
+SEARCH_KIND_SLOTS = 8
+SEARCH_LIMIT = 20
+# delimitatori dei termini trovati negli snippet (markdown per le pagine)
+SEARCH_SNIPPET_MARKS = ("**", "**")
+SEARCH_SNIPPET_TOKENS = 12
+# peso di title e body in bm25 (le colonne UNINDEXED pesano 0)
+SEARCH_WEIGHTS = (10.0, 1.0)
+NAME_LOOKUP_LIMIT = 20
+# nomi candidati letti dall'indice trigram prima dell'ordinamento per somiglianza
+NAME_LOOKUP_CANDIDATES = 200
+# quota minima dei trigrammi della ricerca presenti nel nome
+NAME_MIN_SIMILARITY = 0.5
+
+
+class SearchSource(NamedTuple):
+    kind: str                   # stesso nome usato come entity nell'audit
+    table: str
+    code: int                   # < SEARCH_KIND_SLOTS
+    title: str                  # colonna del titolo
+    body: Tuple[str, ...]       # colonne concatenate nel corpo
+    day: Optional[str] = None   # colonna data mostrata nei risultati
+
+
+SEARCH_SOURCES = (
+    SearchSource("event", "events", 0, "title", ("location", "notes", "allestimenti", "hotel", "travel"), "date"),
+    SearchSource("task", "tasks", 1, "title", ("description",), "due_date"),
+    SearchSource("artist", "artists", 2, "name", ("notes",)),
+    SearchSource("service", "services", 3, "name", ("contact", "notes")),
+    SearchSource("format", "formats", 4, "name", ("description", "notes")),
+    SearchSource("promoter", "promoters", 5, "name", ("contact", "notes")),
+    SearchSource("tour_manager", "tour_managers", 6, "name", ("contact", "notes")),
+)
+# anagrafiche con autocompletamento sul nome (stesso rowid di search_index)
+NAME_SOURCES = tuple(source for source in SEARCH_SOURCES if source.title == "name")
+
+
+class SearchHit(NamedTuple):
+    kind: str
+    entity_id: int
+    title: str
+    snippet: str                # testo con i termini trovati tra SEARCH_SNIPPET_MARKS
+    day: Optional[date]         # data dell'evento / scadenza della task
+    rank: float                 # bm25: più basso = più rilevante
+
+
+class NameMatch(NamedTuple):
+    kind: str
+    entity_id: int
+    name: str
+    score: float                # 0..1: quota dei trigrammi della ricerca presenti nel nome
+
+
+# -------------------------
+# DDL: TABELLA E TRIGGER
+# -------------------------
+def _document_values(source: SearchSource, ref: str) -> str:
+    """
+    rowid, kind, entity_id, day, title, body del documento per la riga ref (NEW o nome tabella).
+    """
+    body = " || ' ' || ".join(f"coalesce({ref}.{col}, '')" for col in source.body)
+    day = f"{ref}.{source.day}" if source.day else "NULL"
+    return (f"{ref}.id * {SEARCH_KIND_SLOTS} + {source.code}, '{source.kind}', {ref}.id, {day}, "
+            f"coalesce({ref}.{source.title}, ''), {body}")
+
+
+def _trigger_statements(source: SearchSource) -> List[Tuple[str, str]]:
+    insert = f"INSERT INTO {SEARCH_TABLE} (rowid, kind, entity_id, day, title, body) VALUES ({_document_values(source, 'NEW')});"
+    delete = f"DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id * {SEARCH_KIND_SLOTS} + {source.code};"
+    # solo le colonne indicizzate: i cambi di stato non toccano l'indice
+    watched = ", ".join(dict.fromkeys((source.title,) + source.body + ((source.day,) if source.day else ())))
+    prefix = f"trg_search_{source.table}"
+    return [
+        (f"{prefix}_insert", f"AFTER INSERT ON {source.table} BEGIN {insert} END"),
+        (f"{prefix}_update", f"AFTER UPDATE OF {watched} ON {source.table} BEGIN {delete} {insert} END"),
+        (f"{prefix}_delete", f"AFTER DELETE ON {source.table} BEGIN {delete} END"),
+    ]
+
+
+def _populate(conn) -> None:
+    for source in SEARCH_SOURCES:
+        conn.exec_driver_sql(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, kind, entity_id, day, title, body) "
+            f"SELECT {_document_values(source, source.table)} FROM {source.table}"
+        )
+
+
+def _name_values(source: SearchSource, ref: str) -> str:
+    # grams: ogni parola preceduta da due spazi, come i trigrammi di _name_trigrams
+    return (f"{ref}.id * {SEARCH_KIND_SLOTS} + {source.code}, '{source.kind}', {ref}.id, {ref}.name, "
+            f"'  ' || replace(coalesce({ref}.name, ''), ' ', '  ') || ' '")
+
+
+def _name_trigger_statements(source: SearchSource) -> List[Tuple[str, str]]:
+    insert = f"INSERT INTO {NAME_TABLE} (rowid, kind, entity_id, name, grams) VALUES ({_name_values(source, 'NEW')});"
+    delete = f"DELETE FROM {NAME_TABLE} WHERE rowid = OLD.id * {SEARCH_KIND_SLOTS} + {source.code};"
+    prefix = f"trg_names_{source.table}"
+    return [
+        (f"{prefix}_insert", f"AFTER INSERT ON {source.table} BEGIN {insert} END"),
+        (f"{prefix}_update", f"AFTER UPDATE OF name ON {source.table} BEGIN {delete} {insert} END"),
+        (f"{prefix}_delete", f"AFTER DELETE ON {source.table} BEGIN {delete} END"),
+    ]
+
+
+def _populate_names(conn) -> None:
+    for source in NAME_SOURCES:
+        conn.exec_driver_sql(
+            f"INSERT INTO {NAME_TABLE} (rowid, kind, entity_id, name, grams) "
+            f"SELECT {_name_values(source, source.table)} FROM {source.table}"
+        )
+
+
+def ensure_search_index(engine) -> List[str]:
+    """
+    Crea search_index (popolandola dalle tabelle esistenti) e i trigger mancanti.
+    Restituisce i nomi degli oggetti creati.
+    """
+    created = []
+    with engine.begin() as conn:
+        existing = set(conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')").scalars())
+        if SEARCH_TABLE not in existing:
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                f"kind UNINDEXED, entity_id UNINDEXED, day UNINDEXED, title, body, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            _populate(conn)
+            created.append(SEARCH_TABLE)
+        for source in SEARCH_SOURCES:
+            for name, body in _trigger_statements(source):
+                if name not in existing:
+                    conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+                    created.append(name)
+    return created
+
+
+def ensure_name_index(engine) -> List[str]:
+    """
+    Crea name_index (popolandola dalle anagrafiche esistenti) e i trigger mancanti.
+    Restituisce i nomi degli oggetti creati.
+    """
+    created = []
+    with engine.begin() as conn:
+        existing = set(conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')").scalars())
+        if NAME_TABLE not in existing:
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {NAME_TABLE} USING fts5("
+                f"kind UNINDEXED, entity_id UNINDEXED, name UNINDEXED, grams, tokenize = 'trigram')"
+            )
+            _populate_names(conn)
+            created.append(NAME_TABLE)
+        for source in NAME_SOURCES:
+            for name, body in _name_trigger_statements(source):
+                if name not in existing:
+                    conn.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+                    created.append(name)
+    return created
+
+
+def rebuild_search_index(engine=None) -> int:
+    """
+    Ricostruisce search_index e name_index da zero (dopo modifiche a SEARCH_SOURCES)
+    e li compatta. Restituisce il numero di documenti di search_index.
+    """
+    if engine is None:
+        from db import engine
+    with engine.begin() as conn:
+        for table, populate in ((SEARCH_TABLE, _populate), (NAME_TABLE, _populate_names)):
+            conn.exec_driver_sql(f"DELETE FROM {table}")
+            populate(conn)
+            conn.exec_driver_sql(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+        return conn.exec_driver_sql(f"SELECT count(*) FROM {SEARCH_TABLE}").scalar()
+
+
+# -------------------------
+# RICERCA
+# -------------------------
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(query: str) -> str:
+    """
+    Testo libero -> espressione MATCH: ogni parola diventa un prefisso tra virgolette
+    (niente errori di sintassi FTS5 da apostrofi, trattini o operatori), in AND.
+    "hotel rimini" -> '"hotel"* "rimini"*'
+    """
+    terms = _TERM.findall(query or "")
+    # articoli elisi ("l'hotel", "dell'evento") non restringono la ricerca
+    terms = [term for term in terms if len(term) > 1] or terms
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_text(query: str, kinds: Optional[Sequence[str]] = None, limit: int = SEARCH_LIMIT,
+                engine=None) -> List[SearchHit]:
+    """
+    Documenti che contengono tutte le parole di query (anche come prefisso), dal più
+    rilevante. kinds limita i tipi (es. ["event", "task"]).
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+    if engine is None:
+        from db import engine
+    open_mark, close_mark = SEARCH_SNIPPET_MARKS
+    weights = ", ".join(str(w) for w in (0.0, 0.0, 0.0) + SEARCH_WEIGHTS)
+    sql = (
+        f"SELECT kind, entity_id, title, "
+        f"snippet({SEARCH_TABLE}, -1, :open, :close, '…', :tokens), day, bm25({SEARCH_TABLE}, {weights}) AS score "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"
+    )
+    params = {"open": open_mark, "close": close_mark, "tokens": SEARCH_SNIPPET_TOKENS, "match": match, "limit": limit}
+    if kinds:
+        names = [f"k{i}" for i in range(len(kinds))]
+        sql += f" AND kind IN ({', '.join(':' + n for n in names)})"
+        params.update(zip(names, kinds))
+    sql += " ORDER BY score LIMIT :limit"
+    with engine.connect() as conn:
+        rows = conn.execute(text(sql), params).all()
+    return [
+        SearchHit(kind, entity_id, title, snippet, date.fromisoformat(day) if day else None, score)
+        for kind, entity_id, title, snippet, day, score in rows
+    ]
+
+
+# -------------------------
+# AUTOCOMPLETAMENTO NOMI
+# -------------------------
+def _fold(value: str) -> str:
+    """
+    Minuscole senza accenti, solo lettere/cifre separate da uno spazio.
+    """
+    value = unicodedata.normalize("NFKD", (value or "").casefold())
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(_TERM.findall(value))
+
+
+def _name_trigrams(value: str, partial_last: bool = False) -> set:
+    """
+    Trigrammi delle parole con due spazi davanti e uno dietro (come pg_trgm).
+    partial_last: l'ultima parola è ancora in digitazione, senza spazio finale.
+    """
+    words = value.split()
+    grams = set()
+    for i, word in enumerate(words):
+        padded = "  " + word + ("" if partial_last and i == len(words) - 1 else " ")
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+def lookup_names(query: str, kind: Optional[str] = None, limit: int = NAME_LOOKUP_LIMIT,
+                 engine=None) -> List[NameMatch]:
+    """
+    Nomi di anagrafiche simili a query (prefisso, parte del nome o con errori di
+    battitura), dal più simile. kind limita il tipo ("artist", "promoter",
+    "service", "format", "tour_manager").
+    L'indice trigram restituisce al più NAME_LOOKUP_CANDIDATES candidati con almeno
+    un trigramma in comune; l'ordinamento per somiglianza avviene solo su questi.
+    Con query vuota restituisce i primi nomi in ordine alfabetico (serve kind).
+    """
+    if engine is None:
+        from db import engine
+    folded = _fold(query)
+    if not folded:
+        source = next((s for s in NAME_SOURCES if s.kind == kind), None)
+        if source is None:
+            return []
+        with engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT id, name FROM {source.table} ORDER BY name LIMIT :limit"),
+                                {"limit": limit}).all()
+        return [NameMatch(kind, entity_id, name, 0.0) for entity_id, name in rows]
+    wanted = _name_trigrams(folded, partial_last=True)
+    # l'indice contiene i nomi originali (con accenti): si cercano anche i trigrammi non normalizzati
+    raw = " ".join((query or "").casefold().split())
+    terms = wanted | _name_trigrams(raw, partial_last=True)
+    match = " OR ".join('"' + gram.replace('"', '""') + '"' for gram in sorted(terms))
+    sql = f"SELECT kind, entity_id, name FROM {NAME_TABLE} WHERE {NAME_TABLE} MATCH :match"
+    params = {"match": match, "candidates": NAME_LOOKUP_CANDIDATES}
+    if kind:
+        sql += " AND kind = :kind"
+        params["kind"] = kind
+    sql += " ORDER BY rank LIMIT :candidates"
+    with engine.connect() as conn:
+        rows = conn.execute(text(sql), params).all()
+    scored = []
+    for row_kind, entity_id, name in rows:
+        grams = _name_trigrams(_fold(name))
+        common = len(wanted & grams)
+        coverage = common / len(wanted)
+        if coverage < NAME_MIN_SIMILARITY:
+            continue
+        # a parità di copertura vince il nome con meno trigrammi in più (più corto/simile)
+        jaccard = common / len(wanted | grams)
+        scored.append((-coverage, -jaccard, len(name), name, NameMatch(row_kind, entity_id, name, round(coverage, 3))))
+    scored.sort(key=lambda item: item[:4])
+    return [item[-1] for item in scored[:limit]]
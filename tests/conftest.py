@@ -0,0 +1,39 @@
+# tests/conftest.py
+"""
+Database SQLite temporaneo per i test: le variabili d'ambiente vanno impostate
+prima di importare db (engine creato all'import). Audit sincrono, così le righe
+sono leggibili subito dopo ogni operazione.
+"""
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="agency-tests-")
+os.environ["AGENCY_DB_FILE"] = os.path.join(_TMP_DIR, "agency.db")
+os.environ["AGENCY_AUDIT_SYNC"] = "1"
+
+import pytest
+
+import db
+import utils
+from models import AppMeta, Base
+
+db.ensure_db_ready()
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """
+    Tabelle vuote (tranne app_meta) e cache dei dati di riferimento azzerata a
+    ogni test; i trigger tengono allineati gli indici di ricerca.
+    """
+    with db.engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table is not AppMeta.__table__:
+                conn.execute(table.delete())
+    utils._invalidate_references(None)
+    yield
@@ -0,0 +1,88 @@
+# tests/test_backup.py
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+import backup
+import db
+import utils
+from models import ArtistBooking, ServiceAssignment, Task, event_artist, event_performer, event_service
+
+LINK_TABLES = [event_artist, event_service, event_performer, ArtistBooking.__table__, ServiceAssignment.__table__]
+
+
+def _snapshot():
+    """
+    Contenuto di tutte le tabelle del backup e delle associazioni, senza gli id
+    surrogati delle tabelle di collegamento.
+    """
+    state = {}
+    with db.engine.connect() as conn:
+        for key, table, columns in backup.EXPORT_SECTIONS:
+            state[key] = [tuple(r) for r in conn.execute(select(*[table.c[c] for c in columns]).order_by(table.c.id))]
+        for table in LINK_TABLES:
+            cols = [c for c in table.c if c.name != "id"]
+            state[table.name] = sorted(tuple(r) for r in conn.execute(select(*cols)))
+    return state
+
+
+@pytest.fixture
+def dataset():
+    dj = utils.add_artist("Dj Uno", "dj")
+    artist = utils.add_artist("Artista", "artist")
+    dancer = utils.add_artist("Ballerina", "ballerina")
+    service = utils.add_service("Service")
+    fmt = utils.add_format("Format")
+    promoter = utils.add_promoter("Promoter")
+    first = utils.save_event({
+        "title": "Primo", "date": date(2030, 7, 1), "type": "artist", "status": "confermato",
+        "artist_ids": [artist.id], "service_ids": [service.id], "dj_id": dj.id,
+        "ballerine_ids": [dancer.id], "format_id": fmt.id, "promoter_id": promoter.id,
+    })
+    second = utils.save_event({"title": "Secondo", "date": date(2030, 7, 2), "type": "service", "status": "bozza",
+                               "service_ids": [service.id]})
+    utils.add_task(first.id, "Hotel", due_date=date(2030, 6, 30))
+    utils.add_task(second.id, "Furgone")
+    return {"first": first.id, "second": second.id, "service": service.id}
+
+
+@pytest.mark.parametrize("filename", ["backup.json", "backup.json.gz"])
+def test_export_import_round_trip(tmp_path, dataset, filename):
+    path = str(tmp_path / filename)
+    before = _snapshot()
+    exported = utils.export_data_json(path)
+    assert exported["events"] == 2 and exported["tasks"] == 2
+
+    utils.import_data_json(path, clear_existing=True)
+    assert _snapshot() == before
+
+    # un secondo upsert dello stesso file non duplica nulla
+    utils.import_data_json(path, mode="upsert")
+    assert _snapshot() == before
+
+
+def test_import_rejects_booking_conflicts(tmp_path, dataset):
+    path = str(tmp_path / "backup.json")
+    utils.export_data_json(path)
+    data = backup.load_backup(path)
+    # il secondo evento del backup prende lo stesso giorno del primo: service doppio
+    data["events"][1]["date"] = "2030-07-01"
+    before = _snapshot()
+    with pytest.raises(ValueError, match="doppi impegni"):
+        backup.import_backup(data, mode="upsert")
+    assert _snapshot() == before
+
+
+def test_upsert_remaps_task_ids_used_by_other_rows(tmp_path, dataset):
+    path = str(tmp_path / "backup.json")
+    utils.export_data_json(path)
+    data = backup.load_backup(path)
+    task = next(t for t in data["tasks"] if t["event_id"] == dataset["first"])
+    other = next(t for t in data["tasks"] if t["event_id"] == dataset["second"])
+    # stesso id del task dell'altro evento: deve ricevere un id nuovo, non sovrascriverlo
+    data["tasks"] = [dict(task, id=other["id"], title="Check-in")]
+    backup.import_backup(data, mode="upsert")
+    with db.session_scope() as session:
+        titles = {t.title: t.event_id for t in session.query(Task)}
+    assert titles == {"Hotel": dataset["first"], "Furgone": dataset["second"], "Check-in": dataset["first"]}
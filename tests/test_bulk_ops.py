@@ -0,0 +1,101 @@
+# tests/test_bulk_ops.py
+from datetime import date
+
+import pytest
+
+import utils
+from db import session_scope
+from models import ArtistBooking, Event, ServiceAssignment, Task
+
+
+def _event(day, title="Evento", **data):
+    return utils.save_event({"title": title, "date": day, "type": "artist", "status": "bozza", **data})
+
+
+# -------------------------
+# CONFLITTI
+# -------------------------
+def test_service_and_artist_conflicts_are_detected():
+    s = utils.add_service("Service")
+    a = utils.add_artist("Artista", "dj")
+    ev = _event(date(2030, 5, 1), service_ids=[s.id], artist_ids=[a.id])
+
+    services = utils.find_service_conflicts([(s.id, date(2030, 5, 1)), (s.id, date(2030, 5, 2))])
+    artists = utils.find_artist_conflicts([(a.id, date(2030, 5, 1))])
+    assert [(c.service_id, c.date, c.conflicting_event_id) for c in services] == [(s.id, date(2030, 5, 1), ev.id)]
+    assert [(c.artist_id, c.conflicting_event_id) for c in artists] == [(a.id, ev.id)]
+    # l'evento stesso non è in conflitto con sé
+    assert utils.find_service_conflicts([(s.id, date(2030, 5, 1), ev.id)]) == []
+
+
+def test_save_event_rejects_double_booking():
+    s = utils.add_service("Service")
+    a = utils.add_artist("Artista", "dj")
+    _event(date(2030, 5, 1), service_ids=[s.id], artist_ids=[a.id])
+    with pytest.raises(ValueError):
+        _event(date(2030, 5, 1), title="Altro", service_ids=[s.id])
+    with pytest.raises(ValueError):
+        _event(date(2030, 5, 1), title="Altro", artist_ids=[a.id])
+    with session_scope() as db:
+        assert db.query(Event).count() == 1
+
+
+# -------------------------
+# OPERAZIONI MULTIPLE
+# -------------------------
+def test_bulk_set_status_writes_one_audit_row_per_event():
+    ids = [_event(date(2030, 5, d)).id for d in (1, 2, 3)]
+    assert utils.bulk_set_status(ids[:2], "confermato") == 2
+    # già nello stato richiesto: nessuna modifica
+    assert utils.bulk_set_status(ids[:2], "confermato") == 0
+    with session_scope() as db:
+        assert dict(db.query(Event.id, Event.status)) == {ids[0]: "confermato", ids[1]: "confermato", ids[2]: "bozza"}
+    for eid in ids[:2]:
+        assert [e.action for e in utils.get_audit_page("event", eid).entries][0] == "bulk_set_status"
+
+
+def test_bulk_set_status_rejects_unknown_status():
+    ev = _event(date(2030, 5, 1))
+    with pytest.raises(ValueError):
+        utils.bulk_set_status([ev.id], "annullato")
+    assert utils.get_event(ev.id).status == "bozza"
+
+
+def test_bulk_shift_dates_moves_bookings_together():
+    s = utils.add_service("Service")
+    a = utils.add_artist("Artista", "dj")
+    # stesso service e artista in giorni consecutivi: spostati insieme non sono in conflitto
+    first = _event(date(2030, 5, 1), service_ids=[s.id], artist_ids=[a.id])
+    second = _event(date(2030, 5, 2), title="Secondo", service_ids=[s.id], artist_ids=[a.id])
+    res = utils.bulk_shift_dates([first.id, second.id], 1)
+    assert res == {"events": 2, "service_assignments": 2, "artist_bookings": 2}
+    with session_scope() as db:
+        assert dict(db.query(Event.id, Event.date)) == {first.id: date(2030, 5, 2), second.id: date(2030, 5, 3)}
+        assert dict(db.query(ServiceAssignment.event_id, ServiceAssignment.date)) == {
+            first.id: date(2030, 5, 2), second.id: date(2030, 5, 3)}
+        assert dict(db.query(ArtistBooking.event_id, ArtistBooking.date)) == {
+            first.id: date(2030, 5, 2), second.id: date(2030, 5, 3)}
+
+
+def test_bulk_shift_dates_conflict_changes_nothing():
+    s = utils.add_service("Service")
+    moving = _event(date(2030, 5, 1), service_ids=[s.id])
+    _event(date(2030, 5, 2), title="Fermo", service_ids=[s.id])
+    with pytest.raises(ValueError):
+        utils.bulk_shift_dates([moving.id], 1)
+    assert utils.get_event(moving.id).date == date(2030, 5, 1)
+
+
+def test_bulk_delete_removes_dependent_rows():
+    s = utils.add_service("Service")
+    a = utils.add_artist("Artista", "dj")
+    ev = _event(date(2030, 5, 1), service_ids=[s.id], artist_ids=[a.id])
+    keep = _event(date(2030, 5, 2), title="Resta")
+    utils.add_task(ev.id, "Hotel")
+    counts = utils.bulk_delete([ev.id])
+    assert counts["events"] == 1 and counts["tasks"] == 1 and counts["service_assignments"] == 1
+    with session_scope() as db:
+        assert [eid for (eid,) in db.query(Event.id)] == [keep.id]
+        assert db.query(Task).count() == 0
+        assert db.query(ArtistBooking).count() == 0
+    assert [e.action for e in utils.get_audit_page("event", ev.id).entries][0] == "bulk_delete"
@@ -0,0 +1,44 @@
+# tests/test_change_feed.py
+from datetime import date, datetime, timedelta
+
+import utils
+
+
+def _event(title="Evento"):
+    return utils.save_event({"title": title, "date": date(2030, 8, 1), "type": "service"})
+
+
+def test_changes_are_merged_per_entity_in_last_change_order():
+    start = utils.current_change_seq()
+    ev = _event()
+    task = utils.add_task(ev.id, "Hotel")
+    utils.delete_task(task.id)
+    utils.save_event({"id": ev.id, "title": "Rinominato", "date": ev.date, "type": "service"})
+
+    feed = utils.get_changes_since(start)
+    assert [(c.entity, c.entity_id, c.action, c.changes) for c in feed.changes] == [
+        ("task", task.id, "delete", 2), ("event", ev.id, "create", 2)]
+    assert feed.next_seq == utils.current_change_seq() and not feed.has_more and not feed.reset
+    assert utils.get_changes_since(feed.next_seq).changes == []
+
+
+def test_limit_pages_through_the_log():
+    start = utils.current_change_seq()
+    ids = [_event(f"Evento {i}").id for i in range(5)]
+    seen, seq = [], start
+    while True:
+        feed = utils.get_changes_since(seq, limit=2)
+        seen.extend(c.entity_id for c in feed.changes if c.entity == "event")
+        seq = feed.next_seq
+        if not feed.has_more:
+            break
+    assert seen == ids
+
+
+def test_consumer_behind_pruned_rows_gets_reset():
+    start = utils.current_change_seq()
+    for i in range(3):
+        _event(f"Evento {i}")
+    assert utils.prune_change_log(keep_days=0, now=datetime.utcnow() + timedelta(days=1)) == 2
+    assert utils.get_changes_since(start).reset
+    assert not utils.get_changes_since(utils.current_change_seq()).reset
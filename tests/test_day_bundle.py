@@ -0,0 +1,30 @@
+# tests/test_day_bundle.py
+from datetime import date
+
+import utils
+
+
+def test_day_bundle_groups_tasks_by_event():
+    day = date(2030, 9, 1)
+    dj = utils.add_artist("Dj", "dj")
+    utils.add_artist("Artista", "artist")
+    promoter = utils.add_promoter("Promoter")
+    first = utils.save_event({"title": "Primo", "date": day, "type": "artist"})
+    second = utils.save_event({"title": "Secondo", "date": day, "type": "artist"})
+    utils.save_event({"title": "Altro giorno", "date": date(2030, 9, 2), "type": "artist"})
+    done = utils.add_task(first.id, "Fatta")
+    utils.toggle_task_done(done.id)
+    todo = utils.add_task(first.id, "Da fare")
+
+    bundle = utils.load_day_bundle(day)
+    assert [ev.id for ev in bundle.events] == [first.id, second.id]
+    # non fatte prima, ogni evento del giorno presente anche senza task
+    assert [t.id for t in bundle.tasks_by_event[first.id]] == [todo.id, done.id]
+    assert bundle.tasks_by_event[second.id] == []
+    assert [a.id for a in bundle.djs] == [dj.id]
+    assert [p.id for p in bundle.promoters] == [promoter.id]
+
+
+def test_empty_day():
+    bundle = utils.load_day_bundle(date(2030, 9, 3))
+    assert bundle.events == [] and bundle.tasks_by_event == {}
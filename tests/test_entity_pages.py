@@ -0,0 +1,28 @@
+# tests/test_entity_pages.py
+import utils
+
+
+def test_artist_pages_follow_name_order_without_gaps():
+    names = ["Zeta", "alfa", "Beta", "Gamma", "Delta"]
+    for name in names:
+        utils.add_artist(name, "dj" if name in ("Beta", "Delta") else "artist")
+    seen, after = [], None
+    while True:
+        page = utils.list_artists_page(after_name=after, page_size=2)
+        assert page.total == len(names)
+        seen.extend(a.name for a in page.items)
+        after = page.next_after
+        if after is None:
+            break
+    assert seen == sorted(names)
+
+
+def test_last_full_page_and_role_filter():
+    for name in ("A", "B", "C", "D"):
+        utils.add_artist(name, "dj" if name in ("B", "D") else "artist")
+    first = utils.list_artists_page(page_size=4)
+    assert [a.name for a in first.items] == ["A", "B", "C", "D"] and first.next_after is None
+    djs = utils.list_artists_page(role="dj", page_size=1)
+    assert [a.name for a in djs.items] == ["B"] and djs.next_after == "B" and djs.total == 2
+    rest = utils.list_artists_page(after_name=djs.next_after, role="dj", page_size=1)
+    assert [a.name for a in rest.items] == ["D"] and rest.next_after is None
@@ -0,0 +1,66 @@
+# tests/test_event_pages.py
+from datetime import date
+
+import pytest
+
+import utils
+
+
+@pytest.fixture
+def events():
+    # date ripetute e location mancanti: il keyset deve gestire pari merito e NULL
+    locations = ["Roma", None, "Milano", "", "Roma", None, "Bari"]
+    ids = []
+    for i, location in enumerate(locations):
+        ev = utils.save_event({
+            "title": f"Evento {i % 3}", "date": date(2030, 6, 1 + i // 2), "location": location,
+            "type": "artist" if i % 2 else "service", "status": utils.EVENT_STATUSES[i % 3],
+        })
+        ids.append(ev.id)
+    return ids
+
+
+def _all_pages(order_by, page_size, **filters):
+    pages, cursor = [], None
+    while True:
+        page = utils.list_events_page(order_by=order_by, after=cursor, page_size=page_size, **filters)
+        pages.append(page)
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("order_by", sorted(utils.EVENT_ORDERINGS) + ["-" + k for k in sorted(utils.EVENT_ORDERINGS)])
+@pytest.mark.parametrize("page_size", [1, 2, 3, 7, 10])
+def test_pages_visit_each_event_once_in_query_order(events, order_by, page_size):
+    pages = _all_pages(order_by, page_size)
+    seen = [row.id for page in pages for row in page.rows]
+    expected = [ev.id for ev in utils.query_events(order_by=order_by, with_relations=False)]
+    # stesso ordine di query_events, a meno dei NULL che il keyset ordina come ''
+    assert sorted(seen) == sorted(events)
+    assert len(seen) == len(set(seen))
+    if order_by.lstrip("-") in ("date", "title", "id"):
+        assert seen == expected
+    assert all(page.total == len(events) for page in pages)
+    assert all(len(page.rows) == page_size for page in pages[:-1])
+    assert 0 < len(pages[-1].rows) <= page_size
+
+
+def test_exact_multiple_of_page_size_has_no_empty_trailing_page(events):
+    pages = _all_pages("date", 7)
+    assert len(pages) == 1 and pages[0].next_cursor is None
+
+
+def test_filters_apply_to_rows_and_total(events):
+    page = utils.list_events_page(status="confermato", page_size=1)
+    assert page.total == 2
+    assert all(row.status == "confermato" for row in page.rows)
+    assert set(utils.list_event_ids(status="confermato")) == {
+        row.id for p in _all_pages("date", 1, status="confermato") for row in p.rows}
+
+
+def test_empty_result_and_invalid_ordering(events):
+    page = utils.list_events_page(date(2031, 1, 1), date(2031, 12, 31))
+    assert page == utils.EventPage([], None, 0)
+    with pytest.raises(ValueError):
+        utils.list_events_page(order_by="promoter")
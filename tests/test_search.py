@@ -0,0 +1,29 @@
+# tests/test_search.py
+from datetime import date
+
+import search
+import utils
+
+
+def test_search_text_follows_inserts_updates_and_deletes():
+    ev = utils.save_event({"title": "Festa di primavera", "date": date(2030, 4, 1), "type": "artist",
+                           "notes": "palco coperto"})
+    utils.add_task(ev.id, "Prenotare hotel", description="vicino al palco")
+    hits = search.search_text("palco")
+    assert {(h.kind, h.title) for h in hits} == {("event", "Festa di primavera"), ("task", "Prenotare hotel")}
+    assert [h.kind for h in search.search_text("palco", kinds=["task"])] == ["task"]
+    # ricerca per prefisso dell'ultima parola
+    assert [h.entity_id for h in search.search_text("primav")] == [ev.id]
+
+    utils.save_event({"id": ev.id, "title": "Festa d'estate", "date": ev.date, "type": "artist"})
+    assert search.search_text("primavera") == []
+    utils.delete_event(ev.id)
+    assert search.search_text("estate") == []
+
+
+def test_lookup_names_tolerates_typos():
+    dj = utils.add_artist("Marco Bellini", "dj")
+    utils.add_promoter("Marea Eventi")
+    matches = search.lookup_names("marko belini")
+    assert matches and matches[0].entity_id == dj.id and matches[0].kind == "artist"
+    assert all(m.kind == "promoter" for m in search.lookup_names("marea", kind="promoter"))
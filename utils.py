@@ -1,14 +1,23 @@
 # utils.py
-from db import get_session
+from db import get_session, session_scope, current_scope, run_after_commit, count_statements, SessionFactory
+from audit import enqueue_audit, flush_audit, read_archived_audit
+from refcache import (
+    reference_cache, REFERENCE_KINDS,
+    ArtistRef, ServiceRef, FormatRef, PromoterRef, TourManagerRef
+)
 from models import (
     Event, Artist, Service, Format, Promoter, TourManager,
-    Task, AuditLog, ServiceAssignment, ExternalAccount,
-    EventTemplate, TaskTemplate
+    Task, AuditLog, ChangeLog, ServiceAssignment, ArtistBooking, ExternalAccount,
+    EventTemplate, TaskTemplate, event_artist, event_service, event_performer,
+    PERFORMER_ROLES, PERFORMER_FIELDS, EVENT_STATUSES, parse_performer_ids
 )
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, or_, func, exists, insert, literal, tuple_
+from sqlalchemy.orm import joinedload, selectinload, Session
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import date, datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, NamedTuple, Tuple
+from contextlib import contextmanager
+from types import SimpleNamespace
 import json
 import os
 # debug wrapper (temporaneo)
@@ -34,62 +43,337 @@ def _commit_and_refresh(db, obj):
         db.rollback()
         raise
 
-def record_audit(entity: str, entity_id: int, action: str, payload: Dict[str, Any], user: str = ""):
-    db = get_session()
-    try:
-        a = AuditLog(entity=entity, entity_id=entity_id, action=action, payload=json.dumps(payload, default=str), user=user, ts=datetime.utcnow())
-        db.add(a)
-        db.commit()
-    finally:
-        db.close()
+@contextmanager
+def _unit_of_work(db: Optional[Session] = None):
+    """
+    Sessione per una funzione di utils:
+    - db passato dal chiamante: lo usa così com'è, commit a carico del chiamante;
+    - altrimenti apre (o si unisce a) un session_scope, che fa commit all'uscita.
+    Le funzioni fanno solo flush, mai commit.
+    """
+    if db is not None:
+        yield db
+    else:
+        with session_scope() as scoped:
+            yield scoped
 
-def get_audit_logs(entity: str = None, entity_id: int = None, limit: int = 100) -> List[AuditLog]:
-    db = get_session()
-    try:
+def _after_commit(db: Optional[Session], callback) -> None:
+    """
+    Rimanda callback al commit della transazione in corso (db o session_scope attivo);
+    senza transazione in corso lo esegue subito.
+    """
+    target = db if db is not None else current_scope()
+    if target is not None:
+        run_after_commit(target, callback)
+    else:
+        callback()
+
+def record_audit(entity: str, entity_id: int, action: str, payload: Dict[str, Any], user: str = "", db: Optional[Session] = None):
+    """
+    Accoda una riga di audit al writer asincrono (vedi audit.py).
+    Il timestamp è quello della chiamata, non quello della scrittura su DB.
+    Dentro una unità di lavoro la riga viene accodata solo dopo il commit.
+    """
+    record_audit_many(entity, [(entity_id, payload)], action, user=user, db=db)
+
+def record_audit_many(entity: str, items: Iterable[Tuple[Optional[int], Dict[str, Any]]], action: str,
+                      user: str = "", db: Optional[Session] = None):
+    """
+    Come record_audit, una riga per (entity_id, payload): le operazioni multiple
+    registrano ogni entità toccata, così compare nel suo storico (get_audit_page).
+    """
+    if isinstance(user, dict):
+        # le pagine passano st.session_state["user"], che è un dict
+        user = user.get("username", "")
+    ts = datetime.utcnow()
+    rows = [
+        {
+            "entity": entity,
+            "entity_id": entity_id,
+            "action": action,
+            "payload": json.dumps(payload, default=str),
+            "user": user,
+            "ts": ts,
+        }
+        for entity_id, payload in items
+    ]
+
+    def _enqueue():
+        for row in rows:
+            enqueue_audit(row)
+    _after_commit(db, _enqueue)
+
+def get_audit_logs(entity: str = None, entity_id: int = None, limit: int = 100, db: Optional[Session] = None,
+                   include_archived: bool = False) -> List[AuditLog]:
+    """
+    Ultime righe di audit (più recenti prima).
+    Con include_archived=True vengono considerate anche le righe spostate nei
+    segmenti di archivio (vedi audit.archive_audit_logs), restituite come AuditLog
+    non collegati alla sessione.
+    """
+    # le righe ancora in coda devono essere visibili a chi legge subito dopo un salvataggio
+    flush_audit()
+    with _unit_of_work(db) as db:
         q = db.query(AuditLog).order_by(AuditLog.ts.desc())
         if entity:
             q = q.filter(AuditLog.entity == entity)
         if entity_id:
             q = q.filter(AuditLog.entity_id == entity_id)
-        return q.limit(limit).all()
-    finally:
-        db.close()
+        logs = q.limit(limit).all()
+    if not include_archived:
+        return logs
+    # policy diverse per action: le righe archiviate non sono per forza più vecchie di tutte quelle correnti
+    archived = [AuditLog(**row) for row in read_archived_audit(entity, entity_id, limit=limit)]
+    merged = sorted(logs + archived, key=lambda al: (al.ts, al.id), reverse=True)
+    return merged[:limit]
+
+AUDIT_PAGE_SIZE = 25
+
+class AuditEntry(NamedTuple):
+    """
+    Riga di audit per i pannelli attività: payload resta la stringa JSON salvata,
+    payload_data() la decodifica solo quando serve.
+    """
+    id: int
+    entity: str
+    entity_id: Optional[int]
+    action: str
+    user: str
+    ts: datetime
+    payload: str
+
+    def payload_data(self) -> Any:
+        try:
+            return json.loads(self.payload) if self.payload else None
+        except ValueError:
+            return self.payload
+
+class AuditPage(NamedTuple):
+    entries: List[AuditEntry]
+    next_cursor: Optional[Tuple[datetime, int]]   # (before_ts, before_id) della pagina successiva
+
+def get_audit_page(entity: str, entity_id: Optional[int] = None, before_ts: Optional[datetime] = None,
+                   before_id: Optional[int] = None, page_size: int = AUDIT_PAGE_SIZE,
+                   db: Optional[Session] = None) -> AuditPage:
+    """
+    Una pagina di audit per entity/entity_id, dalla più recente, con cursore keyset
+    (ts, id): la pagina successiva si chiede con before_ts/before_id = next_cursor.
+    La query scorre ix_audit_logs_entity_ts (entity, entity_id, ts + rowid) senza ordinamenti.
+    next_cursor è None sull'ultima pagina.
+    """
+    flush_audit()
+    with _unit_of_work(db) as db:
+        q = db.query(
+            AuditLog.id, AuditLog.entity, AuditLog.entity_id, AuditLog.action,
+            AuditLog.user, AuditLog.ts, AuditLog.payload
+        ).filter(AuditLog.entity == entity)
+        if entity_id is not None:
+            q = q.filter(AuditLog.entity_id == entity_id)
+        if before_ts is not None:
+            if before_id is None:
+                q = q.filter(AuditLog.ts < before_ts)
+            else:
+                # ts <= before_ts dà a SQLite il limite di range sull'indice
+                q = q.filter(AuditLog.ts <= before_ts, or_(AuditLog.ts < before_ts, AuditLog.id < before_id))
+        rows = q.order_by(AuditLog.ts.desc(), AuditLog.id.desc()).limit(page_size + 1).all()
+    entries = [AuditEntry(*row) for row in rows[:page_size]]
+    next_cursor = (entries[-1].ts, entries[-1].id) if len(rows) > page_size else None
+    return AuditPage(entries, next_cursor)
 
 # -------------------------
-# ARTISTI
+# SEQUENZA MODIFICHE (change_log)
 # -------------------------
-def list_artists() -> List[Artist]:
-    db = get_session()
-    try:
-        return db.query(Artist).order_by(Artist.name).all()
-    finally:
-        db.close()
+# change_log è scritto dai trigger (vedi migrations.ensure_change_triggers): ogni
+# scrittura, anche set-based o da script, ha il suo seq. I consumatori incrementali
+# salvano next_seq e alla volta successiva leggono solo le differenze.
+CHANGES_PAGE_SIZE = 500
+CHANGE_LOG_KEEP_DAYS = int(os.environ.get("AGENCY_CHANGE_LOG_KEEP_DAYS", "30"))
+
+class EntityChange(NamedTuple):
+    """
+    Riepilogo delle modifiche di un'entità nella finestra letta.
+    action: "create" se creata nella finestra e ancora presente, "delete" se
+    l'ultima modifica è un'eliminazione, altrimenti "update".
+    """
+    entity: str
+    entity_id: Optional[int]
+    action: str
+    first_seq: int
+    last_seq: int
+    changes: int        # righe di change_log riassunte
+    ts: datetime        # ultima modifica
+
+class ChangeFeed(NamedTuple):
+    changes: List[EntityChange]   # ordinate per last_seq
+    next_seq: int                 # seq da passare alla chiamata successiva
+    has_more: bool                # altre modifiche oltre limit: richiamare subito con next_seq
+    reset: bool                   # le modifiche dopo seq sono state in parte eliminate: ricaricare tutto
+
+def current_change_seq(db: Optional[Session] = None) -> int:
+    """
+    Ultimo seq registrato (0 se nessuno): punto di partenza dopo un caricamento completo.
+    """
+    with _unit_of_work(db) as db:
+        return db.query(func.max(ChangeLog.seq)).scalar() or 0
+
+def get_changes_since(seq: int = 0, limit: int = CHANGES_PAGE_SIZE, db: Optional[Session] = None) -> ChangeFeed:
+    """
+    Entità modificate dopo seq, nell'ordine dell'ultima modifica, leggendo al più
+    limit righe di change_log (range sulla chiave primaria).
+    Esempio:
+        feed = get_changes_since(last_seq)
+        for ch in feed.changes: ...
+        last_seq = feed.next_seq
+    """
+    seq = int(seq or 0)
+    with _unit_of_work(db) as db:
+        rows = (
+            db.query(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.action, ChangeLog.ts)
+            .filter(ChangeLog.seq > seq)
+            .order_by(ChangeLog.seq)
+            .limit(limit + 1)
+            .all()
+        )
+        oldest = db.query(func.min(ChangeLog.seq)).scalar()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # i seq sono consecutivi: un buco tra seq e la riga più vecchia rimasta vuol dire prune_change_log
+    reset = oldest is not None and seq < oldest - 1
+    summary: Dict[Tuple[str, Optional[int]], EntityChange] = {}
+    for row_seq, entity, entity_id, action, ts in rows:
+        key = (entity, entity_id)
+        prev = summary.pop(key, None)
+        if prev is None:
+            summary[key] = EntityChange(entity, entity_id, action, row_seq, row_seq, 1, ts)
+            continue
+        if action == "delete":
+            merged = "delete"
+        elif prev.action == "create":
+            merged = "create"
+        else:
+            # anche eliminata e ricreata: per chi la aveva è un aggiornamento
+            merged = "update"
+        # reinserita in coda: il dict resta ordinato per last_seq
+        summary[key] = prev._replace(action=merged, last_seq=row_seq, changes=prev.changes + 1, ts=ts)
+    next_seq = rows[-1][0] if rows else seq
+    return ChangeFeed(list(summary.values()), next_seq, has_more, reset)
+
+def prune_change_log(keep_days: int = CHANGE_LOG_KEEP_DAYS, now: Optional[datetime] = None,
+                     db: Optional[Session] = None) -> int:
+    """
+    Elimina le righe di change_log più vecchie di keep_days giorni (l'ultima riga
+    resta sempre). I consumatori rimasti indietro ricevono ChangeFeed.reset=True.
+    Restituisce il numero di righe eliminate.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=keep_days)
+    with _unit_of_work(db) as db:
+        # seq e ts crescono insieme: si parte dalla fine e ci si ferma alla prima riga vecchia
+        last_old = (
+            db.query(ChangeLog.seq).filter(ChangeLog.ts < cutoff)
+            .order_by(ChangeLog.seq.desc()).limit(1).scalar()
+        )
+        newest = db.query(func.max(ChangeLog.seq)).scalar()
+        if last_old is None:
+            return 0
+        return db.query(ChangeLog).filter(ChangeLog.seq <= min(last_old, newest - 1)).delete(synchronize_session=False)
 
-def list_artists_by_role(role: str) -> List[Artist]:
-    db = get_session()
+# -------------------------
+# DATI DI RIFERIMENTO (cache di processo, vedi refcache.py)
+# -------------------------
+_REFERENCE_MODELS = {
+    "artist": Artist,
+    "service": Service,
+    "format": Format,
+    "promoter": Promoter,
+    "tour_manager": TourManager,
+}
+
+def _query_references(db, kind: str) -> list:
+    model = _REFERENCE_MODELS[kind]
+    ref_cls = REFERENCE_KINDS[kind]
+    cols = [getattr(model, field) for field in ref_cls._fields]
+    return [ref_cls(*row) for row in db.query(*cols).order_by(model.name)]
+
+def _load_references(kind: str) -> list:
+    # sessione propria: la cache deve vedere solo dati committati
+    db = SessionFactory()
     try:
-        return db.query(Artist).filter(Artist.role == role).order_by(Artist.name).all()
+        return _query_references(db, kind)
     finally:
         db.close()
 
-def add_artist(name: str, role: str = "artist", phone: str = "", email: str = "", notes: str = "") -> Artist:
-    db = get_session()
-    try:
+def _references(kind: str, db: Optional[Session] = None) -> list:
+    """
+    Lista di record immutabili per kind. Con db passato legge nella transazione
+    del chiamante (vede le sue modifiche non ancora committate) senza cache.
+    """
+    if db is not None:
+        return _query_references(db, kind)
+    return list(reference_cache.get(kind, lambda: _load_references(kind)))
+
+def _invalidate_references(kind: Optional[str], db: Optional[Session] = None) -> None:
+    """
+    Invalida subito (letture nella stessa transazione) e di nuovo dopo il commit
+    (un altro thread potrebbe aver ricaricato i dati vecchi nel frattempo).
+    """
+    kinds = (kind,) if kind else ()
+    reference_cache.invalidate(*kinds)
+    _after_commit(db, lambda: reference_cache.invalidate(*kinds))
+
+def reference_cache_stats() -> Dict[str, Dict[str, int]]:
+    return reference_cache.stats()
+
+ENTITY_PAGE_SIZE = 25
+
+class ReferencePage(NamedTuple):
+    items: list                  # record di refcache (ArtistRef, ServiceRef, ...) in ordine di nome
+    next_after: Optional[str]    # after_name della pagina successiva (None sull'ultima)
+    total: int                   # elementi con gli stessi filtri, su tutte le pagine
+
+def _references_page(kind: str, after_name: Optional[str] = None, page_size: int = ENTITY_PAGE_SIZE,
+                     role: Optional[str] = None, db: Optional[Session] = None) -> ReferencePage:
+    """
+    Una pagina di anagrafica con cursore keyset sul nome (unique): la pagina
+    successiva si chiede con after_name = next_after. La query scorre l'indice
+    sul nome (o ix_artists_role_name con role) e legge page_size + 1 righe.
+    """
+    model = _REFERENCE_MODELS[kind]
+    ref_cls = REFERENCE_KINDS[kind]
+    with _unit_of_work(db) as db:
+        filters = [model.role == role] if role else []
+        q = db.query(*[getattr(model, field) for field in ref_cls._fields]).filter(*filters)
+        if after_name is not None:
+            q = q.filter(model.name > after_name)
+        rows = q.order_by(model.name).limit(page_size + 1).all()
+        total = db.query(func.count(model.id)).filter(*filters).scalar()
+    items = [ref_cls(*row) for row in rows[:page_size]]
+    next_after = items[-1].name if len(rows) > page_size else None
+    return ReferencePage(items, next_after, total)
+
+# -------------------------
+# ARTISTI
+# -------------------------
+def list_artists(db: Optional[Session] = None) -> List[ArtistRef]:
+    return _references("artist", db)
+
+def list_artists_by_role(role: str, db: Optional[Session] = None) -> List[ArtistRef]:
+    return [a for a in _references("artist", db) if a.role == role]
+
+def list_artists_page(after_name: Optional[str] = None, role: Optional[str] = None,
+                      page_size: int = ENTITY_PAGE_SIZE, db: Optional[Session] = None) -> ReferencePage:
+    return _references_page("artist", after_name, page_size, role=role, db=db)
+
+def add_artist(name: str, role: str = "artist", phone: str = "", email: str = "", notes: str = "", db: Optional[Session] = None) -> Artist:
+    with _unit_of_work(db) as db:
         a = Artist(name=name.strip(), role=role, phone=phone.strip(), email=email.strip(), notes=notes)
         db.add(a)
-        db.commit()
-        db.refresh(a)
-        record_audit("artist", a.id, "create", {"name": a.name})
+        db.flush()
+        record_audit("artist", a.id, "create", {"name": a.name}, db=db)
+        _invalidate_references("artist", db)
         return a
-    except SQLAlchemyError:
-        db.rollback()
-        raise
-    finally:
-        db.close()
 
-def update_artist(artist_id: int, **fields) -> Optional[Artist]:
-    db = get_session()
-    try:
+def update_artist(artist_id: int, db: Optional[Session] = None, **fields) -> Optional[Artist]:
+    with _unit_of_work(db) as db:
         a = db.query(Artist).get(artist_id)
         if not a:
             return None
@@ -97,58 +381,55 @@ def update_artist(artist_id: int, **fields) -> Optional[Artist]:
         for k, v in fields.items():
             if hasattr(a, k):
                 setattr(a, k, v)
-        db.commit()
-        db.refresh(a)
-        record_audit("artist", artist_id, "update", {"before": before, "after": fields})
+        db.flush()
+        record_audit("artist", artist_id, "update", {"before": before, "after": fields}, db=db)
+        _invalidate_references("artist", db)
         return a
-    finally:
-        db.close()
 
-def delete_artist(artist_id: int) -> bool:
-    db = get_session()
-    try:
+def delete_artist(artist_id: int, db: Optional[Session] = None) -> bool:
+    with _unit_of_work(db) as db:
         a = db.query(Artist).get(artist_id)
         if not a:
             return False
+        affected = (
+            db.query(event_performer.c.event_id, event_performer.c.role)
+            .filter(event_performer.c.artist_id == artist_id)
+            .all()
+        )
+        db.execute(event_performer.delete().where(event_performer.c.artist_id == artist_id))
+        _refresh_legacy_performer_fields(db, affected)
+        db.query(ArtistBooking).filter(ArtistBooking.artist_id == artist_id).delete()
         db.delete(a)
-        db.commit()
-        record_audit("artist", artist_id, "delete", {"id": artist_id})
+        db.flush()
+        record_audit("artist", artist_id, "delete", {"id": artist_id}, db=db)
+        _invalidate_references("artist", db)
         return True
-    finally:
-        db.close()
 
 # -------------------------
 # SERVICES
 # -------------------------
-def list_services() -> List[Service]:
-    db = get_session()
-    try:
-        return db.query(Service).order_by(Service.name).all()
-    finally:
-        db.close()
+def list_services(db: Optional[Session] = None) -> List[ServiceRef]:
+    return _references("service", db)
 
-def get_service(service_id: int) -> Optional[Service]:
-    db = get_session()
-    try:
+def list_services_page(after_name: Optional[str] = None, page_size: int = ENTITY_PAGE_SIZE,
+                       db: Optional[Session] = None) -> ReferencePage:
+    return _references_page("service", after_name, page_size, db=db)
+
+def get_service(service_id: int, db: Optional[Session] = None) -> Optional[Service]:
+    with _unit_of_work(db) as db:
         return db.query(Service).filter(Service.id == service_id).first()
-    finally:
-        db.close()
 
-def add_service(name: str, contact: str = "", phone: str = "", notes: str = "") -> Service:
-    db = get_session()
-    try:
+def add_service(name: str, contact: str = "", phone: str = "", notes: str = "", db: Optional[Session] = None) -> Service:
+    with _unit_of_work(db) as db:
         s = Service(name=name.strip(), contact=contact.strip(), phone=phone.strip(), notes=notes)
         db.add(s)
-        db.commit()
-        db.refresh(s)
-        record_audit("service", s.id, "create", {"name": s.name})
+        db.flush()
+        record_audit("service", s.id, "create", {"name": s.name}, db=db)
+        _invalidate_references("service", db)
         return s
-    finally:
-        db.close()
 
-def update_service(service_id: int, **fields) -> Optional[Service]:
-    db = get_session()
-    try:
+def update_service(service_id: int, db: Optional[Session] = None, **fields) -> Optional[Service]:
+    with _unit_of_work(db) as db:
         s = db.query(Service).get(service_id)
         if not s:
             return None
@@ -156,51 +437,43 @@ def update_service(service_id: int, **fields) -> Optional[Service]:
         for k, v in fields.items():
             if hasattr(s, k):
                 setattr(s, k, v)
-        db.commit()
-        db.refresh(s)
-        record_audit("service", service_id, "update", {"before": before, "after": fields})
+        db.flush()
+        record_audit("service", service_id, "update", {"before": before, "after": fields}, db=db)
+        _invalidate_references("service", db)
         return s
-    finally:
-        db.close()
 
-def delete_service(service_id: int) -> bool:
-    db = get_session()
-    try:
+def delete_service(service_id: int, db: Optional[Session] = None) -> bool:
+    with _unit_of_work(db) as db:
         s = db.query(Service).get(service_id)
         if not s:
             return False
         db.delete(s)
-        db.commit()
-        record_audit("service", service_id, "delete", {"id": service_id})
+        db.flush()
+        record_audit("service", service_id, "delete", {"id": service_id}, db=db)
+        _invalidate_references("service", db)
         return True
-    finally:
-        db.close()
 
 # -------------------------
 # FORMATS
 # -------------------------
-def list_formats() -> List[Format]:
-    db = get_session()
-    try:
-        return db.query(Format).order_by(Format.name).all()
-    finally:
-        db.close()
+def list_formats(db: Optional[Session] = None) -> List[FormatRef]:
+    return _references("format", db)
 
-def add_format(name: str, description: str = "", notes: str = "") -> Format:
-    db = get_session()
-    try:
+def list_formats_page(after_name: Optional[str] = None, page_size: int = ENTITY_PAGE_SIZE,
+                      db: Optional[Session] = None) -> ReferencePage:
+    return _references_page("format", after_name, page_size, db=db)
+
+def add_format(name: str, description: str = "", notes: str = "", db: Optional[Session] = None) -> Format:
+    with _unit_of_work(db) as db:
         f = Format(name=name.strip(), description=description, notes=notes)
         db.add(f)
-        db.commit()
-        db.refresh(f)
-        record_audit("format", f.id, "create", {"name": f.name})
+        db.flush()
+        record_audit("format", f.id, "create", {"name": f.name}, db=db)
+        _invalidate_references("format", db)
         return f
-    finally:
-        db.close()
 
-def update_format(format_id: int, **fields) -> Optional[Format]:
-    db = get_session()
-    try:
+def update_format(format_id: int, db: Optional[Session] = None, **fields) -> Optional[Format]:
+    with _unit_of_work(db) as db:
         f = db.query(Format).get(format_id)
         if not f:
             return None
@@ -208,100 +481,502 @@ def update_format(format_id: int, **fields) -> Optional[Format]:
         for k, v in fields.items():
             if hasattr(f, k):
                 setattr(f, k, v)
-        db.commit()
-        db.refresh(f)
-        record_audit("format", format_id, "update", {"before": before, "after": fields})
+        db.flush()
+        record_audit("format", format_id, "update", {"before": before, "after": fields}, db=db)
+        _invalidate_references("format", db)
         return f
-    finally:
-        db.close()
 
-def delete_format(format_id: int) -> bool:
-    db = get_session()
-    try:
+def delete_format(format_id: int, db: Optional[Session] = None) -> bool:
+    with _unit_of_work(db) as db:
         f = db.query(Format).get(format_id)
         if not f:
             return False
         db.delete(f)
-        db.commit()
-        record_audit("format", format_id, "delete", {"id": format_id})
+        db.flush()
+        record_audit("format", format_id, "delete", {"id": format_id}, db=db)
+        _invalidate_references("format", db)
         return True
-    finally:
-        db.close()
 
 # -------------------------
 # PROMOTER / TOUR MANAGER
 # -------------------------
-def list_promoters() -> List[Promoter]:
-    db = get_session()
-    try:
-        return db.query(Promoter).order_by(Promoter.name).all()
-    finally:
-        db.close()
+def list_promoters(db: Optional[Session] = None) -> List[PromoterRef]:
+    return _references("promoter", db)
 
-def list_tour_managers() -> List[TourManager]:
-    db = get_session()
-    try:
-        return db.query(TourManager).order_by(TourManager.name).all()
-    finally:
-        db.close()
+def list_tour_managers(db: Optional[Session] = None) -> List[TourManagerRef]:
+    return _references("tour_manager", db)
+
+def list_promoters_page(after_name: Optional[str] = None, page_size: int = ENTITY_PAGE_SIZE,
+                        db: Optional[Session] = None) -> ReferencePage:
+    return _references_page("promoter", after_name, page_size, db=db)
+
+def list_tour_managers_page(after_name: Optional[str] = None, page_size: int = ENTITY_PAGE_SIZE,
+                            db: Optional[Session] = None) -> ReferencePage:
+    return _references_page("tour_manager", after_name, page_size, db=db)
 
 # -------------------------
 # EVENTI
 # -------------------------
-def list_events_by_date(target_date: date) -> List[Event]:
-    db = get_session()
-    try:
+def list_events_by_date(target_date: date, db: Optional[Session] = None) -> List[Event]:
+    with _unit_of_work(db) as db:
         return db.query(Event).filter(Event.date == target_date).options(joinedload(Event.artists), joinedload(Event.services)).order_by(Event.id).all()
-    finally:
-        db.close()
 
-def list_events_range(start_date: date, end_date: date) -> List[Event]:
-    db = get_session()
-    try:
-        return db.query(Event).filter(Event.date >= start_date, Event.date <= end_date).options(joinedload(Event.artists), joinedload(Event.services)).order_by(Event.date).all()
-    finally:
-        db.close()
+def list_events_range(start_date: date, end_date: date, db: Optional[Session] = None) -> List[Event]:
+    return query_events(start_date, end_date, db=db)
 
-def upcoming_events(days: int = 7) -> List[Event]:
-    db = get_session()
-    try:
+# ordinamenti ammessi da query_events ("-" davanti = discendente); id come spareggio stabile
+EVENT_ORDERINGS = {
+    "date": (Event.date, Event.id),
+    "title": (Event.title, Event.id),
+    "location": (Event.location, Event.id),
+    "status": (Event.status, Event.date, Event.id),
+    "type": (Event.type, Event.date, Event.id),
+    "id": (Event.id,),
+}
+
+def _as_values(value) -> Optional[List[Any]]:
+    """
+    Normalizza un filtro: None/"" -> nessun filtro, scalare -> [scalare], lista -> lista.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    return [value]
+
+def _missing(column):
+    # stessa semantica del filtro "not e.campo" usato dalle pagine: NULL oppure 0
+    return or_(column.is_(None), column == 0)
+
+def build_events_query(db, start_date: Optional[date] = None, end_date: Optional[date] = None, *,
+                       status=None, type_=None, artist_id: Optional[int] = None, service_id: Optional[int] = None,
+                       promoter_id: Optional[int] = None, format_id: Optional[int] = None,
+                       tour_manager_id: Optional[int] = None, performer_id: Optional[int] = None,
+                       performer_role=None, missing_dj: bool = False,
+                       missing_promoter: bool = False, missing_tour_manager: bool = False):
+    """
+    Query sugli eventi con tutti i predicati in SQL (senza ordinamento né limit).
+    status/type_/promoter_id/format_id/tour_manager_id accettano un valore o una lista.
+    artist_id/service_id diventano EXISTS sulle tabelle di associazione.
+    performer_id (con performer_role opzionale, valore o lista) cerca in event_performer.
+    """
+    q = db.query(Event)
+    if start_date is not None:
+        q = q.filter(Event.date >= start_date)
+    if end_date is not None:
+        q = q.filter(Event.date <= end_date)
+    for column, value in ((Event.status, status), (Event.type, type_), (Event.promoter_id, promoter_id),
+                          (Event.format_id, format_id), (Event.tour_manager_id, tour_manager_id)):
+        values = _as_values(value)
+        if values is not None:
+            q = q.filter(column.in_(values) if len(values) > 1 else column == values[0])
+    if artist_id:
+        q = q.filter(exists().where(event_artist.c.event_id == Event.id, event_artist.c.artist_id == artist_id))
+    if service_id:
+        q = q.filter(exists().where(event_service.c.event_id == Event.id, event_service.c.service_id == service_id))
+    if performer_id:
+        cond = [event_performer.c.event_id == Event.id, event_performer.c.artist_id == performer_id]
+        roles = _as_values(performer_role)
+        if roles is not None:
+            cond.append(event_performer.c.role.in_(roles))
+        q = q.filter(exists().where(*cond))
+    if missing_dj:
+        q = q.filter(_missing(Event.dj_id))
+    if missing_promoter:
+        q = q.filter(_missing(Event.promoter_id))
+    if missing_tour_manager:
+        q = q.filter(_missing(Event.tour_manager_id))
+    return q
+
+def query_events(start_date: Optional[date] = None, end_date: Optional[date] = None, *,
+                 order_by: str = "date", limit: Optional[int] = None, with_relations: bool = True,
+                 db: Optional[Session] = None, **filters) -> List[Event]:
+    """
+    Eventi filtrati interamente in SQL (vedi build_events_query per i filtri).
+    - order_by: una chiave di EVENT_ORDERINGS, con "-" per l'ordine discendente.
+    - limit: numero massimo di eventi.
+    - with_relations: carica artists e services (una query IN ciascuno).
+    Esempio: query_events(start, end, status="confermato", missing_dj=True)
+    """
+    descending = order_by.startswith("-")
+    key = order_by.lstrip("-")
+    if key not in EVENT_ORDERINGS:
+        raise ValueError(f"Ordinamento non valido: {order_by} (valori: {', '.join(EVENT_ORDERINGS)})")
+    columns = EVENT_ORDERINGS[key]
+    with _unit_of_work(db) as db:
+        q = build_events_query(db, start_date, end_date, **filters)
+        q = q.order_by(*[c.desc() for c in columns] if descending else columns)
+        if with_relations:
+            q = q.options(selectinload(Event.artists), selectinload(Event.services))
+        if limit:
+            q = q.limit(limit)
+        return q.all()
+
+EVENT_PAGE_SIZE = 50
+
+class EventRow(NamedTuple):
+    """
+    Riga leggera per le liste di eventi (nessun oggetto ORM, nessuna relazione).
+    """
+    id: int
+    date: date
+    title: str
+    location: str
+    type: str
+    status: str
+    promoter_id: Optional[int]
+    tour_manager_id: Optional[int]
+
+class EventPage(NamedTuple):
+    rows: List[EventRow]
+    next_cursor: Optional[tuple]   # after= della pagina successiva (None sull'ultima)
+    total: int                     # eventi con gli stessi filtri, su tutte le pagine
+
+def _event_sort_columns(key: str) -> list:
+    # un NULL renderebbe falso il confronto a tuple del keyset: le colonne nullable ordinano come ''
+    return [col if col.key in ("id", "date", "title") else func.coalesce(col, "") for col in EVENT_ORDERINGS[key]]
+
+def list_events_page(start_date: Optional[date] = None, end_date: Optional[date] = None, *,
+                     order_by: str = "date", after: Optional[tuple] = None, page_size: int = EVENT_PAGE_SIZE,
+                     db: Optional[Session] = None, **filters) -> EventPage:
+    """
+    Una pagina di EventRow con gli stessi filtri di query_events e il totale
+    contato in SQL. Paginazione keyset: la pagina successiva si chiede con
+    after = next_cursor (valori di ordinamento dell'ultima riga), senza OFFSET.
+    order_by: una chiave di EVENT_ORDERINGS, con "-" per l'ordine discendente.
+    """
+    descending = order_by.startswith("-")
+    key = order_by.lstrip("-")
+    if key not in EVENT_ORDERINGS:
+        raise ValueError(f"Ordinamento non valido: {order_by} (valori: {', '.join(EVENT_ORDERINGS)})")
+    columns = _event_sort_columns(key)
+    with _unit_of_work(db) as db:
+        base = build_events_query(db, start_date, end_date, **filters)
+        total = base.with_entities(func.count(Event.id)).scalar()
+        q = base.with_entities(
+            Event.id, Event.date, Event.title, func.coalesce(Event.location, ""), Event.type, Event.status,
+            Event.promoter_id, Event.tour_manager_id, *columns
+        )
+        if after is not None:
+            cursor = tuple_(*columns)
+            bound = tuple_(*[literal(value, col.type) for value, col in zip(after, columns)])
+            q = q.filter(cursor < bound if descending else cursor > bound)
+        q = q.order_by(*[c.desc() for c in columns] if descending else columns)
+        rows = q.limit(page_size + 1).all()
+    width = len(EventRow._fields)
+    page_rows = [EventRow(*row[:width]) for row in rows[:page_size]]
+    next_cursor = tuple(rows[page_size - 1][width:]) if len(rows) > page_size else None
+    return EventPage(page_rows, next_cursor, total)
+
+def list_event_ids(start_date: Optional[date] = None, end_date: Optional[date] = None, *,
+                   db: Optional[Session] = None, **filters) -> List[int]:
+    """
+    Solo gli id degli eventi filtrati (es. "seleziona tutti" nelle operazioni multiple).
+    """
+    with _unit_of_work(db) as db:
+        q = build_events_query(db, start_date, end_date, **filters)
+        return [eid for (eid,) in q.with_entities(Event.id).order_by(Event.date, Event.id)]
+
+def upcoming_events(days: int = 7, db: Optional[Session] = None) -> List[Event]:
+    with _unit_of_work(db) as db:
         today = date.today()
         end = today + timedelta(days=days)
         return db.query(Event).filter(Event.date >= today, Event.date <= end).order_by(Event.date).all()
-    finally:
-        db.close()
 
-def get_event(event_id: int) -> Optional[Event]:
+def count_events_by_day(start_date: date, end_date: date, type_: Optional[str] = None, status: Optional[str] = None, db: Optional[Session] = None) -> Dict[date, Dict[str, Any]]:
+    """
+    Conteggi per giorno nell'intervallo, con una sola query GROUP BY (date, status, type)
+    e i filtri applicati in SQL. Per il calendario mensile: non carica gli eventi.
+    Restituisce {data: {"total": n, "by_status": {stato: n}, "by_type": {tipo: n},
+    "first_status": stato}}; first_status è lo stato del primo evento del giorno
+    (id più basso), quello che colora la cella del calendario.
+    """
+    with _unit_of_work(db) as db:
+        q = db.query(Event.date, Event.status, Event.type, func.count(Event.id), func.min(Event.id)).filter(Event.date >= start_date, Event.date <= end_date)
+        if type_:
+            q = q.filter(Event.type == type_)
+        if status:
+            q = q.filter(Event.status == status)
+        rows = q.group_by(Event.date, Event.status, Event.type).all()
+    counts: Dict[date, Dict[str, Any]] = {}
+    first_ids: Dict[date, int] = {}
+    for d, st, typ, n, first_id in rows:
+        day = counts.setdefault(d, {"total": 0, "by_status": {}, "by_type": {}, "first_status": st})
+        day["total"] += n
+        day["by_status"][st] = day["by_status"].get(st, 0) + n
+        day["by_type"][typ] = day["by_type"].get(typ, 0) + n
+        if first_id < first_ids.get(d, first_id + 1):
+            first_ids[d] = first_id
+            day["first_status"] = st
+    return counts
+
+def get_event(event_id: int, db: Optional[Session] = None) -> Optional[Event]:
     if not event_id:
         return None
-    db = get_session()
-    try:
+    with _unit_of_work(db) as db:
         return db.query(Event).options(joinedload(Event.artists), joinedload(Event.services)).filter(Event.id == event_id).first()
-    finally:
-        db.close()
 
 # -------------------------
 # SERVICE AVAILABILITY (conflitti)
 # -------------------------
-def check_services_availability(date_obj: date, service_ids: List[int], exclude_event_id: Optional[int] = None) -> List[int]:
+# coppie (service_id, date) per query: 2 parametri ciascuna, sotto il limite di variabili SQLite
+CONFLICT_QUERY_CHUNK = 200
+
+class ServiceConflict(NamedTuple):
+    service_id: int
+    date: date
+    event_id: Optional[int]             # evento che richiede il service (None = nuovo evento)
+    conflicting_event_id: Optional[int] # evento che lo occupa già
+
+class ArtistConflict(NamedTuple):
+    artist_id: int
+    date: date
+    event_id: Optional[int]
+    conflicting_event_id: Optional[int]
+
+def _find_booking_conflicts(table, key_column: str, bookings: Iterable[Tuple],
+                            exclude_event_ids: Optional[Iterable[int]], db: Optional[Session]) -> List[Tuple]:
     """
-    Restituisce gli id dei service in conflitto per la data specificata.
+    Conflitti (chiave, data, event_id, conflicting_event_id) su una tabella di
+    impegni per data con vincolo unique (chiave, date): service_assignments o
+    artist_bookings. Vedi find_service_conflicts.
     """
-    db = get_session()
-    try:
-        conflicts = []
-        for sid in service_ids:
-            q = db.query(ServiceAssignment).filter(
-                ServiceAssignment.service_id == sid,
-                ServiceAssignment.date == date_obj
+    requested: Dict[Tuple[int, date], List[Optional[int]]] = {}
+    for b in bookings:
+        key, d = b[0], b[1]
+        eid = b[2] if len(b) > 2 else None
+        owners = requested.setdefault((key, d), [])
+        if eid not in owners:
+            owners.append(eid)
+    if not requested:
+        return []
+    excluded = set(exclude_event_ids or [])
+
+    conflicts: List[Tuple] = []
+    # conflitti interni: più eventi chiedono la stessa risorsa nello stesso giorno
+    for (key, d), owners in requested.items():
+        for i, eid in enumerate(owners[1:], start=1):
+            conflicts.append((key, d, eid, owners[i - 1]))
+
+    key_col = table.c[key_column]
+    keys = list(requested.keys())
+    with _unit_of_work(db) as db:
+        for i in range(0, len(keys), CONFLICT_QUERY_CHUNK):
+            chunk = keys[i:i + CONFLICT_QUERY_CHUNK]
+            # OR di uguaglianze: SQLite esegue una ricerca sull'indice unique per ogni coppia
+            q = db.query(key_col, table.c.date, table.c.event_id).filter(
+                or_(*[and_(key_col == key, table.c.date == d) for key, d in chunk])
             )
-            if exclude_event_id:
-                q = q.filter(ServiceAssignment.event_id != exclude_event_id)
-            if q.first():
-                conflicts.append(sid)
-        return conflicts
-    finally:
-        db.close()
+            if excluded:
+                q = q.filter(table.c.event_id.notin_(excluded))
+            for key, d, taken_by in q.all():
+                for eid in requested.get((key, d), []):
+                    if eid != taken_by:
+                        conflicts.append((key, d, eid, taken_by))
+    return conflicts
+
+def find_service_conflicts(bookings: Iterable[Tuple], exclude_event_ids: Optional[Iterable[int]] = None, db: Optional[Session] = None) -> List[ServiceConflict]:
+    """
+    Controllo conflitti set-based: una query (per blocco di CONFLICT_QUERY_CHUNK coppie)
+    su service_assignments, che usa l'indice uq_service_date (service_id, date).
+    - bookings: tuple (service_id, date) oppure (service_id, date, event_id); le
+      assegnazioni già dell'evento stesso non sono conflitti. event_id può essere
+      qualsiasi chiave hashable (es. un segnaposto per eventi non ancora creati).
+    - exclude_event_ids: eventi le cui assegnazioni vanno ignorate (es. eventi che
+      vengono spostati insieme).
+    Segnala anche i conflitti interni alla richiesta (stesso service, stessa data,
+    eventi diversi).
+    """
+    found = _find_booking_conflicts(ServiceAssignment.__table__, "service_id", bookings, exclude_event_ids, db)
+    return [ServiceConflict(*c) for c in found]
+
+def find_artist_conflicts(bookings: Iterable[Tuple], exclude_event_ids: Optional[Iterable[int]] = None, db: Optional[Session] = None) -> List[ArtistConflict]:
+    """
+    Come find_service_conflicts, per gli artisti su artist_bookings (indice uq_artist_date):
+    bookings sono tuple (artist_id, date) oppure (artist_id, date, event_id).
+    """
+    found = _find_booking_conflicts(ArtistBooking.__table__, "artist_id", bookings, exclude_event_ids, db)
+    return [ArtistConflict(*c) for c in found]
+
+def check_services_availability(date_obj: date, service_ids: List[int], exclude_event_id: Optional[int] = None, db: Optional[Session] = None) -> List[int]:
+    """
+    Restituisce gli id dei service in conflitto per la data specificata.
+    """
+    found = find_service_conflicts(
+        [(sid, date_obj) for sid in service_ids],
+        exclude_event_ids=[exclude_event_id] if exclude_event_id else None,
+        db=db,
+    )
+    conflicting = {c.service_id for c in found}
+    return [sid for sid in dict.fromkeys(service_ids) if sid in conflicting]
+
+def _unique_ids(ids) -> List[int]:
+    """
+    Id distinti nell'ordine originale, senza valori vuoti.
+    """
+    return [int(x) for x in dict.fromkeys(ids or []) if x not in (None, "")]
+
+def _sync_service_assignments(db, ev: Event, service_ids: List[int]) -> Dict[str, int]:
+    """
+    Allinea ev.service_assignments a service_ids sulla data ev.date applicando solo
+    le differenze (insert dei nuovi, delete dei rimossi, update della data dei
+    rimasti). ev deve avere già un id. Non esegue commit.
+    """
+    wanted = set(service_ids)
+    existing = {sa.service_id: sa for sa in ev.service_assignments}
+    stats = {"assignments_added": 0, "assignments_removed": 0, "assignments_moved": 0}
+    for sid, sa in existing.items():
+        if sid not in wanted:
+            db.delete(sa)
+            stats["assignments_removed"] += 1
+        elif sa.date != ev.date:
+            sa.date = ev.date
+            stats["assignments_moved"] += 1
+    new_rows = [{"event_id": ev.id, "service_id": sid, "date": ev.date} for sid in service_ids if sid not in existing]
+    if new_rows:
+        # prima delete/update (libera le coppie service/data), poi un unico executemany
+        db.flush()
+        db.execute(ServiceAssignment.__table__.insert(), new_rows)
+        db.expire(ev, ["service_assignments"])
+        stats["assignments_added"] = len(new_rows)
+    return stats
+
+def _sync_collection(collection, wanted_objs: List[Any]) -> Tuple[int, int]:
+    """
+    Allinea una relazione many-to-many agli oggetti voluti: rimuove/aggiunge solo
+    le differenze, così il flush tocca solo le righe cambiate della tabella di
+    associazione. Restituisce (aggiunti, rimossi).
+    """
+    wanted_ids = {o.id for o in wanted_objs}
+    current_ids = {o.id for o in collection}
+    removed = [o for o in collection if o.id not in wanted_ids]
+    for o in removed:
+        collection.remove(o)
+    added = [o for o in wanted_objs if o.id not in current_ids]
+    for o in added:
+        collection.append(o)
+    return len(added), len(removed)
+
+def _sync_performers(db, event_id: int, wanted: Dict[str, List[int]]) -> Dict[str, int]:
+    """
+    Allinea le righe event_performer dei ruoli in wanted (ruolo -> id artisti):
+    una lettura, poi delete/insert solo delle differenze.
+    """
+    current = set(
+        db.query(event_performer.c.role, event_performer.c.artist_id)
+        .filter(event_performer.c.event_id == event_id, event_performer.c.role.in_(list(wanted)))
+        .all()
+    )
+    target = {(role, aid) for role, ids in wanted.items() for aid in ids}
+    removed = current - target
+    added = target - current
+    for role in {r for r, _ in removed}:
+        db.execute(event_performer.delete().where(
+            event_performer.c.event_id == event_id,
+            event_performer.c.role == role,
+            event_performer.c.artist_id.in_([aid for r, aid in removed if r == role]),
+        ))
+    if added:
+        db.execute(event_performer.insert(), [
+            {"event_id": event_id, "artist_id": aid, "role": role} for role, aid in sorted(added)
+        ])
+    return {"performers_added": len(added), "performers_removed": len(removed)}
+
+def _legacy_performer_fields(performers: Dict[str, List[int]]) -> Dict[str, Any]:
+    """
+    Valori delle colonne legacy di Event (dj_id, ballerine_ids, ...) per i ruoli in performers.
+    """
+    fields = {}
+    for field, role in PERFORMER_FIELDS.items():
+        if role not in performers:
+            continue
+        ids = performers[role]
+        if field.endswith("_ids"):
+            fields[field] = ",".join(str(x) for x in ids)
+        else:
+            fields[field] = ids[0] if ids else None
+    return fields
+
+def _refresh_legacy_performer_fields(db, affected: Iterable[Tuple[int, str]]) -> None:
+    """
+    Riallinea le colonne legacy degli eventi alle righe event_performer rimaste,
+    per le coppie (event_id, ruolo) toccate: una lettura e un update per evento.
+    """
+    roles_by_event: Dict[int, set] = {}
+    for event_id, role in affected:
+        roles_by_event.setdefault(event_id, set()).add(role)
+    if not roles_by_event:
+        return
+    remaining: Dict[int, Dict[str, List[int]]] = {
+        event_id: {role: [] for role in roles} for event_id, roles in roles_by_event.items()
+    }
+    rows = (
+        db.query(event_performer.c.event_id, event_performer.c.role, event_performer.c.artist_id)
+        .filter(event_performer.c.event_id.in_(list(roles_by_event)))
+        .order_by(event_performer.c.event_id, event_performer.c.artist_id)
+        .all()
+    )
+    for event_id, role, aid in rows:
+        if role in remaining[event_id]:
+            remaining[event_id][role].append(aid)
+    for event_id, performers in remaining.items():
+        db.query(Event).filter(Event.id == event_id).update(
+            _legacy_performer_fields(performers), synchronize_session="fetch"
+        )
+
+def _sync_artist_bookings(db, ev: Event, artist_ids: List[int]) -> Dict[str, int]:
+    """
+    Allinea artist_bookings dell'evento ad artist_ids sulla data ev.date, dopo aver
+    verificato i conflitti (una query su uq_artist_date). Solleva ValueError se un
+    artista è già impegnato in un altro evento quel giorno. Non esegue commit.
+    """
+    conflicts = find_artist_conflicts([(aid, ev.date, ev.id) for aid in artist_ids], db=db)
+    if conflicts:
+        raise ValueError(f"Artisti già impegnati il {ev.date}: {sorted({c.artist_id for c in conflicts})}")
+    if ev.id is None:
+        db.flush()
+    ab = ArtistBooking.__table__
+    existing = dict(db.query(ab.c.artist_id, ab.c.date).filter(ab.c.event_id == ev.id).all())
+    wanted = set(artist_ids)
+    stats = {"bookings_added": 0, "bookings_removed": 0, "bookings_moved": 0}
+    removed = [aid for aid in existing if aid not in wanted]
+    if removed:
+        db.execute(ab.delete().where(ab.c.event_id == ev.id, ab.c.artist_id.in_(removed)))
+        stats["bookings_removed"] = len(removed)
+    moved = [aid for aid, d in existing.items() if aid in wanted and d != ev.date]
+    if moved:
+        db.execute(ab.update().where(ab.c.event_id == ev.id, ab.c.artist_id.in_(moved)).values(date=ev.date))
+        stats["bookings_moved"] = len(moved)
+    new_rows = [{"event_id": ev.id, "artist_id": aid, "date": ev.date} for aid in artist_ids if aid not in existing]
+    if new_rows:
+        db.execute(ab.insert(), new_rows)
+        stats["bookings_added"] = len(new_rows)
+    return stats
+
+def get_event_performers(event_id: int, db: Optional[Session] = None) -> Dict[str, List[int]]:
+    """
+    Performer dell'evento per ruolo: {"dj": [...], "vocalist": [...], "ballerina": [...], "mascotte": [...]}.
+    """
+    with _unit_of_work(db) as db:
+        rows = (
+            db.query(event_performer.c.role, event_performer.c.artist_id)
+            .filter(event_performer.c.event_id == event_id)
+            .all()
+        )
+    res = {role: [] for role in PERFORMER_ROLES}
+    for role, aid in rows:
+        res.setdefault(role, []).append(aid)
+    return res
+
+def list_performer_events(artist_id: int, role=None, start_date: Optional[date] = None,
+                          end_date: Optional[date] = None, db: Optional[Session] = None) -> List[Event]:
+    """
+    Eventi su cui l'artista è impegnato come performer (ruolo opzionale); con
+    start_date == end_date risponde a "è già impegnato quel giorno?".
+    Ricerca per indice su ix_event_performer_artist.
+    """
+    return query_events(start_date, end_date, performer_id=artist_id, performer_role=role,
+                        with_relations=False, db=db)
 
 def assign_services_to_event(db, event_obj: Event, service_ids: List[int]):
     """
@@ -317,124 +992,204 @@ def assign_services_to_event(db, event_obj: Event, service_ids: List[int]):
 # -------------------------
 # SAVE / DUPLICATE / DELETE EVENT con controllo service
 # -------------------------
-def save_event(data: dict, user: str = "") -> Optional[Event]:
+def save_event(data: dict, user: str = "", db: Optional[Session] = None, stats: Optional[Dict[str, int]] = None) -> Optional[Event]:
     """
     Salva o aggiorna un evento. Se viene passato 'service_ids' controlla conflitti e aggiorna ServiceAssignment.
+    Artisti e service vengono caricati con una query IN per tipo e sulle tabelle di
+    associazione vengono applicate solo le differenze: il numero di query non
+    dipende da quanti id vengono passati.
+    stats (opzionale): dict riempito con il numero di statement SQL eseguiti
+    ("statements") e le righe aggiunte/rimosse per relazione.
     """
-    db = get_session()
-    try:
-        if data.get("id"):
-            ev = db.query(Event).get(data["id"])
-            if not ev:
-                return None
-            before = {k: getattr(ev, k) for k in data.keys() if hasattr(ev, k)}
-        else:
-            ev = Event()
-            db.add(ev)
-            before = {}
-
-        # campi base
-        if "title" in data:
-            ev.title = data.get("title", ev.title)
-        if "date" in data:
-            ev.date = data.get("date", ev.date)
-        if "location" in data:
-            ev.location = data.get("location", ev.location)
-        if "type" in data:
-            ev.type = data.get("type", ev.type or "artist")
-        if "format_id" in data:
-            ev.format_id = data.get("format_id", ev.format_id)
-        if "promoter_id" in data:
-            ev.promoter_id = data.get("promoter_id", ev.promoter_id)
-        if "tour_manager_id" in data:
-            ev.tour_manager_id = data.get("tour_manager_id", ev.tour_manager_id)
-        if "status" in data:
-            ev.status = data.get("status", ev.status)
-        if "notes" in data:
-            ev.notes = data.get("notes", ev.notes)
-
-        # campi logistici
-        if "van" in data:
-            ev.van = data.get("van", ev.van)
-        if "travel" in data:
-            ev.travel = data.get("travel", ev.travel)
-        if "hotel" in data:
-            ev.hotel = data.get("hotel", ev.hotel)
-        if "allestimenti" in data:
-            ev.allestimenti = data.get("allestimenti", ev.allestimenti)
-        if "facchini" in data:
-            ev.facchini = data.get("facchini", ev.facchini)
-
-        if "payments_acconto" in data:
-            acconto = data.get("payments_acconto")
-            ev.payments_acconto = float(acconto) if acconto not in (None, "") else None
-        if "payments_saldo" in data:
-            saldo = data.get("payments_saldo")
-            ev.payments_saldo = float(saldo) if saldo not in (None, "") else None
-
-        # format-specific
-        if "dj_id" in data:
-            ev.dj_id = data.get("dj_id", ev.dj_id)
-        if "vocalist_id" in data:
-            ev.vocalist_id = data.get("vocalist_id", ev.vocalist_id)
-        if "ballerine_ids" in data:
-            ballerine = data.get("ballerine_ids", [])
-            ev.ballerine_ids = ",".join(str(x) for x in ballerine) if ballerine else ""
-        if "mascotte_ids" in data:
-            mascotte = data.get("mascotte_ids", [])
-            ev.mascotte_ids = ",".join(str(x) for x in mascotte) if mascotte else ""
-
-        # artists many-to-many
+    with count_statements() as counter, _unit_of_work(db) as db:
+        ev = _save_event(db, data, user, stats if stats is not None else {})
+    if stats is not None:
+        stats["statements"] = counter["statements"]
+    return ev
+
+def _save_event(db, data: dict, user: str, stats: Dict[str, int]) -> Optional[Event]:
+    if data.get("id"):
+        q = db.query(Event).filter(Event.id == data["id"])
         if "artist_ids" in data:
-            ev.artists = []
-            for aid in data.get("artist_ids", []):
-                a = db.query(Artist).get(aid)
-                if a:
-                    ev.artists.append(a)
-
-        # services many-to-many + ServiceAssignment check
+            q = q.options(selectinload(Event.artists))
         if "service_ids" in data:
-            service_ids = data.get("service_ids", [])
-            # controlla conflitti
-            conflicts = check_services_availability(ev.date, service_ids, exclude_event_id=ev.id if data.get("id") else None)
-            if conflicts:
-                raise ValueError(f"Service in conflitto per la data {ev.date}: {conflicts}")
-            # aggiorna relazione many-to-many (per compatibilità) e le assegnazioni esplicite
-            ev.services = []
-            for sid in service_ids:
-                s = db.query(Service).get(sid)
-                if s:
-                    ev.services.append(s)
-            # assegna usando la sessione corrente
-            assign_services_to_event(db, ev, service_ids)
-
-        db.commit()
-        db.refresh(ev)
-        record_audit("event", ev.id, "create" if not data.get("id") else "update", {"before": before, "after": data}, user=user)
-
-        # se richiesto, pubblica su calendar esterno (opzionale)
-        if data.get("publish_calendar_account_id") and data.get("status") == "confermato":
+            q = q.options(selectinload(Event.services))
+        if "service_ids" in data or "date" in data:
+            q = q.options(selectinload(Event.service_assignments))
+        ev = q.first()
+        if not ev:
+            return None
+        before = {k: getattr(ev, k) for k in data.keys() if hasattr(ev, k)}
+    else:
+        ev = Event()
+        db.add(ev)
+        before = {}
+    old_date = ev.date
+
+    # campi base
+    if "title" in data:
+        ev.title = data.get("title", ev.title)
+    if "date" in data:
+        ev.date = data.get("date", ev.date)
+    if "location" in data:
+        ev.location = data.get("location", ev.location)
+    if "type" in data:
+        ev.type = data.get("type", ev.type or "artist")
+    if "format_id" in data:
+        ev.format_id = data.get("format_id", ev.format_id)
+    if "promoter_id" in data:
+        ev.promoter_id = data.get("promoter_id", ev.promoter_id)
+    if "tour_manager_id" in data:
+        ev.tour_manager_id = data.get("tour_manager_id", ev.tour_manager_id)
+    if "status" in data:
+        ev.status = data.get("status", ev.status)
+    if "notes" in data:
+        ev.notes = data.get("notes", ev.notes)
+
+    # campi logistici
+    if "van" in data:
+        ev.van = data.get("van", ev.van)
+    if "travel" in data:
+        ev.travel = data.get("travel", ev.travel)
+    if "hotel" in data:
+        ev.hotel = data.get("hotel", ev.hotel)
+    if "allestimenti" in data:
+        ev.allestimenti = data.get("allestimenti", ev.allestimenti)
+    if "facchini" in data:
+        ev.facchini = data.get("facchini", ev.facchini)
+
+    if "payments_acconto" in data:
+        acconto = data.get("payments_acconto")
+        ev.payments_acconto = float(acconto) if acconto not in (None, "") else None
+    if "payments_saldo" in data:
+        saldo = data.get("payments_saldo")
+        ev.payments_saldo = float(saldo) if saldo not in (None, "") else None
+
+    # format-specific: righe event_performer per ruolo + copia nelle colonne legacy
+    performers = {
+        PERFORMER_FIELDS[field]: parse_performer_ids(data.get(field))
+        for field in PERFORMER_FIELDS if field in data
+    }
+    if performers:
+        requested = {aid for ids in performers.values() for aid in ids}
+        known = {aid for (aid,) in db.query(Artist.id).filter(Artist.id.in_(requested))} if requested else set()
+        performers = {role: [aid for aid in ids if aid in known] for role, ids in performers.items()}
+        for field, value in _legacy_performer_fields(performers).items():
+            setattr(ev, field, value)
+
+    # artists many-to-many: una query IN, poi solo le differenze
+    if "artist_ids" in data:
+        artist_ids = _unique_ids(data.get("artist_ids", []))
+        artists = db.query(Artist).filter(Artist.id.in_(artist_ids)).all() if artist_ids else []
+        stats["artists_added"], stats["artists_removed"] = _sync_collection(ev.artists, artists)
+
+    # services many-to-many + ServiceAssignment check
+    date_changed = bool(data.get("id")) and ev.date != old_date
+    if "service_ids" in data or (date_changed and ev.service_assignments):
+        if "service_ids" in data:
+            service_ids = _unique_ids(data.get("service_ids", []))
+            services = db.query(Service).filter(Service.id.in_(service_ids)).all() if service_ids else []
+            service_ids = [sid for sid in service_ids if sid in {s.id for s in services}]
+        else:
+            # cambio data senza service_ids: le assegnazioni esistenti seguono l'evento
+            service_ids = [sa.service_id for sa in ev.service_assignments]
+            services = None
+        # controlla conflitti (stessa sessione, una query)
+        conflicts = find_service_conflicts([(sid, ev.date, ev.id) for sid in service_ids], db=db)
+        if conflicts:
+            raise ValueError(f"Service in conflitto per la data {ev.date}: {sorted({c.service_id for c in conflicts})}")
+        # aggiorna relazione many-to-many (per compatibilità) e le assegnazioni esplicite
+        if services is not None:
+            stats["services_added"], stats["services_removed"] = _sync_collection(ev.services, services)
+        if ev.id is None:
+            db.flush()
+        stats.update(_sync_service_assignments(db, ev, service_ids))
+
+    if performers:
+        if ev.id is None:
+            db.flush()
+        stats.update(_sync_performers(db, ev.id, performers))
+
+    # impegni degli artisti (artisti dell'evento + performer) sulla data dell'evento
+    if "artist_ids" in data or performers or date_changed:
+        booked = [a.id for a in ev.artists]
+        if ev.id is not None:
+            booked += [aid for (aid,) in db.query(event_performer.c.artist_id).filter(event_performer.c.event_id == ev.id)]
+        stats.update(_sync_artist_bookings(db, ev, _unique_ids(booked)))
+
+    db.flush()
+    record_audit("event", ev.id, "create" if not data.get("id") else "update", {"before": before, "after": data}, user=user, db=db)
+
+    # se richiesto, pubblica su calendar esterno (opzionale) dopo il commit
+    if data.get("publish_calendar_account_id") and data.get("status") == "confermato":
+        def _push():
             try:
                 from integrations.calendar_sync import push_event_to_calendar
                 push_event_to_calendar(data.get("publish_calendar_account_id"), ev)
             except Exception as e:
                 record_audit("event", ev.id, "calendar_push_failed", {"error": str(e)}, user=user)
+        _after_commit(db, _push)
 
-        return ev
-    except SQLAlchemyError:
-        db.rollback()
-        raise
-    finally:
-        db.close()
+    return ev
 
-def duplicate_event(event_id: int, user: str = "") -> Optional[Event]:
-    db = get_session()
-    try:
+def _duplicate_links(db, ev: Event, target_date: date):
+    """
+    Righe performer, artisti e service dell'evento, con gli artisti e i service
+    già impegnati in target_date.
+    """
+    performer_rows = (
+        db.query(event_performer.c.role, event_performer.c.artist_id)
+        .filter(event_performer.c.event_id == ev.id)
+        .all()
+    )
+    artist_ids = _unique_ids([a.id for a in ev.artists] + [aid for _, aid in performer_rows])
+    service_ids = _unique_ids([sa.service_id for sa in ev.service_assignments])
+    busy_artists = {c.artist_id for c in find_artist_conflicts([(aid, target_date) for aid in artist_ids], db=db)}
+    busy_services = {c.service_id for c in find_service_conflicts([(sid, target_date) for sid in service_ids], db=db)}
+    return performer_rows, artist_ids, service_ids, busy_artists, busy_services
+
+def find_duplicate_conflicts(event_id: int, new_date: Optional[date] = None,
+                             db: Optional[Session] = None) -> Dict[str, List[int]]:
+    """
+    Artisti e service dell'evento già impegnati in new_date (di default la data
+    dell'evento, dove lo sono tutti): quelli che duplicate_event con
+    drop_conflicts=True lascerebbe fuori dalla copia.
+    {"artist_ids": [...], "service_ids": [...]}
+    """
+    with _unit_of_work(db) as db:
+        ev = db.query(Event).get(event_id)
+        if not ev:
+            return {"artist_ids": [], "service_ids": []}
+        _, _, _, busy_artists, busy_services = _duplicate_links(db, ev, new_date or ev.date)
+    return {"artist_ids": sorted(busy_artists), "service_ids": sorted(busy_services)}
+
+def duplicate_event(event_id: int, user: str = "", db: Optional[Session] = None,
+                    new_date: Optional[date] = None, drop_conflicts: bool = False) -> Optional[Event]:
+    """
+    Duplica un evento (in stato "bozza") in new_date, di default la stessa data.
+    Artisti, performer e service già impegnati quel giorno sono conflitti: solleva
+    ValueError, oppure con drop_conflicts=True vengono esclusi dalla copia (elencati
+    nell'audit). Sulla stessa data quindi la copia nasce senza artisti né service:
+    le pagine mostrano prima find_duplicate_conflicts e chiedono conferma.
+    """
+    with _unit_of_work(db) as db:
         ev = db.query(Event).get(event_id)
         if not ev:
             return None
+        target_date = new_date or ev.date
+        performer_rows, artist_ids, service_ids, busy_artists, busy_services = _duplicate_links(db, ev, target_date)
+        if (busy_artists or busy_services) and not drop_conflicts:
+            raise ValueError(
+                f"Impossibile duplicare il {target_date}: artisti già impegnati {sorted(busy_artists)}, "
+                f"service già impegnati {sorted(busy_services)}"
+            )
+        performers: Dict[str, List[int]] = {role: [] for role in PERFORMER_ROLES}
+        for role, aid in performer_rows:
+            if aid not in busy_artists:
+                performers.setdefault(role, []).append(aid)
+
         new = Event(
-            date=ev.date,
+            date=target_date,
             title=f"{ev.title} (Copia)",
             location=ev.location,
             type=ev.type,
@@ -450,104 +1205,373 @@ def duplicate_event(event_id: int, user: str = "") -> Optional[Event]:
             facchini=ev.facchini,
             payments_acconto=ev.payments_acconto,
             payments_saldo=ev.payments_saldo,
-            dj_id=ev.dj_id,
-            vocalist_id=ev.vocalist_id,
-            ballerine_ids=ev.ballerine_ids,
-            mascotte_ids=ev.mascotte_ids
+            **_legacy_performer_fields(performers)
         )
         for a in ev.artists:
-            new.artists.append(a)
+            if a.id not in busy_artists:
+                new.artists.append(a)
         for s in ev.services:
-            new.services.append(s)
+            if s.id not in busy_services:
+                new.services.append(s)
         db.add(new)
-        db.commit()
-        db.refresh(new)
-        # copia assegnazioni service se presenti (rispettando vincoli)
-        for sa in ev.service_assignments:
-            try:
-                new_sa = ServiceAssignment(event_id=new.id, service_id=sa.service_id, date=new.date)
-                db.add(new_sa)
-            except Exception:
-                # se vincolo unique fallisce, ignora
-                pass
-        db.commit()
-        db.refresh(new)
-        record_audit("event", new.id, "create", {"source_event": ev.id}, user=user)
+        db.flush()
+        # copia assegnazioni service e performer (già verificati)
+        assignments = [{"event_id": new.id, "service_id": sid, "date": new.date} for sid in service_ids if sid not in busy_services]
+        if assignments:
+            db.execute(ServiceAssignment.__table__.insert(), assignments)
+        links = [{"event_id": new.id, "artist_id": aid, "role": role} for role, ids in performers.items() for aid in ids]
+        if links:
+            db.execute(event_performer.insert(), links)
+        _sync_artist_bookings(db, new, [aid for aid in artist_ids if aid not in busy_artists])
+        db.flush()
+        payload = {"source_event": ev.id}
+        if busy_artists or busy_services:
+            payload["dropped"] = {"artist_ids": sorted(busy_artists), "service_ids": sorted(busy_services)}
+        record_audit("event", new.id, "create", payload, user=user, db=db)
         return new
-    finally:
-        db.close()
 
-def delete_event(event_id: int, user: str = "") -> bool:
-    db = get_session()
-    try:
+def delete_event(event_id: int, user: str = "", db: Optional[Session] = None) -> bool:
+    with _unit_of_work(db) as db:
         ev = db.query(Event).get(event_id)
         if not ev:
             return False
         # elimina task e service assignments legate
         db.query(Task).filter(Task.event_id == event_id).delete()
         db.query(ServiceAssignment).filter(ServiceAssignment.event_id == event_id).delete()
+        db.query(ArtistBooking).filter(ArtistBooking.event_id == event_id).delete()
+        db.execute(event_performer.delete().where(event_performer.c.event_id == event_id))
         db.delete(ev)
-        db.commit()
-        record_audit("event", event_id, "delete", {"id": event_id}, user=user)
+        db.flush()
+        record_audit("event", event_id, "delete", {"id": event_id}, user=user, db=db)
         return True
-    finally:
-        db.close()
 
-def move_event_date(event_id: int, new_date: date, user: str = "") -> Optional[Event]:
-    db = get_session()
-    try:
+def move_event_date(event_id: int, new_date: date, user: str = "", db: Optional[Session] = None) -> Optional[Event]:
+    with _unit_of_work(db) as db:
         ev = db.query(Event).get(event_id)
         if not ev:
             return None
         before = {"date": ev.date.isoformat() if ev.date else None}
         # controlla conflitti per service assegnati
         service_ids = [sa.service_id for sa in ev.service_assignments]
-        conflicts = check_services_availability(new_date, service_ids, exclude_event_id=ev.id)
+        conflicts = check_services_availability(new_date, service_ids, exclude_event_id=ev.id, db=db)
         if conflicts:
             raise ValueError(f"Conflitto service per la nuova data {new_date}: {conflicts}")
+        # e per gli artisti impegnati
+        artist_ids = [aid for (aid,) in db.query(ArtistBooking.artist_id).filter(ArtistBooking.event_id == ev.id)]
+        busy = sorted({c.artist_id for c in find_artist_conflicts([(aid, new_date, ev.id) for aid in artist_ids], db=db)})
+        if busy:
+            raise ValueError(f"Artisti già impegnati nella nuova data {new_date}: {busy}")
         ev.date = new_date
-        # aggiorna service assignments date
+        # aggiorna service assignments e artist bookings
         for sa in ev.service_assignments:
             sa.date = new_date
-        db.commit()
-        db.refresh(ev)
-        record_audit("event", event_id, "move_date", {"before": before, "after": {"date": new_date.isoformat()}}, user=user)
+        db.query(ArtistBooking).filter(ArtistBooking.event_id == ev.id).update({"date": new_date}, synchronize_session=False)
+        db.flush()
+        record_audit("event", event_id, "move_date", {"before": before, "after": {"date": new_date.isoformat()}}, user=user, db=db)
         return ev
-    finally:
-        db.close()
+
+# -------------------------
+# OPERAZIONI MULTIPLE SUGLI EVENTI
+# -------------------------
+# UPDATE/DELETE set-based in un'unica unità di lavoro, con una riga di audit per
+# evento (record_audit_many): il pannello attività dell'evento filtra su entity_id,
+# una riga riassuntiva senza entity_id non comparirebbe nello storico dei singoli eventi
+def bulk_set_status(event_ids: Iterable[int], status: str, user: str = "", db: Optional[Session] = None) -> int:
+    """
+    Imposta lo stato di più eventi con un solo UPDATE. Restituisce quanti eventi sono cambiati.
+    Solleva ValueError se status non è uno di EVENT_STATUSES.
+    """
+    if status not in EVENT_STATUSES:
+        raise ValueError(f"Stato non valido: {status!r} (valori: {', '.join(EVENT_STATUSES)})")
+    ids = _unique_ids(event_ids)
+    if not ids:
+        return 0
+    with _unit_of_work(db) as db:
+        before = dict(db.query(Event.id, Event.status).filter(Event.id.in_(ids), Event.status != status).all())
+        if not before:
+            return 0
+        db.query(Event).filter(Event.id.in_(list(before))).update({"status": status}, synchronize_session=False)
+        db.expire_all()
+        record_audit_many("event", [
+            (eid, {"before": {"status": old}, "after": {"status": status}})
+            for eid, old in sorted(before.items())
+        ], "bulk_set_status", user=user, db=db)
+        return len(before)
+
+def bulk_shift_dates(event_ids: Iterable[int], days: int, user: str = "", db: Optional[Session] = None) -> Dict[str, int]:
+    """
+    Sposta più eventi di days giorni (anche negativi), con service assignments e artist bookings.
+    I conflitti con eventi non selezionati sono verificati prima (una query per tipo):
+    se ce ne sono solleva ValueError e non modifica nulla.
+    Le assegnazioni vengono cancellate e reinserite spostate: un UPDATE riga per riga
+    violerebbe i vincoli unique (risorsa, data) tra eventi selezionati in giorni consecutivi.
+    """
+    ids = _unique_ids(event_ids)
+    days = int(days)
+    if not ids or not days:
+        return {"events": 0, "service_assignments": 0, "artist_bookings": 0}
+    delta = timedelta(days=days)
+    sa = ServiceAssignment.__table__
+    ab = ArtistBooking.__table__
+    with _unit_of_work(db) as db:
+        db.flush()
+        old_dates = dict(db.query(Event.id, Event.date).filter(Event.id.in_(ids)).all())
+        found = list(old_dates)
+        if not found:
+            return {"events": 0, "service_assignments": 0, "artist_bookings": 0}
+        assignments = [
+            {"event_id": eid, "service_id": sid, "date": d + delta}
+            for eid, sid, d in db.query(sa.c.event_id, sa.c.service_id, sa.c.date).filter(sa.c.event_id.in_(found))
+        ]
+        bookings = [
+            {"event_id": eid, "artist_id": aid, "date": d + delta}
+            for eid, aid, d in db.query(ab.c.event_id, ab.c.artist_id, ab.c.date).filter(ab.c.event_id.in_(found))
+        ]
+        # gli eventi selezionati si spostano insieme: le loro assegnazioni attuali non sono conflitti
+        service_conflicts = find_service_conflicts(
+            [(r["service_id"], r["date"], r["event_id"]) for r in assignments], exclude_event_ids=found, db=db)
+        artist_conflicts = find_artist_conflicts(
+            [(r["artist_id"], r["date"], r["event_id"]) for r in bookings], exclude_event_ids=found, db=db)
+        if service_conflicts or artist_conflicts:
+            raise ValueError(
+                f"Spostamento di {days:+d} giorni non possibile: service in conflitto "
+                f"{sorted({(c.service_id, c.date.isoformat()) for c in service_conflicts})}, artisti in conflitto "
+                f"{sorted({(c.artist_id, c.date.isoformat()) for c in artist_conflicts})}"
+            )
+
+        db.query(Event).filter(Event.id.in_(found)).update(
+            {"date": func.date(Event.date, f"{days:+d} days")}, synchronize_session=False)
+        db.execute(sa.delete().where(sa.c.event_id.in_(found)))
+        db.execute(ab.delete().where(ab.c.event_id.in_(found)))
+        if assignments:
+            db.execute(sa.insert(), assignments)
+        if bookings:
+            db.execute(ab.insert(), bookings)
+        db.expire_all()
+        record_audit_many("event", [
+            (eid, {"days": days, "before": {"date": d}, "after": {"date": d + delta if d else None}})
+            for eid, d in sorted(old_dates.items())
+        ], "bulk_shift_dates", user=user, db=db)
+        return {"events": len(found), "service_assignments": len(assignments), "artist_bookings": len(bookings)}
+
+def bulk_delete(event_ids: Iterable[int], user: str = "", db: Optional[Session] = None) -> Dict[str, int]:
+    """
+    Elimina più eventi con tutto ciò che li referenzia (task, assegnazioni, associazioni):
+    un DELETE per tabella. Restituisce le righe eliminate per tabella.
+    """
+    ids = _unique_ids(event_ids)
+    counts: Dict[str, int] = {}
+    if not ids:
+        return counts
+    with _unit_of_work(db) as db:
+        db.flush()
+        titles = dict(db.query(Event.id, Event.title).filter(Event.id.in_(ids)).all())
+        if not titles:
+            return counts
+        found = list(titles)
+        for table in (Task.__table__, ServiceAssignment.__table__, ArtistBooking.__table__,
+                      event_performer, event_artist, event_service, Event.__table__):
+            column = table.c.id if table is Event.__table__ else table.c.event_id
+            counts[table.name] = db.execute(table.delete().where(column.in_(found))).rowcount
+        db.expire_all()
+        record_audit_many("event", [(eid, {"title": titles[eid]}) for eid in sorted(found)],
+                          "bulk_delete", user=user, db=db)
+        return counts
+
+# -------------------------
+# SERIE / TOUR
+# -------------------------
+MAX_SERIES_EVENTS = 366
+
+# campi di Event copiati dal payload base su ogni data della serie
+SERIES_EVENT_FIELDS = (
+    "title", "location", "type", "format_id", "promoter_id", "tour_manager_id", "status", "notes",
+    "van", "travel", "hotel", "allestimenti", "facchini", "payments_acconto", "payments_saldo",
+)
+
+class SeriesRule(NamedTuple):
+    """
+    Ricorrenza semplice: da start ogni every_days giorni, oppure (con weekdays,
+    0 = lunedì) tutti i giorni della settimana indicati; fino a until e/o count date.
+    """
+    start: date
+    until: Optional[date] = None
+    count: Optional[int] = None
+    every_days: int = 7
+    weekdays: Optional[Tuple[int, ...]] = None
+
+class SeriesResult(NamedTuple):
+    dates: List[date]
+    service_conflicts: List[ServiceConflict]   # event_id = data della serie che chiede il service
+    artist_conflicts: List[ArtistConflict]     # event_id = data della serie che chiede l'artista
+    event_ids: List[int]                       # vuota in dry_run o se ci sono conflitti
+    tasks_created: int = 0
+
+def expand_series_rule(rule) -> List[date]:
+    """
+    Date generate da una SeriesRule (o da un dict con gli stessi campi).
+    """
+    if isinstance(rule, dict):
+        rule = SeriesRule(**rule)
+    if rule.until is None and rule.count is None:
+        raise ValueError("La ricorrenza richiede until oppure count")
+    step = 1 if rule.weekdays else max(1, int(rule.every_days))
+    weekdays = set(rule.weekdays or [])
+    dates: List[date] = []
+    d = rule.start
+    while len(dates) < MAX_SERIES_EVENTS:
+        if rule.until is not None and d > rule.until:
+            break
+        if rule.count is not None and len(dates) >= rule.count:
+            break
+        if not weekdays or d.weekday() in weekdays:
+            dates.append(d)
+        d += timedelta(days=step)
+    return dates
+
+def _series_event_row(base: dict, d: date) -> Dict[str, Any]:
+    row = {field: base[field] for field in SERIES_EVENT_FIELDS if field in base}
+    for field in ("payments_acconto", "payments_saldo"):
+        if field in row:
+            row[field] = float(row[field]) if row[field] not in (None, "") else None
+    row["date"] = d
+    return row
+
+def create_event_series(base: dict, dates: Optional[Iterable[date]] = None, rule=None,
+                        template_name: Optional[str] = None, assignee: str = "",
+                        dry_run: bool = False, user: str = "", db: Optional[Session] = None) -> SeriesResult:
+    """
+    Crea un evento per ogni data (dates oppure rule, vedi SeriesRule) a partire dal
+    payload base (stesse chiavi di save_event: campi, artist_ids, service_ids,
+    dj_id/vocalist_id/ballerine_ids/mascotte_ids).
+    - Conflitti service e artisti verificati per tutte le date insieme (una query
+      per tipo); se ce ne sono non viene scritto nulla e il risultato li elenca.
+    - Inserimento di eventi, associazioni, assegnazioni e task in un'unica transazione.
+    - template_name: TaskTemplate (o checklist di fallback) applicato a ogni evento.
+    - dry_run=True: solo il report dei conflitti, nessuna scrittura.
+    """
+    if dates is None and rule is None:
+        raise ValueError("Indicare dates oppure rule")
+    series_dates = sorted(dict.fromkeys(list(dates) if dates is not None else expand_series_rule(rule)))
+    if not series_dates:
+        return SeriesResult([], [], [], [])
+    if len(series_dates) > MAX_SERIES_EVENTS:
+        raise ValueError(f"Troppe date per una serie: {len(series_dates)} (max {MAX_SERIES_EVENTS})")
+
+    with _unit_of_work(db) as db:
+        artist_ids = _unique_ids(base.get("artist_ids", []))
+        service_ids = _unique_ids(base.get("service_ids", []))
+        performers = {PERFORMER_FIELDS[f]: parse_performer_ids(base.get(f)) for f in PERFORMER_FIELDS if f in base}
+        # solo id esistenti, come in save_event (una query per tipo)
+        requested = set(artist_ids) | {aid for ids in performers.values() for aid in ids}
+        known_artists = {aid for (aid,) in db.query(Artist.id).filter(Artist.id.in_(requested))} if requested else set()
+        artist_ids = [aid for aid in artist_ids if aid in known_artists]
+        performers = {role: [aid for aid in ids if aid in known_artists] for role, ids in performers.items()}
+        if service_ids:
+            known_services = {sid for (sid,) in db.query(Service.id).filter(Service.id.in_(service_ids))}
+            service_ids = [sid for sid in service_ids if sid in known_services]
+        booked_artists = _unique_ids(artist_ids + [aid for ids in performers.values() for aid in ids])
+
+        # la data fa da chiave dell'evento richiedente
+        service_conflicts = find_service_conflicts([(sid, d, d) for d in series_dates for sid in service_ids], db=db)
+        artist_conflicts = find_artist_conflicts([(aid, d, d) for d in series_dates for aid in booked_artists], db=db)
+        if dry_run or service_conflicts or artist_conflicts:
+            return SeriesResult(series_dates, service_conflicts, artist_conflicts, [])
+
+        legacy = _legacy_performer_fields(performers)
+        rows = [dict(_series_event_row(base, d), **legacy) for d in series_dates]
+        # INSERT multi-riga con RETURNING; le date sono distinte e fanno da chiave per gli id
+        db.flush()
+        returned = dict(
+            (d, eid) for eid, d in db.execute(insert(Event).returning(Event.id, Event.date), rows)
+        )
+        events = [SimpleNamespace(id=returned[d], date=d) for d in series_dates]
+
+        links = {
+            event_artist: [{"event_id": ev.id, "artist_id": aid} for ev in events for aid in artist_ids],
+            event_service: [{"event_id": ev.id, "service_id": sid} for ev in events for sid in service_ids],
+            event_performer: [{"event_id": ev.id, "artist_id": aid, "role": role}
+                              for ev in events for role, ids in performers.items() for aid in ids],
+            ServiceAssignment.__table__: [{"event_id": ev.id, "service_id": sid, "date": ev.date}
+                                          for ev in events for sid in service_ids],
+            ArtistBooking.__table__: [{"event_id": ev.id, "artist_id": aid, "date": ev.date}
+                                      for ev in events for aid in booked_artists],
+        }
+        for table, link_rows in links.items():
+            if link_rows:
+                db.execute(table.insert(), link_rows)
+
+        tasks_created = 0
+        if template_name:
+            templates = [
+                {"title": t.title, "description": t.description or "", "offset_days": t.offset_days or 0}
+                for t in list_task_templates_for(template_name, db=db)
+            ] or FALLBACK_TASK_TEMPLATES.get(template_name, [])
+            task_rows = [
+                {"event_id": ev.id, "title": t["title"], "description": t.get("description", ""),
+                 "assignee": assignee, "due_date": ev.date + timedelta(days=t.get("offset_days", 0)), "done": False}
+                for ev in events for t in templates
+            ]
+            if task_rows:
+                db.execute(Task.__table__.insert(), task_rows)
+            tasks_created = len(task_rows)
+
+        event_ids = [ev.id for ev in events]
+        for ev in events:
+            record_audit("event", ev.id, "create", {"series": event_ids, "after": base}, user=user, db=db)
+        return SeriesResult(series_dates, [], [], event_ids, tasks_created)
 
 # -------------------------
 # TASKS
 # -------------------------
-def list_tasks_by_date(target_date: date) -> List[Task]:
-    db = get_session()
-    try:
+def list_tasks_by_date(target_date: date, db: Optional[Session] = None) -> List[Task]:
+    with _unit_of_work(db) as db:
         return db.query(Task).filter(Task.due_date == target_date).order_by(Task.done, Task.created_at).all()
-    finally:
-        db.close()
 
-def list_tasks_for_event(event_id: int) -> List[Task]:
-    db = get_session()
-    try:
+def list_tasks_for_event(event_id: int, db: Optional[Session] = None) -> List[Task]:
+    with _unit_of_work(db) as db:
         return db.query(Task).filter(Task.event_id == event_id).order_by(Task.done, Task.created_at).all()
-    finally:
-        db.close()
 
-def add_task(event_id: int, title: str, description: str = "", assignee: str = "", due_date: Optional[date] = None, user: str = "") -> Task:
-    db = get_session()
-    try:
+class DayBundle(NamedTuple):
+    date: date
+    events: List[Event]
+    tasks_by_event: Dict[int, List[Task]]   # event_id -> task (non fatte prima), per ogni evento del giorno
+    djs: List[ArtistRef]
+    promoters: List[PromoterRef]
+
+def load_day_bundle(target_date: date, db: Optional[Session] = None) -> DayBundle:
+    """
+    Tutto ciò che serve alla TaskList di un giorno con un numero fisso di query:
+    eventi del giorno (una query), le loro task (una query IN) e le liste DJ e
+    promoter (dalla cache dei dati di riferimento).
+    """
+    with _unit_of_work(db) as session:
+        events = session.query(Event).filter(Event.date == target_date).order_by(Event.id).all()
+        tasks_by_event: Dict[int, List[Task]] = {ev.id: [] for ev in events}
+        if events:
+            tasks = (
+                session.query(Task)
+                .filter(Task.event_id.in_(list(tasks_by_event)))
+                .order_by(Task.done, Task.created_at)
+                .all()
+            )
+            for t in tasks:
+                tasks_by_event[t.event_id].append(t)
+    # senza db esplicito le liste arrivano dalla cache (nessuna query)
+    djs = list_artists_by_role("dj", db=db)
+    promoters = list_promoters(db=db)
+    return DayBundle(target_date, events, tasks_by_event, djs, promoters)
+
+def add_task(event_id: int, title: str, description: str = "", assignee: str = "", due_date: Optional[date] = None, user: str = "", db: Optional[Session] = None) -> Task:
+    with _unit_of_work(db) as db:
         t = Task(event_id=event_id, title=title.strip(), description=description, assignee=assignee, due_date=due_date)
         db.add(t)
-        db.commit()
-        db.refresh(t)
-        record_audit("task", t.id, "create", {"title": t.title, "event_id": event_id}, user=user)
+        db.flush()
+        record_audit("task", t.id, "create", {"title": t.title, "event_id": event_id}, user=user, db=db)
         return t
-    finally:
-        db.close()
 
-def update_task(task_id: int, **fields) -> Optional[Task]:
-    db = get_session()
-    try:
+def update_task(task_id: int, db: Optional[Session] = None, **fields) -> Optional[Task]:
+    with _unit_of_work(db) as db:
         t = db.query(Task).get(task_id)
         if not t:
             return None
@@ -555,126 +1579,103 @@ def update_task(task_id: int, **fields) -> Optional[Task]:
         for k, v in fields.items():
             if hasattr(t, k):
                 setattr(t, k, v)
-        db.commit()
-        db.refresh(t)
-        record_audit("task", task_id, "update", {"before": before, "after": fields})
+        db.flush()
+        record_audit("task", task_id, "update", {"before": before, "after": fields}, db=db)
         return t
-    finally:
-        db.close()
 
-def delete_task(task_id: int, user: str = "") -> bool:
-    db = get_session()
-    try:
+def delete_task(task_id: int, user: str = "", db: Optional[Session] = None) -> bool:
+    with _unit_of_work(db) as db:
         t = db.query(Task).get(task_id)
         if not t:
             return False
         db.delete(t)
-        db.commit()
-        record_audit("task", task_id, "delete", {"id": task_id}, user=user)
+        db.flush()
+        record_audit("task", task_id, "delete", {"id": task_id}, user=user, db=db)
         return True
-    finally:
-        db.close()
 
-def toggle_task_done(task_id: int, user: str = "") -> Optional[Task]:
-    db = get_session()
-    try:
+def toggle_task_done(task_id: int, user: str = "", db: Optional[Session] = None) -> Optional[Task]:
+    with _unit_of_work(db) as db:
         t = db.query(Task).get(task_id)
         if not t:
             return None
         t.done = not bool(t.done)
-        db.commit()
-        db.refresh(t)
-        record_audit("task", task_id, "toggle_done", {"done": t.done}, user=user)
+        db.flush()
+        record_audit("task", task_id, "toggle_done", {"done": t.done}, user=user, db=db)
         return t
-    finally:
-        db.close()
 
-def get_user_tasks(username: str, only_open: bool = True) -> List[Task]:
+def get_user_tasks(username: str, only_open: bool = True, db: Optional[Session] = None) -> List[Task]:
     """
     Restituisce le task assegnate a un utente.
     - username: stringa che identifica l'assignee (es. username o email).
     - only_open: se True ritorna solo le task non completate.
     """
-    db = get_session()
-    try:
+    with _unit_of_work(db) as db:
         q = db.query(Task).filter(Task.assignee == username)
         if only_open:
             q = q.filter(Task.done == False)
         return q.order_by(Task.due_date, Task.created_at).all()
-    finally:
-        db.close()
 
 # -------------------------
 # TEMPLATES E CHECKLIST
 # -------------------------
-def list_event_templates() -> List[EventTemplate]:
-    db = get_session()
-    try:
+def list_event_templates(db: Optional[Session] = None) -> List[EventTemplate]:
+    with _unit_of_work(db) as db:
         return db.query(EventTemplate).order_by(EventTemplate.name).all()
-    finally:
-        db.close()
 
-def list_task_templates_for(template_name: str) -> List[TaskTemplate]:
-    db = get_session()
-    try:
+def list_task_templates_for(template_name: str, db: Optional[Session] = None) -> List[TaskTemplate]:
+    with _unit_of_work(db) as db:
         return db.query(TaskTemplate).filter(TaskTemplate.template_name == template_name).order_by(TaskTemplate.offset_days).all()
-    finally:
-        db.close()
 
-def apply_template_to_event(event_id: int, template_name: str, user: str = ""):
-    db = get_session()
-    try:
+def apply_template_to_event(event_id: int, template_name: str, user: str = "", db: Optional[Session] = None):
+    with _unit_of_work(db) as db:
         ev = db.query(Event).get(event_id)
         if not ev:
             return None
-        tasks = list_task_templates_for(template_name)
+        tasks = list_task_templates_for(template_name, db=db)
         created = []
         for t in tasks:
             due = ev.date + timedelta(days=t.offset_days)
             task = Task(event_id=ev.id, title=t.title, description=t.description, assignee="", due_date=due)
             db.add(task)
             created.append(task)
-        db.commit()
+        db.flush()
         for c in created:
-            db.refresh(c)
-            record_audit("task", c.id, "create_from_template", {"template": template_name, "event_id": event_id}, user=user)
+            record_audit("task", c.id, "create_from_template", {"template": template_name, "event_id": event_id}, user=user, db=db)
         return created
-    finally:
-        db.close()
+
+# checklist usate quando per template_name non esistono TaskTemplate
+FALLBACK_TASK_TEMPLATES = {
+    "format_checklist": [
+        {"title": "Confermare DJ", "description": "Verificare disponibilità e rider", "offset_days": -7},
+        {"title": "Confermare Vocalist", "description": "Contattare vocalist e confermare set", "offset_days": -7},
+        {"title": "Allestimenti", "description": "Verificare palco e luci", "offset_days": -3},
+        {"title": "Hotel", "description": "Controllare prenotazioni hotel", "offset_days": -3}
+    ],
+    "artist_checklist": [
+        {"title": "Rider tecnico", "description": "Inviare e confermare rider", "offset_days": -7},
+        {"title": "Facchini", "description": "Confermare numero facchini", "offset_days": -3},
+        {"title": "Trasporti", "description": "Organizzare van e viaggi", "offset_days": -2}
+    ]
+}
 
 # compatibilità: create_tasks_from_template wrapper
-def create_tasks_from_template(event_id: int, template_name: str, assignee: str = "", due_date: Optional[date] = None, user: str = "") -> List[Task]:
+def create_tasks_from_template(event_id: int, template_name: str, assignee: str = "", due_date: Optional[date] = None, user: str = "", db: Optional[Session] = None) -> List[Task]:
     """
     Wrapper compatibile con chiamate esistenti.
     - Se esistono TaskTemplate per template_name usa apply_template_to_event.
     - Altrimenti crea tasks da un fallback minimale.
     """
     try:
-        templates = list_task_templates_for(template_name)
+        templates = list_task_templates_for(template_name, db=db)
     except Exception:
         templates = []
 
     if templates:
-        return apply_template_to_event(event_id, template_name, user=user)
-
-    FALLBACK_TEMPLATES = {
-        "format_checklist": [
-            {"title": "Confermare DJ", "description": "Verificare disponibilità e rider", "offset_days": -7},
-            {"title": "Confermare Vocalist", "description": "Contattare vocalist e confermare set", "offset_days": -7},
-            {"title": "Allestimenti", "description": "Verificare palco e luci", "offset_days": -3},
-            {"title": "Hotel", "description": "Controllare prenotazioni hotel", "offset_days": -3}
-        ],
-        "artist_checklist": [
-            {"title": "Rider tecnico", "description": "Inviare e confermare rider", "offset_days": -7},
-            {"title": "Facchini", "description": "Confermare numero facchini", "offset_days": -3},
-            {"title": "Trasporti", "description": "Organizzare van e viaggi", "offset_days": -2}
-        ]
-    }
+        return apply_template_to_event(event_id, template_name, user=user, db=db)
 
-    items = FALLBACK_TEMPLATES.get(template_name, [])
-    db = get_session()
-    created = []
-    try:
+    items = FALLBACK_TASK_TEMPLATES.get(template_name, [])
+    with _unit_of_work(db) as db:
+        created = []
         ev = db.query(Event).get(event_id)
         if not ev:
             return []
@@ -684,83 +1685,33 @@ def create_tasks_from_template(event_id: int, template_name: str, assignee: str
             t = Task(event_id=event_id, title=it["title"], description=it.get("description",""), assignee=assignee, due_date=due)
             db.add(t)
             created.append(t)
-        db.commit()
+        db.flush()
         for t in created:
-            db.refresh(t)
-            record_audit("task", t.id, "create_from_fallback_template", {"template": template_name, "event_id": event_id}, user=user)
+            record_audit("task", t.id, "create_from_fallback_template", {"template": template_name, "event_id": event_id}, user=user, db=db)
         return created
-    finally:
-        db.close()
 
 # -------------------------
 # EXPORT / IMPORT JSON
 # -------------------------
-def export_data_json(path: str) -> None:
-    db = get_session()
-    try:
-        data = {"artists": [], "services": [], "formats": [], "promoters": [], "tour_managers": [], "events": [], "tasks": [], "audit_logs": []}
-        for a in db.query(Artist).all():
-            data["artists"].append({"id": a.id, "name": a.name, "role": a.role, "phone": a.phone, "email": a.email, "notes": a.notes})
-        for s in db.query(Service).all():
-            data["services"].append({"id": s.id, "name": s.name, "contact": s.contact, "phone": s.phone, "notes": s.notes})
-        for f in db.query(Format).all():
-            data["formats"].append({"id": f.id, "name": f.name, "description": f.description, "notes": f.notes})
-        for p in db.query(Promoter).all():
-            data["promoters"].append({"id": p.id, "name": p.name, "contact": p.contact, "phone": p.phone, "email": p.email, "notes": p.notes})
-        for t in db.query(TourManager).all():
-            data["tour_managers"].append({"id": t.id, "name": t.name, "contact": t.contact, "phone": t.phone, "email": t.email, "notes": t.notes})
-        for e in db.query(Event).all():
-            data["events"].append({
-                "id": e.id, "date": e.date.isoformat() if e.date else None, "title": e.title, "location": e.location,
-                "type": e.type, "format_id": e.format_id, "promoter_id": e.promoter_id, "tour_manager_id": e.tour_manager_id,
-                "status": e.status, "notes": e.notes, "van": e.van, "travel": e.travel, "hotel": e.hotel,
-                "allestimenti": e.allestimenti, "facchini": e.facchini, "payments_acconto": e.payments_acconto,
-                "payments_saldo": e.payments_saldo, "dj_id": e.dj_id, "vocalist_id": e.vocalist_id,
-                "ballerine_ids": e.ballerine_ids, "mascotte_ids": e.mascotte_ids,
-                "artist_ids": [a.id for a in e.artists], "service_ids": [s.id for s in e.services]
-            })
-        for tk in db.query(Task).all():
-            data["tasks"].append({
-                "id": tk.id, "event_id": tk.event_id, "title": tk.title, "description": tk.description,
-                "assignee": tk.assignee, "due_date": tk.due_date.isoformat() if tk.due_date else None, "done": bool(tk.done)
-            })
-        for al in db.query(AuditLog).order_by(AuditLog.ts.asc()).all():
-            data["audit_logs"].append({"id": al.id, "entity": al.entity, "entity_id": al.entity_id, "action": al.action, "payload": al.payload, "user": al.user, "ts": al.ts.isoformat()})
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    finally:
-        db.close()
+def export_data_json(path: str, db: Optional[Session] = None, compress: Optional[bool] = None) -> Dict[str, int]:
+    """
+    Esporta tutto il database in JSON a flusso (vedi backup.py); gzip se path termina in ".gz".
+    Restituisce il numero di record esportati per sezione.
+    """
+    from backup import export_backup
+    return export_backup(path, compress=compress, db=db)
 
-def import_data_json(path: str, clear_existing: bool = False) -> None:
-    db = get_session()
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if clear_existing:
-            db.query(AuditLog).delete()
-            db.query(Task).delete()
-            db.query(ServiceAssignment).delete()
-            db.query(Event).delete()
-            db.query(Artist).delete()
-            db.query(Service).delete()
-            db.query(Format).delete()
-            db.query(Promoter).delete()
-            db.query(TourManager).delete()
-            db.commit()
-        # import base entities (no id preservation)
-        for a in data.get("artists", []):
-            db.add(Artist(name=a.get("name",""), role=a.get("role",""), phone=a.get("phone",""), email=a.get("email",""), notes=a.get("notes","")))
-        for s in data.get("services", []):
-            db.add(Service(name=s.get("name",""), contact=s.get("contact",""), phone=s.get("phone",""), notes=s.get("notes","")))
-        for f in data.get("formats", []):
-            db.add(Format(name=f.get("name",""), description=f.get("description",""), notes=f.get("notes","")))
-        for p in data.get("promoters", []):
-            db.add(Promoter(name=p.get("name",""), contact=p.get("contact",""), phone=p.get("phone",""), email=p.get("email",""), notes=p.get("notes","")))
-        for t in data.get("tour_managers", []):
-            db.add(TourManager(name=t.get("name",""), contact=t.get("contact",""), phone=t.get("phone",""), email=t.get("email",""), notes=t.get("notes","")))
-        db.commit()
-    finally:
-        db.close()
+def import_data_json(path: str, clear_existing: bool = False, db: Optional[Session] = None,
+                     mode: str = "insert") -> Dict[str, int]:
+    """
+    Ripristina un export completo (tutte le tabelle, id preservati) con insert a blocchi;
+    mode="upsert" unisce il backup a un database in uso. Vedi backup.import_backup.
+    """
+    from backup import import_backup
+    with _unit_of_work(db) as db:
+        counts = import_backup(path, clear_existing=clear_existing, mode=mode, db=db)
+        _invalidate_references(None, db)
+        return counts
 
 # -------------------------
 # PLACEHOLDERS INTEGRAZIONI (Calendar / Notifications)
@@ -785,6 +1736,7 @@ def send_slack_stub(webhook_url: str, text: str):
 # -------------------------
 # UTILITY / FILTRI
 # -------------------------
+# filtri in memoria su liste già caricate; per nuove query usare query_events(artist_id=..., type_=..., status=...)
 def filter_events_by_artist(events: List[Event], artist_id: int) -> List[Event]:
     return [e for e in events if any(a.id == artist_id for a in e.artists)]
 
@@ -796,44 +1748,29 @@ def filter_events(events: List[Event], *, type_: Optional[str] = None, status: O
         res = [e for e in res if e.status == status]
     return res
 
-def events_without_dj(start_date: date, end_date: date) -> List[Event]:
-    db = get_session()
-    try:
-        return db.query(Event).filter(Event.date >= start_date, Event.date <= end_date, (Event.dj_id == None)).order_by(Event.date).all()
-    finally:
-        db.close()
+def events_without_dj(start_date: date, end_date: date, db: Optional[Session] = None) -> List[Event]:
+    return query_events(start_date, end_date, missing_dj=True, with_relations=False, db=db)
 
-def events_without_promoter(start_date: date, end_date: date) -> List[Event]:
-    db = get_session()
-    try:
-        return db.query(Event).filter(Event.date >= start_date, Event.date <= end_date, (Event.promoter_id == None)).order_by(Event.date).all()
-    finally:
-        db.close()
+def events_without_promoter(start_date: date, end_date: date, db: Optional[Session] = None) -> List[Event]:
+    return query_events(start_date, end_date, missing_promoter=True, with_relations=False, db=db)
 # PROMOTER / TOUR MANAGER - funzioni CRUD per promoter (aggiungi in utils.py)
-def add_promoter(name: str, contact: str = "", phone: str = "", email: str = "", notes: str = "") -> Promoter:
+def add_promoter(name: str, contact: str = "", phone: str = "", email: str = "", notes: str = "", db: Optional[Session] = None) -> Promoter:
     """
     Crea un nuovo promoter e registra l'audit.
     """
-    db = get_session()
-    try:
+    with _unit_of_work(db) as db:
         p = Promoter(name=name.strip(), contact=contact.strip(), phone=phone.strip(), email=email.strip(), notes=notes)
         db.add(p)
-        db.commit()
-        db.refresh(p)
-        record_audit("promoter", p.id, "create", {"name": p.name})
+        db.flush()
+        record_audit("promoter", p.id, "create", {"name": p.name}, db=db)
+        _invalidate_references("promoter", db)
         return p
-    except SQLAlchemyError:
-        db.rollback()
-        raise
-    finally:
-        db.close()
 
-def update_promoter(promoter_id: int, **fields) -> Optional[Promoter]:
+def update_promoter(promoter_id: int, db: Optional[Session] = None, **fields) -> Optional[Promoter]:
     """
     Aggiorna un promoter esistente. Restituisce l'oggetto aggiornato o None se non trovato.
     """
-    db = get_session()
-    try:
+    with _unit_of_work(db) as db:
         p = db.query(Promoter).get(promoter_id)
         if not p:
             return None
@@ -841,54 +1778,43 @@ def update_promoter(promoter_id: int, **fields) -> Optional[Promoter]:
         for k, v in fields.items():
             if hasattr(p, k):
                 setattr(p, k, v)
-        db.commit()
-        db.refresh(p)
-        record_audit("promoter", promoter_id, "update", {"before": before, "after": fields})
+        db.flush()
+        record_audit("promoter", promoter_id, "update", {"before": before, "after": fields}, db=db)
+        _invalidate_references("promoter", db)
         return p
-    finally:
-        db.close()
 
-def delete_promoter(promoter_id: int) -> bool:
+def delete_promoter(promoter_id: int, db: Optional[Session] = None) -> bool:
     """
     Elimina un promoter e registra l'audit. Restituisce True se eliminato, False se non trovato.
     """
-    db = get_session()
-    try:
+    with _unit_of_work(db) as db:
         p = db.query(Promoter).get(promoter_id)
         if not p:
             return False
         # opzionale: verificare referenze (eventi) prima di cancellare
         db.delete(p)
-        db.commit()
-        record_audit("promoter", promoter_id, "delete", {"id": promoter_id})
+        db.flush()
+        record_audit("promoter", promoter_id, "delete", {"id": promoter_id}, db=db)
+        _invalidate_references("promoter", db)
         return True
-    finally:
-        db.close()
 # TOUR MANAGER - funzioni CRUD (aggiungi in utils.py)
-def add_tour_manager(name: str, contact: str = "", phone: str = "", email: str = "", notes: str = "") -> TourManager:
+def add_tour_manager(name: str, contact: str = "", phone: str = "", email: str = "", notes: str = "", db: Optional[Session] = None) -> TourManager:
     """
     Crea un nuovo tour manager e registra l'audit.
     """
-    db = get_session()
-    try:
+    with _unit_of_work(db) as db:
         t = TourManager(name=name.strip(), contact=contact.strip(), phone=phone.strip(), email=email.strip(), notes=notes)
         db.add(t)
-        db.commit()
-        db.refresh(t)
-        record_audit("tour_manager", t.id, "create", {"name": t.name})
+        db.flush()
+        record_audit("tour_manager", t.id, "create", {"name": t.name}, db=db)
+        _invalidate_references("tour_manager", db)
         return t
-    except SQLAlchemyError:
-        db.rollback()
-        raise
-    finally:
-        db.close()
 
-def update_tour_manager(tour_manager_id: int, **fields) -> Optional[TourManager]:
+def update_tour_manager(tour_manager_id: int, db: Optional[Session] = None, **fields) -> Optional[TourManager]:
     """
     Aggiorna un tour manager esistente. Restituisce l'oggetto aggiornato o None se non trovato.
     """
-    db = get_session()
-    try:
+    with _unit_of_work(db) as db:
         t = db.query(TourManager).get(tour_manager_id)
         if not t:
             return None
@@ -896,26 +1822,22 @@ def update_tour_manager(tour_manager_id: int, **fields) -> Optional[TourManager]
         for k, v in fields.items():
             if hasattr(t, k):
                 setattr(t, k, v)
-        db.commit()
-        db.refresh(t)
-        record_audit("tour_manager", tour_manager_id, "update", {"before": before, "after": fields})
+        db.flush()
+        record_audit("tour_manager", tour_manager_id, "update", {"before": before, "after": fields}, db=db)
+        _invalidate_references("tour_manager", db)
         return t
-    finally:
-        db.close()
 
-def delete_tour_manager(tour_manager_id: int) -> bool:
+def delete_tour_manager(tour_manager_id: int, db: Optional[Session] = None) -> bool:
     """
     Elimina un tour manager e registra l'audit. Restituisce True se eliminato, False se non trovato.
     """
-    db = get_session()
-    try:
+    with _unit_of_work(db) as db:
         t = db.query(TourManager).get(tour_manager_id)
         if not t:
             return False
         # opzionale: verificare referenze (eventi) prima di cancellare
         db.delete(t)
-        db.commit()
-        record_audit("tour_manager", tour_manager_id, "delete", {"id": tour_manager_id})
+        db.flush()
+        record_audit("tour_manager", tour_manager_id, "delete", {"id": tour_manager_id}, db=db)
+        _invalidate_references("tour_manager", db)
         return True
-    finally:
-        db.close()